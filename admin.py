@@ -2,91 +2,99 @@
 Admin handlers - panel, broadcast, DM, bot control.
 """
 
+import asyncio
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+
 from aiogram import Router, F, Bot
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, BufferedInputFile, FSInputFile, InlineKeyboardMarkup
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 
 import database as db
-from config import config
+import metrics
+from config import config, COURSES
 from states import AdminStates
+from notifier import notifier, SENT, BLOCKED
+from lagmonitor import watchdog
+from profiler import profiler
+from callbacks import (
+    ADMIN_CALLBACKS, AdminMenuCb, ApproveUserCb, RejectUserCb, BanUserCb, BatchReviewCb,
+    PairsPageCb, ApproveUnpairCb, DenyUnpairCb, BroadcastCb, BroadcastSegmentCb, BroadcastControlCb, CallbackPrefix
+)
+from storage import TrackedStorage
+from middlewares import AdminGateMiddleware
+from helpers import escape_markdown, render_card, send_card, REVIEW
+import broadcast
+import export
 from keyboards import (
     get_admin_menu_keyboard, get_admin_approval_keyboard,
     get_admin_rejection_keyboard, get_admin_bot_control_keyboard,
-    get_broadcast_confirm_keyboard, get_cancel_keyboard, get_main_menu_keyboard
+    get_broadcast_confirm_keyboard, get_broadcast_control_keyboard, get_broadcast_segment_keyboard,
+    get_batch_review_keyboard, get_pairs_page_keyboard, get_cancel_keyboard,
+    get_main_menu_keyboard
 )
 from texts import (
-    ADMIN_PANEL, ADMIN_STATS, ADMIN_PROFILE_REVIEW, ADMIN_APPROVED, ADMIN_REJECTED,
+    ADMIN_PANEL, ADMIN_STATS, ADMIN_APPROVED, ADMIN_REJECTED,
     ADMIN_BANNED_NOTIF, ADMIN_UNPAIR_REQUEST, ADMIN_BROADCAST_ASK, ADMIN_BROADCAST_CONFIRM,
-    ADMIN_BROADCAST_SENT, ADMIN_DM_ASK, ADMIN_DM_MESSAGE, ADMIN_DM_SENT,
-    ADMIN_BOT_STOPPING, ADMIN_BOT_RESTARTING, ADMIN_FROM_ADMIN, ADMIN_ALL_REVIEWED,
-    UNPAIR_APPROVED, UNPAIR_DENIED, get_gender_emoji, get_gender_text, BTN_CANCEL
+    ADMIN_BROADCAST_AUDIENCE, ADMIN_DM_ASK, ADMIN_DM_MESSAGE, ADMIN_DM_SENT,
+    ADMIN_DM_BLOCKED, ADMIN_DM_FAILED, ADMIN_BOT_STOPPING, ADMIN_BOT_RESTARTING, ADMIN_FROM_ADMIN, ADMIN_ALL_REVIEWED, ADMIN_QUEUE_CLAIMED,
+    ADMIN_BATCH_REVIEW, ADMIN_BATCH_LINE, ADMIN_PAIRS_PAGE, ADMIN_PAIR_LINE,
+    ADMIN_EXPORT_USAGE, ADMIN_EXPORT_RESULT, ADMIN_EXPORT_TOO_BIG,
+    ADMIN_PROFILER_STARTED, ADMIN_PROFILER_RESULT,
+    ADMIN_PERF, ADMIN_PERF_EMPTY, ADMIN_SQLTOP, ADMIN_SQLPLAN, ADMIN_LAG,
+    UNPAIR_APPROVED, UNPAIR_DENIED, BTN_CANCEL, get_gender_emoji
 )
 
 admin_router = Router()
+admin_callbacks = CallbackPrefix(*ADMIN_CALLBACKS)
+admin_router.callback_query.filter(admin_callbacks)
+# Non-admins are turned away before any admin filter or handler runs
+admin_router.message.outer_middleware(AdminGateMiddleware(admin_callbacks))
+admin_router.callback_query.outer_middleware(AdminGateMiddleware(admin_callbacks))
 
 # Global flag for bot control
 bot_running = True
 
+SQLTOP_LIMIT = 10
+BATCH_REVIEW_SIZE = 10  # profiles per batch review page
+BATCH_ABOUT_CHARS = 60
+PAIRS_FETCH = 100  # pairs read per listing page, more than fit in one message
+MESSAGE_LIMIT = 4096  # Telegram text limit, in UTF-16 code units
+DOCUMENT_LIMIT = 50 * 1024 * 1024  # Bot API upload limit
 
-def escape_markdown(text: str) -> str:
-    """Escape special characters for Markdown."""
-    if not text:
-        return ""
-    special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-    for char in special_chars:
-        text = text.replace(char, f'\\{char}')
-    return text
 
+def format_stats(fsm_storage: TrackedStorage) -> str:
+    """Statistics text including live FSM session accounting."""
+    stats = db.get_statistics()
+    sessions = fsm_storage.stats()
+    return ADMIN_STATS.format(
+        **stats,
+        fsm_sessions=sessions["fsm_sessions"],
+        fsm_kb=round(sessions["fsm_bytes"] / 1024, 1),
+        fsm_evicted=sessions["fsm_evicted"]
+    )
 
-async def send_next_pending_profile(chat_id: int, bot: Bot) -> bool:
+
+async def send_next_pending_profile(chat_id: int, bot: Bot, admin_id: int) -> bool:
     """
-    Send next pending profile to admin.
-    Returns True if a profile was sent, False if no more profiles.
+    Claim and send the next pending profile to an admin.
+    Returns True if a profile was sent, False if none is left unclaimed.
     """
-    users = db.get_pending_users()
+    user = db.claim_next_pending(admin_id)
     
-    if not users:
+    if not user:
+        await bot.send_message(chat_id, ADMIN_QUEUE_CLAIMED, parse_mode="Markdown")
         return False
     
-    u = dict(users[0])
-    
-    # Escape special characters in user data
-    first_name = escape_markdown(u["first_name"])
-    last_name = escape_markdown(u["last_name"])
-    username = escape_markdown(u["username"])
-    course = escape_markdown(u.get("course", ""))
-    interests = escape_markdown(u.get("interests", ""))
-    about_me = escape_markdown(u.get("about_me", ""))
-    
-    text = ADMIN_PROFILE_REVIEW.format(
-        user_id=u["user_id"],
-        first_name=first_name,
-        last_name=last_name,
-        username=username,
-        age=u["age"],
-        gender_emoji=get_gender_emoji(u["gender"]),
-        gender=get_gender_text(u["gender"]),
-        course_line=f"🎓 {course}\n" if course else "",
-        interests_line=f"💝 {interests}\n" if interests else "",
-        about_line=f"💭 {about_me}" if about_me else ""
-    )
+    u = dict(user)
+    text = render_card(u, REVIEW)
     kb = get_admin_approval_keyboard(u["user_id"])
     
     try:
-        if u.get("media_file_id") and u.get("media_type"):
-            if u["media_type"] == "photo":
-                await bot.send_photo(chat_id, u["media_file_id"],
-                                   caption=text, parse_mode="Markdown", reply_markup=kb)
-            elif u["media_type"] == "video":
-                await bot.send_video(chat_id, u["media_file_id"],
-                                   caption=text, parse_mode="Markdown", reply_markup=kb)
-            elif u["media_type"] == "video_note":
-                await bot.send_video_note(chat_id, u["media_file_id"])
-                await bot.send_message(chat_id, text, parse_mode="Markdown", reply_markup=kb)
-        else:
-            await bot.send_message(chat_id, text + "\n\n📷 [No media]",
-                                 parse_mode="Markdown", reply_markup=kb)
+        await send_card(bot, chat_id, u, text, kb)
         return True
     except Exception as e:
         # Fallback to text-only if media fails
@@ -100,9 +108,6 @@ async def send_next_pending_profile(chat_id: int, bot: Bot) -> bool:
 
 @admin_router.message(Command("admin"))
 async def cmd_admin(message: Message) -> None:
-    if not config.is_admin(message.from_user.id):
-        return
-    
     stats = db.get_statistics()
     await message.answer(
         ADMIN_PANEL.format(**stats),
@@ -112,19 +117,12 @@ async def cmd_admin(message: Message) -> None:
 
 
 @admin_router.message(Command("stats"))
-async def cmd_stats(message: Message) -> None:
-    if not config.is_admin(message.from_user.id):
-        return
-    
-    stats = db.get_statistics()
-    await message.answer(ADMIN_STATS.format(**stats), parse_mode="Markdown")
+async def cmd_stats(message: Message, fsm_storage: TrackedStorage) -> None:
+    await message.answer(format_stats(fsm_storage), parse_mode="Markdown")
 
 
 @admin_router.message(Command("force_unpair"))
 async def cmd_force_unpair(message: Message, bot: Bot) -> None:
-    if not config.is_admin(message.from_user.id):
-        return
-    
     args = message.text.split()
     if len(args) < 2:
         await message.answer("Usage: /force_unpair <user_id>")
@@ -140,21 +138,14 @@ async def cmd_force_unpair(message: Message, bot: Bot) -> None:
     
     if success:
         await message.answer(f"✅ Unpaired {user_id} from {partner_id}")
-        for uid in [user_id, partner_id]:
-            try:
-                await bot.send_message(uid, "🔔 Admin has unpaired you. You can search again!",
-                                      reply_markup=get_main_menu_keyboard("active_finding"))
-            except:
-                pass
+        await notifier.notify(bot, [user_id, partner_id], "🔔 Admin has unpaired you. You can search again!",
+                              reply_markup=get_main_menu_keyboard("active_finding"))
     else:
         await message.answer("❌ User not paired")
 
 
 @admin_router.message(Command("ban"))
 async def cmd_ban(message: Message, bot: Bot) -> None:
-    if not config.is_admin(message.from_user.id):
-        return
-    
     args = message.text.split(maxsplit=2)
     if len(args) < 2:
         await message.answer("Usage: /ban <user_id> [reason]")
@@ -171,19 +162,13 @@ async def cmd_ban(message: Message, bot: Bot) -> None:
     
     if success:
         await message.answer(f"🚫 Banned user {user_id}")
-        try:
-            await bot.send_message(user_id, ADMIN_BANNED_NOTIF.format(reason=reason), parse_mode="Markdown")
-        except:
-            pass
+        await notifier.send(bot, user_id, ADMIN_BANNED_NOTIF.format(reason=reason), parse_mode="Markdown")
     else:
         await message.answer("❌ Could not ban")
 
 
 @admin_router.message(Command("unban"))
 async def cmd_unban(message: Message) -> None:
-    if not config.is_admin(message.from_user.id):
-        return
-    
     args = message.text.split()
     if len(args) < 2:
         await message.answer("Usage: /unban <user_id>")
@@ -201,57 +186,354 @@ async def cmd_unban(message: Message) -> None:
         await message.answer("❌ Could not unban")
 
 
-# ==================== CALLBACKS ====================
+@admin_router.message(Command("perf"))
+async def cmd_perf(message: Message) -> None:
+    # /perf - since startup, /perf <minutes> - rolling window (up to 60)
+    args = message.text.split()
+    minutes = 0
+    if len(args) > 1:
+        try:
+            minutes = max(1, min(60, int(args[1])))
+        except ValueError:
+            await message.answer("Usage: /perf [minutes]")
+            return
+    
+    window = f"last {minutes} min" if minutes else "since startup"
+    rows = metrics.handler_percentiles(minutes * 60)
+    if not rows:
+        await message.answer(ADMIN_PERF_EMPTY.format(window=window), parse_mode="Markdown")
+        return
+    
+    lines = [f"{'handler':<28} {'n':>6} {'p50':>6} {'p95':>6} {'p99':>6}"]
+    for handler, update_type, count, p50, p95, p99 in rows[:25]:
+        lines.append(f"{handler[:28]:<28} {count:>6} {p50 * 1000:>6.0f} {p95 * 1000:>6.0f} {p99 * 1000:>6.0f}")
+    
+    await message.answer(ADMIN_PERF.format(window=window, table="\n".join(lines)), parse_mode="Markdown")
 
-@admin_router.callback_query(F.data == "admin_pending")
-async def cb_pending(callback: CallbackQuery, bot: Bot) -> None:
-    if not config.is_admin(callback.from_user.id):
-        await callback.answer("Access denied", show_alert=True)
+
+@admin_router.message(Command("sqltop"))
+async def cmd_sqltop(message: Message) -> None:
+    stats = db.get_query_stats(SQLTOP_LIMIT)
+    if not stats:
+        await message.answer("No queries recorded yet")
         return
     
-    await callback.answer()
-    users = db.get_pending_users()
+    lines = [f"{'#':>2} {'calls':>7} {'total':>8} {'avg':>6} {'max':>6}  (ms)"]
+    for i, s in enumerate(stats, 1):
+        lines.append(f"{i:>2} {s.calls:>7} {s.total * 1000:>8.0f} {s.total / s.calls * 1000:>6.1f} {s.max * 1000:>6.0f}")
+        lines.append(f"   {s.template[:150]}")
+    
+    await message.answer(
+        ADMIN_SQLTOP.format(
+            table="\n".join(lines),
+            slow_ms=config.slow_query_ms,
+            slow_count=len(db.get_slow_queries())
+        ),
+        parse_mode="Markdown"
+    )
+
+
+@admin_router.message(Command("sqlplan"))
+async def cmd_sqlplan(message: Message) -> None:
+    args = message.text.split()
+    stats = db.get_query_stats(SQLTOP_LIMIT)
+    try:
+        index = int(args[1])
+        if index < 1:
+            raise ValueError
+        entry = stats[index - 1]
+    except (IndexError, ValueError):
+        await message.answer("Usage: /sqlplan <# from /sqltop>")
+        return
+    
+    plan = db.explain_query(entry) or ["(no plan for this statement)"]
+    await message.answer(
+        ADMIN_SQLPLAN.format(index=index, template=entry.template[:1500], plan="\n".join(plan)),
+        parse_mode="Markdown"
+    )
+
+
+async def send_export(message: Message, name: str, fmt: str) -> None:
+    """Stream an export to a temporary file in a worker thread and send it as a document."""
+    result = await asyncio.to_thread(export.export_to_file, name, fmt)
+    try:
+        if result.size > DOCUMENT_LIMIT:
+            await message.answer(ADMIN_EXPORT_TOO_BIG.format(name=name, size=result.size / 2**20, fmt=fmt),
+                                 parse_mode=None)
+            return
+        await message.answer_document(
+            FSInputFile(result.path, filename=export.export_filename(name, fmt)),
+            caption=ADMIN_EXPORT_RESULT.format(name=name, rows=result.rows, seconds=result.seconds),
+            parse_mode=None
+        )
+    finally:
+        os.remove(result.path)
+
+
+@admin_router.message(Command("export"))
+async def cmd_export(message: Message) -> None:
+    args = message.text.split()
+    name = args[1] if len(args) > 1 else ""
+    fmt = args[2] if len(args) > 2 else "csv"
+    if name not in export.EXPORTS or fmt not in export.FORMATS:
+        # Plain text: export names contain underscores
+        await message.answer(ADMIN_EXPORT_USAGE.format(
+            names=", ".join(export.EXPORTS), formats=", ".join(export.FORMATS)
+        ), parse_mode=None)
+        return
+    
+    await send_export(message, name, fmt)
+
+
+@admin_router.message(Command("lag"))
+async def cmd_lag(message: Message) -> None:
+    lag_counts = metrics.LOOP_LAG.snapshot().get((), [])
+    sites = watchdog.top_sites()
+    
+    lines = [f"{'handler':<24} {'db function':<24} {'n':>5} {'ms':>7}"]
+    for handler, db_function, count, seconds in sites:
+        lines.append(f"{handler[:24]:<24} {db_function[:24]:<24} {count:>5} {seconds * 1000:>7.0f}")
+    if not sites:
+        lines.append("no stalls recorded")
+    
+    last = watchdog.last_stall
+    last_stall = ""
+    if last:
+        last_stall = f"Last: {last.seconds * 1000:.0f}ms in `{last.handler}` → `{last.db_function}`"
+    
+    await message.answer(
+        ADMIN_LAG.format(
+            lag_now=f"{metrics.LOOP_LAG_LAST.get() * 1000:.0f}",
+            lag_p99=f"{metrics.quantile(metrics.LOOP_LAG.buckets, lag_counts, 0.99) * 1000:.0f}",
+            threshold=config.loop_stall_ms,
+            stalls=int(sum(metrics.LOOP_STALLS.snapshot().values())),
+            stalled=sum(metrics.LOOP_STALL_SECONDS.snapshot().values()),
+            table="\n".join(lines),
+            last_stall=last_stall
+        ),
+        parse_mode="Markdown"
+    )
+
+
+def format_batch_line(n: int, user: dict) -> str:
+    """One compact, numbered line of a batch review page."""
+    about = user.get("about_me") or ""
+    if len(about) > BATCH_ABOUT_CHARS:
+        about = about[:BATCH_ABOUT_CHARS].rstrip() + "…"
+    return ADMIN_BATCH_LINE.format(
+        n=n,
+        gender_emoji=get_gender_emoji(user["gender"]),
+        first_name=escape_markdown(user["first_name"]),
+        age=user["age"],
+        course=f" · {escape_markdown(user['course'])}" if user.get("course") else "",
+        media=" · 📷" if user.get("media_file_id") else "",
+        user_id=user["user_id"],
+        about=f"\n   💭 {escape_markdown(about)}" if about else ""
+    )
+
+
+def format_batch_page(users: List[Tuple[int, dict]], pending: int) -> str:
+    """Batch review text for (line number, user) pairs."""
+    return ADMIN_BATCH_REVIEW.format(
+        count=len(users),
+        pending=pending,
+        lines="\n".join(format_batch_line(n, user) for n, user in users)
+    )
+
+
+async def send_batch_page(chat_id: int, bot: Bot, admin_id: int) -> bool:
+    """
+    Claim the next page of pending profiles for an admin and send it as one
+    message of summaries with multi-select. Returns False if none is left unclaimed.
+    """
+    users = db.claim_pending_batch(admin_id, BATCH_REVIEW_SIZE)
     
     if not users:
+        await bot.send_message(chat_id, ADMIN_QUEUE_CLAIMED, parse_mode="Markdown")
+        return False
+    
+    text = format_batch_page([(n, dict(u)) for n, u in enumerate(users, 1)], db.get_pending_count())
+    keyboard = get_batch_review_keyboard([(n, u["user_id"], False) for n, u in enumerate(users, 1)])
+    await bot.send_message(chat_id, text, parse_mode="Markdown", reply_markup=keyboard)
+    return True
+
+
+def batch_entries(markup: Optional[InlineKeyboardMarkup]) -> List[Tuple[int, int, bool]]:
+    """(line number, user_id, selected) of the profiles still undecided on a batch page."""
+    if markup is None:
+        return []
+    entries = []
+    for row in markup.inline_keyboard:
+        for button in row:
+            data = BatchReviewCb.unpack(button.callback_data)
+            if data.action == "toggle":
+                entries.append((data.n, data.user_id, data.selected))
+    return entries
+
+
+# ==================== CALLBACKS ====================
+
+@admin_router.callback_query(AdminMenuCb.filter(F.action == "pending"))
+async def cb_pending(callback: CallbackQuery, bot: Bot) -> None:
+    await callback.answer()
+    pending = db.get_pending_count()
+    
+    if not pending:
         await callback.message.answer("📋 No pending profiles!")
         return
     
     # Show count and first profile only
-    await callback.message.answer(f"📋 *Pending Profiles ({len(users)})*\n\nReviewing first profile...", parse_mode="Markdown")
+    await callback.message.answer(f"📋 *Pending Profiles ({pending})*\n\nReviewing first profile...", parse_mode="Markdown")
     
     # Send first profile using helper function
-    await send_next_pending_profile(callback.message.chat.id, bot)
+    await send_next_pending_profile(callback.message.chat.id, bot, callback.from_user.id)
 
 
-@admin_router.callback_query(F.data == "admin_stats")
-async def cb_stats(callback: CallbackQuery) -> None:
-    if not config.is_admin(callback.from_user.id):
-        await callback.answer("Access denied", show_alert=True)
+@admin_router.callback_query(AdminMenuCb.filter(F.action == "batch"))
+async def cb_batch(callback: CallbackQuery, bot: Bot) -> None:
+    await callback.answer()
+    
+    if not db.get_pending_count():
+        await callback.message.answer("📋 No pending profiles!")
         return
     
-    await callback.answer()
-    stats = db.get_statistics()
-    await callback.message.answer(ADMIN_STATS.format(**stats), parse_mode="Markdown")
+    await send_batch_page(callback.message.chat.id, bot, callback.from_user.id)
 
 
-@admin_router.callback_query(F.data == "admin_pairs")
-async def cb_pairs(callback: CallbackQuery) -> None:
-    if not config.is_admin(callback.from_user.id):
-        await callback.answer("Access denied", show_alert=True)
+@admin_router.callback_query(BatchReviewCb.filter())
+async def cb_batch_review(callback: CallbackQuery, callback_data: BatchReviewCb, bot: Bot) -> None:
+    entries = batch_entries(callback.message.reply_markup)
+    
+    if callback_data.action == "toggle":
+        entries = [(n, uid, selected != (uid == callback_data.user_id)) for n, uid, selected in entries]
+        await callback.message.edit_reply_markup(reply_markup=get_batch_review_keyboard(entries))
+        await callback.answer()
         return
     
+    chosen = [uid for _, uid, selected in entries if selected or callback_data.action == "approve_all"]
+    if not chosen:
+        await callback.answer("Select profiles first")
+        return
+    
+    status = "rejected" if callback_data.action == "reject" else "approved"
+    decided = db.update_approval_status_batch(chosen, status)
+    
+    remaining = db.get_pending_count()
+    
+    # Decided profiles, and any another admin decided meanwhile, leave the page; the rest is re-rendered
+    left = [entry for entry in entries if entry[1] not in chosen]
+    users = db.get_pending_by_ids([uid for _, uid, _ in left])
+    left = [entry for entry in left if entry[1] in users]
+    if left:
+        await callback.message.edit_text(
+            format_batch_page([(n, dict(users[uid])) for n, uid, _ in left], remaining),
+            parse_mode="Markdown",
+            reply_markup=get_batch_review_keyboard(left)
+        )
+    else:
+        await callback.message.edit_reply_markup(reply_markup=None)
+    
+    mark = "✅ Approved" if status == "approved" else "❌ Rejected"
+    await callback.answer(f"{mark} {len(decided)}! ({remaining} remaining)")
+    
+    # One throttled, concurrent fan-out for the whole batch
+    if status == "approved":
+        await notifier.notify(bot, decided, ADMIN_APPROVED, parse_mode="Markdown",
+                              reply_markup=get_main_menu_keyboard("active_finding"))
+    else:
+        await notifier.notify(bot, decided, ADMIN_REJECTED, parse_mode="Markdown")
+    
+    if left:
+        return
+    if remaining > 0:
+        await send_batch_page(callback.message.chat.id, bot, callback.from_user.id)
+    else:
+        await callback.message.answer(ADMIN_ALL_REVIEWED, parse_mode="Markdown")
+
+
+@admin_router.callback_query(AdminMenuCb.filter(F.action == "stats"))
+async def cb_stats(callback: CallbackQuery, fsm_storage: TrackedStorage) -> None:
+    await callback.answer()
+    await callback.message.answer(format_stats(fsm_storage), parse_mode="Markdown")
+
+
+def telegram_len(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+def pack_pairs_page(pairs: list, total: int, backwards: bool = False) -> Tuple[str, list]:
+    """
+    Page text with as many of `pairs` as fit in one message, taken from the
+    start (paging backwards: from the end). Returns the text and the pairs shown.
+    """
+    budget = MESSAGE_LIMIT - telegram_len(ADMIN_PAIRS_PAGE.format(total=total, pairs=""))
+    lines, shown = [], []
+    for p in (reversed(pairs) if backwards else pairs):
+        line = ADMIN_PAIR_LINE.format(**dict(p))
+        budget -= telegram_len(line) + 2
+        if budget < 0:
+            break
+        lines.append(line)
+        shown.append(p)
+    if backwards:
+        lines.reverse()
+        shown.reverse()
+    return ADMIN_PAIRS_PAGE.format(total=total, pairs="\n\n".join(lines)), shown
+
+
+def render_pairs_page(after: int = 0, before: Optional[int] = None) -> Tuple[str, InlineKeyboardMarkup]:
+    """One message of the pairs listing: the pairs after `after`, or the ones before `before`."""
+    total = db.get_pairs_count()
+    backwards = before is not None
+    rows = db.get_pairs_page(after=after, before=before, limit=PAIRS_FETCH + 1)
+    candidates = rows[-PAIRS_FETCH:] if backwards else rows[:PAIRS_FETCH]
+    text, shown = pack_pairs_page(candidates, total, backwards)
+    
+    if not shown and (after or backwards):
+        # Pairs around the cursor dissolved since the page was sent
+        return render_pairs_page()
+    
+    more = len(shown) < len(rows)
+    has_prev = more if backwards else after > 0
+    has_next = True if backwards else more
+    return text, get_pairs_page_keyboard(
+        shown[0]["user_id"] if shown and has_prev else None,
+        shown[-1]["user_id"] if shown and has_next else None
+    )
+
+
+@admin_router.callback_query(AdminMenuCb.filter(F.action == "pairs"))
+async def cb_pairs(callback: CallbackQuery) -> None:
     await callback.answer()
-    pairs = db.get_all_pairs()
     
-    if not pairs:
+    if not db.get_pairs_count():
         await callback.message.answer("💕 No pairs yet!")
         return
     
-    await callback.message.answer(f"💕 *All Pairs ({len(pairs)})*", parse_mode="Markdown")
-    for p in pairs:
-        await callback.message.answer(
-            f"💃 {p['first_name']} (@{p['username']})\n🕺 {p['partner_first_name']} (@{p['partner_username']})"
-        )
+    text, keyboard = render_pairs_page()
+    # Plain text: names and usernames are not escaped
+    await callback.message.answer(text, parse_mode=None, reply_markup=keyboard)
+
+
+@admin_router.callback_query(PairsPageCb.filter())
+async def cb_pairs_page(callback: CallbackQuery, callback_data: PairsPageCb) -> None:
+    await callback.answer()
+    if callback_data.action == "prev":
+        text, keyboard = render_pairs_page(before=callback_data.user_id)
+    else:
+        text, keyboard = render_pairs_page(after=callback_data.user_id)
+    
+    try:
+        await callback.message.edit_text(text, parse_mode=None, reply_markup=keyboard)
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            raise
+
+
+@admin_router.callback_query(AdminMenuCb.filter(F.action == "pairs_export"))
+async def cb_pairs_export(callback: CallbackQuery) -> None:
+    await callback.answer()
+    await send_export(callback.message, "pairs", "csv")
 
 
 async def send_next_unpair_request(chat_id: int, bot: Bot) -> bool:
@@ -294,12 +576,8 @@ async def send_next_unpair_request(chat_id: int, bot: Bot) -> bool:
         return False
 
 
-@admin_router.callback_query(F.data == "admin_rejections")
+@admin_router.callback_query(AdminMenuCb.filter(F.action == "rejections"))
 async def cb_rejections(callback: CallbackQuery, bot: Bot) -> None:
-    if not config.is_admin(callback.from_user.id):
-        await callback.answer("Access denied", show_alert=True)
-        return
-    
     await callback.answer()
     requests = db.get_pending_rejections()
     
@@ -314,13 +592,9 @@ async def cb_rejections(callback: CallbackQuery, bot: Bot) -> None:
     await send_next_unpair_request(callback.message.chat.id, bot)
 
 
-@admin_router.callback_query(F.data.startswith("approve_"))
-async def cb_approve(callback: CallbackQuery, bot: Bot) -> None:
-    if not config.is_admin(callback.from_user.id):
-        await callback.answer("Access denied", show_alert=True)
-        return
-    
-    user_id = int(callback.data.split("_")[1])
+@admin_router.callback_query(ApproveUserCb.filter())
+async def cb_approve(callback: CallbackQuery, callback_data: ApproveUserCb, bot: Bot) -> None:
+    user_id = callback_data.user_id
     
     if db.update_approval_status(user_id, "approved"):
         # Remove inline keyboard and add status
@@ -341,19 +615,16 @@ async def cb_approve(callback: CallbackQuery, bot: Bot) -> None:
             pass
         
         # Get remaining count
-        remaining = len(db.get_pending_users())
+        remaining = db.get_pending_count()
         
         # Notify approved user
-        try:
-            await bot.send_message(user_id, ADMIN_APPROVED, parse_mode="Markdown",
-                                 reply_markup=get_main_menu_keyboard("active_finding"))
-        except:
-            pass
+        await notifier.send(bot, user_id, ADMIN_APPROVED, parse_mode="Markdown",
+                            reply_markup=get_main_menu_keyboard("active_finding"))
         
         # Show next profile or completion message
         if remaining > 0:
             await callback.answer(f"✅ Approved! ({remaining} remaining)")
-            await send_next_pending_profile(callback.message.chat.id, bot)
+            await send_next_pending_profile(callback.message.chat.id, bot, callback.from_user.id)
         else:
             await callback.answer("✅ Approved!")
             await callback.message.answer(ADMIN_ALL_REVIEWED, parse_mode="Markdown")
@@ -361,13 +632,9 @@ async def cb_approve(callback: CallbackQuery, bot: Bot) -> None:
         await callback.answer("❌ Error")
 
 
-@admin_router.callback_query(F.data.startswith("reject_"))
-async def cb_reject(callback: CallbackQuery, bot: Bot) -> None:
-    if not config.is_admin(callback.from_user.id):
-        await callback.answer("Access denied", show_alert=True)
-        return
-    
-    user_id = int(callback.data.split("_")[1])
+@admin_router.callback_query(RejectUserCb.filter())
+async def cb_reject(callback: CallbackQuery, callback_data: RejectUserCb, bot: Bot) -> None:
+    user_id = callback_data.user_id
     
     if db.update_approval_status(user_id, "rejected"):
         # Remove inline keyboard and add status
@@ -388,18 +655,15 @@ async def cb_reject(callback: CallbackQuery, bot: Bot) -> None:
             pass
         
         # Get remaining count
-        remaining = len(db.get_pending_users())
+        remaining = db.get_pending_count()
         
         # Notify rejected user
-        try:
-            await bot.send_message(user_id, ADMIN_REJECTED, parse_mode="Markdown")
-        except:
-            pass
+        await notifier.send(bot, user_id, ADMIN_REJECTED, parse_mode="Markdown")
         
         # Show next profile or completion message
         if remaining > 0:
             await callback.answer(f"❌ Rejected! ({remaining} remaining)")
-            await send_next_pending_profile(callback.message.chat.id, bot)
+            await send_next_pending_profile(callback.message.chat.id, bot, callback.from_user.id)
         else:
             await callback.answer("❌ Rejected!")
             await callback.message.answer(ADMIN_ALL_REVIEWED, parse_mode="Markdown")
@@ -407,13 +671,9 @@ async def cb_reject(callback: CallbackQuery, bot: Bot) -> None:
         await callback.answer("❌ Error")
 
 
-@admin_router.callback_query(F.data.startswith("ban_"))
-async def cb_ban(callback: CallbackQuery, bot: Bot) -> None:
-    if not config.is_admin(callback.from_user.id):
-        await callback.answer("Access denied", show_alert=True)
-        return
-    
-    user_id = int(callback.data.split("_")[1])
+@admin_router.callback_query(BanUserCb.filter())
+async def cb_ban(callback: CallbackQuery, callback_data: BanUserCb, bot: Bot) -> None:
+    user_id = callback_data.user_id
     
     if db.ban_user(user_id, "Banned during review"):
         # Remove inline keyboard and add status
@@ -434,18 +694,16 @@ async def cb_ban(callback: CallbackQuery, bot: Bot) -> None:
             pass
         
         # Get remaining count
-        remaining = len(db.get_pending_users())
+        remaining = db.get_pending_count()
         
         # Notify banned user
-        try:
-            await bot.send_message(user_id, ADMIN_BANNED_NOTIF.format(reason="Banned during review"), parse_mode="Markdown")
-        except:
-            pass
+        await notifier.send(bot, user_id, ADMIN_BANNED_NOTIF.format(reason="Banned during review"),
+                            parse_mode="Markdown")
         
         # Show next profile or completion message
         if remaining > 0:
             await callback.answer(f"🚫 Banned! ({remaining} remaining)")
-            await send_next_pending_profile(callback.message.chat.id, bot)
+            await send_next_pending_profile(callback.message.chat.id, bot, callback.from_user.id)
         else:
             await callback.answer("🚫 Banned!")
             await callback.message.answer(ADMIN_ALL_REVIEWED, parse_mode="Markdown")
@@ -453,13 +711,9 @@ async def cb_ban(callback: CallbackQuery, bot: Bot) -> None:
         await callback.answer("❌ Error")
 
 
-@admin_router.callback_query(F.data.startswith("approve_unpair_"))
-async def cb_approve_unpair(callback: CallbackQuery, bot: Bot) -> None:
-    if not config.is_admin(callback.from_user.id):
-        await callback.answer("Access denied", show_alert=True)
-        return
-    
-    request_id = int(callback.data.split("_")[2])
+@admin_router.callback_query(ApproveUnpairCb.filter())
+async def cb_approve_unpair(callback: CallbackQuery, callback_data: ApproveUnpairCb, bot: Bot) -> None:
+    request_id = callback_data.request_id
     success, user_id, partner_id = db.approve_rejection(request_id)
     
     if success:
@@ -477,12 +731,8 @@ async def cb_approve_unpair(callback: CallbackQuery, bot: Bot) -> None:
         remaining = len(db.get_pending_rejections())
         
         # Notify users
-        for uid in [user_id, partner_id]:
-            try:
-                await bot.send_message(uid, UNPAIR_APPROVED, parse_mode="Markdown",
-                                      reply_markup=get_main_menu_keyboard("active_finding"))
-            except:
-                pass
+        await notifier.notify(bot, [user_id, partner_id], UNPAIR_APPROVED, parse_mode="Markdown",
+                              reply_markup=get_main_menu_keyboard("active_finding"))
         
         # Show next request or completion message
         if remaining > 0:
@@ -495,13 +745,9 @@ async def cb_approve_unpair(callback: CallbackQuery, bot: Bot) -> None:
         await callback.answer("❌ Error")
 
 
-@admin_router.callback_query(F.data.startswith("deny_unpair_"))
-async def cb_deny_unpair(callback: CallbackQuery, bot: Bot) -> None:
-    if not config.is_admin(callback.from_user.id):
-        await callback.answer("Access denied", show_alert=True)
-        return
-    
-    request_id = int(callback.data.split("_")[2])
+@admin_router.callback_query(DenyUnpairCb.filter())
+async def cb_deny_unpair(callback: CallbackQuery, callback_data: DenyUnpairCb, bot: Bot) -> None:
+    request_id = callback_data.request_id
     success, user_id = db.deny_rejection(request_id)
     
     if success:
@@ -519,11 +765,8 @@ async def cb_deny_unpair(callback: CallbackQuery, bot: Bot) -> None:
         remaining = len(db.get_pending_rejections())
         
         # Notify user
-        try:
-            await bot.send_message(user_id, UNPAIR_DENIED, parse_mode="Markdown",
-                                  reply_markup=get_main_menu_keyboard("have_pair"))
-        except:
-            pass
+        await notifier.send(bot, user_id, UNPAIR_DENIED, parse_mode="Markdown",
+                            reply_markup=get_main_menu_keyboard("have_pair"))
         
         # Show next request or completion message
         if remaining > 0:
@@ -538,12 +781,8 @@ async def cb_deny_unpair(callback: CallbackQuery, bot: Bot) -> None:
 
 # ==================== BROADCAST ====================
 
-@admin_router.callback_query(F.data == "admin_broadcast")
+@admin_router.callback_query(AdminMenuCb.filter(F.action == "broadcast"))
 async def cb_broadcast(callback: CallbackQuery, state: FSMContext) -> None:
-    if not config.is_admin(callback.from_user.id):
-        await callback.answer("Access denied", show_alert=True)
-        return
-    
     await callback.answer()
     await state.set_state(AdminStates.waiting_for_broadcast)
     await callback.message.answer(ADMIN_BROADCAST_ASK, parse_mode="Markdown", reply_markup=get_cancel_keyboard())
@@ -556,62 +795,149 @@ async def process_broadcast(message: Message, state: FSMContext) -> None:
         await message.answer("❌ Cancelled", reply_markup=get_admin_menu_keyboard())
         return
     
-    users = db.get_all_users()
-    await state.update_data(broadcast_message=message.text, user_count=len(users))
+    await state.update_data(broadcast_message=message.text)
+    await state.set_state(AdminStates.choose_broadcast_segment)
+    await message.answer(ADMIN_BROADCAST_AUDIENCE, parse_mode="Markdown",
+                       reply_markup=get_broadcast_segment_keyboard())
+
+
+def parse_segment(text: str) -> Optional[dict]:
+    """Parse 'key=value ...' into a segment dict. Returns None if invalid or empty."""
+    allowed = {
+        "pairing_status": {"inactive", "active_finding", "pending_pair", "have_pair", "rejection_pending"},
+        "approval_status": {"pending", "approved", "rejected"},
+        "gender": {"male", "female"},
+        "course": set(COURSES)
+    }
+    segment = {}
+    
+    for part in text.split():
+        key, _, value = part.partition("=")
+        value = value.replace("_", " ") if key == "course" else value
+        if key == "since":
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                return None
+        elif key not in allowed or value not in allowed[key]:
+            return None
+        segment[key] = value
+    
+    # An empty or non-text reply must not widen to "everyone"
+    return segment or None
+
+
+def describe_segment(segment: dict) -> str:
+    """Human-readable segment summary."""
+    if not segment:
+        return "everyone"
+    return escape_markdown(", ".join(f"{key}={value}" for key, value in segment.items()))
+
+
+async def preview_broadcast(message: Message, state: FSMContext, segment: dict) -> None:
+    """Show the confirmation with a COUNT of the chosen segment."""
+    data = await state.get_data()
+    count = db.count_broadcast_recipients(segment)
+    await state.update_data(segment=segment, user_count=count)
     await state.set_state(AdminStates.confirm_broadcast)
     
     # Escape markdown for preview
-    escaped_preview = escape_markdown(message.text)
+    escaped_preview = escape_markdown(data["broadcast_message"])
     
     await message.answer(
-        ADMIN_BROADCAST_CONFIRM.format(message=escaped_preview, count=len(users)),
+        ADMIN_BROADCAST_CONFIRM.format(message=escaped_preview, audience=describe_segment(segment),
+                                       count=count),
         parse_mode="Markdown",
         reply_markup=get_broadcast_confirm_keyboard()
     )
 
 
-@admin_router.callback_query(F.data == "broadcast_confirm", AdminStates.confirm_broadcast)
+@admin_router.callback_query(BroadcastSegmentCb.filter(), AdminStates.choose_broadcast_segment)
+async def cb_broadcast_segment(callback: CallbackQuery, callback_data: BroadcastSegmentCb,
+                               state: FSMContext) -> None:
+    await callback.answer()
+    
+    preset = callback_data.segment
+    if preset == "all":
+        segment = {}
+    elif preset == "pending":
+        segment = {"approval_status": "pending"}
+    else:
+        segment = {"pairing_status": preset}
+    
+    await preview_broadcast(callback.message, state, segment)
+
+
+@admin_router.message(AdminStates.choose_broadcast_segment)
+async def process_broadcast_segment(message: Message, state: FSMContext) -> None:
+    if message.text == BTN_CANCEL:
+        await state.clear()
+        await message.answer("❌ Cancelled", reply_markup=get_admin_menu_keyboard())
+        return
+    
+    segment = parse_segment(message.text or "")
+    if segment is None:
+        await message.answer("💫 Invalid filter. Use the buttons or key=value pairs:",
+                           reply_markup=get_broadcast_segment_keyboard())
+        return
+    
+    await preview_broadcast(message, state, segment)
+
+
+@admin_router.callback_query(BroadcastCb.filter(F.action == "confirm"), AdminStates.confirm_broadcast)
 async def confirm_broadcast(callback: CallbackQuery, state: FSMContext, bot: Bot) -> None:
     await callback.answer()
     
     data = await state.get_data()
     msg = data["broadcast_message"]
-    users = db.get_all_users()
+    await state.clear()
     
     # Escape markdown in the broadcast message
     escaped_msg = escape_markdown(msg)
     
-    success = 0
-    for u in users:
-        try:
-            await bot.send_message(u["user_id"], f"📢 *Announcement*\n\n{escaped_msg}", parse_mode="Markdown")
-            success += 1
-        except:
-            pass
-    
-    await state.clear()
-    await callback.message.answer(
-        ADMIN_BROADCAST_SENT.format(success=success, total=len(users)),
+    segment = data.get("segment")
+    job_id = db.create_broadcast_job(
+        callback.from_user.id,
+        callback.message.chat.id,
+        f"📢 *Announcement*\n\n{escaped_msg}",
+        db.count_broadcast_recipients(segment),
+        segment
+    )
+    progress = await callback.message.answer(
+        broadcast.render_progress(db.get_broadcast_job(job_id)),
         parse_mode="Markdown",
-        reply_markup=get_admin_menu_keyboard()
+        reply_markup=get_broadcast_control_keyboard(job_id, "running")
     )
+    db.set_broadcast_progress_message(job_id, progress.message_id)
+    broadcast.start_job(bot, job_id)
 
 
-@admin_router.callback_query(F.data == "broadcast_cancel")
+@admin_router.callback_query(BroadcastCb.filter(F.action == "cancel"))
 async def cancel_broadcast(callback: CallbackQuery, state: FSMContext) -> None:
     await callback.answer()
     await state.clear()
     await callback.message.answer("❌ Cancelled", reply_markup=get_admin_menu_keyboard())
 
 
+@admin_router.callback_query(BroadcastControlCb.filter())
+async def cb_broadcast_control(callback: CallbackQuery, callback_data: BroadcastControlCb, bot: Bot) -> None:
+    action, job_id = callback_data.action, callback_data.job_id
+    
+    if action == "pause":
+        success, done = broadcast.pause_job(job_id), "⏸️ Paused"
+    elif action == "resume":
+        success, done = broadcast.resume_job(bot, job_id), "▶️ Resumed"
+    else:
+        success, done = broadcast.cancel_job(job_id), "⏹️ Cancelled"
+    
+    await callback.answer(done if success else "❌ Job already finished")
+    await broadcast.update_progress(bot, job_id)
+
+
 # ==================== DIRECT MESSAGE ====================
 
-@admin_router.callback_query(F.data == "admin_dm")
+@admin_router.callback_query(AdminMenuCb.filter(F.action == "dm"))
 async def cb_dm(callback: CallbackQuery, state: FSMContext) -> None:
-    if not config.is_admin(callback.from_user.id):
-        await callback.answer("Access denied", show_alert=True)
-        return
-    
     await callback.answer()
     await state.set_state(AdminStates.waiting_for_dm_user_id)
     await callback.message.answer(ADMIN_DM_ASK, parse_mode="Markdown", reply_markup=get_cancel_keyboard())
@@ -650,34 +976,63 @@ async def process_dm_message(message: Message, state: FSMContext, bot: Bot) -> N
     data = await state.get_data()
     user_id = data["dm_user_id"]
     
-    try:
-        await bot.send_message(user_id, ADMIN_FROM_ADMIN.format(message=message.text), parse_mode="Markdown")
-        await message.answer(ADMIN_DM_SENT.format(user_id=user_id), parse_mode="Markdown",
-                           reply_markup=get_admin_menu_keyboard())
-    except Exception as e:
-        await message.answer(f"❌ Could not send: {e}")
+    status = await notifier.send(bot, user_id, ADMIN_FROM_ADMIN.format(message=message.text), parse_mode="Markdown")
+    if status == SENT:
+        text = ADMIN_DM_SENT
+    elif status == BLOCKED:
+        text = ADMIN_DM_BLOCKED
+    else:
+        text = ADMIN_DM_FAILED
+    await message.answer(text.format(user_id=user_id), parse_mode="Markdown",
+                         reply_markup=get_admin_menu_keyboard())
     
     await state.clear()
 
 
 # ==================== BOT CONTROL ====================
 
-@admin_router.callback_query(F.data == "admin_bot_control")
+@admin_router.callback_query(AdminMenuCb.filter(F.action == "bot_control"))
 async def cb_bot_control(callback: CallbackQuery) -> None:
-    if not config.is_admin(callback.from_user.id):
-        await callback.answer("Access denied", show_alert=True)
-        return
-    
     await callback.answer()
     await callback.message.answer("🎛️ *Bot Control*", parse_mode="Markdown",
-                                 reply_markup=get_admin_bot_control_keyboard())
+                                 reply_markup=get_admin_bot_control_keyboard(profiler.running))
 
 
-@admin_router.callback_query(F.data == "admin_back")
-async def cb_back(callback: CallbackQuery) -> None:
-    if not config.is_admin(callback.from_user.id):
+@admin_router.callback_query(AdminMenuCb.filter(F.action == "profiler_start"))
+async def cb_profiler_start(callback: CallbackQuery) -> None:
+    if not profiler.start():
+        await callback.answer("Profiler is already running")
+    else:
+        await callback.answer("🔬 Profiler started")
+        await callback.message.answer(
+            ADMIN_PROFILER_STARTED.format(
+                rate=round(1 / profiler.interval),
+                max_minutes=round(profiler.max_duration / 60)
+            ),
+            parse_mode="Markdown"
+        )
+    await callback.message.edit_reply_markup(reply_markup=get_admin_bot_control_keyboard(True))
+
+
+@admin_router.callback_query(AdminMenuCb.filter(F.action == "profiler_stop"))
+async def cb_profiler_stop(callback: CallbackQuery) -> None:
+    await callback.answer()
+    collapsed = profiler.stop()
+    await callback.message.edit_reply_markup(reply_markup=get_admin_bot_control_keyboard(False))
+    
+    if not profiler.samples:
+        await callback.message.answer("No samples collected")
         return
     
+    filename = f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.folded"
+    await callback.message.answer_document(
+        BufferedInputFile(collapsed.encode(), filename=filename),
+        caption=ADMIN_PROFILER_RESULT.format(samples=profiler.samples, duration=profiler.duration)
+    )
+
+
+@admin_router.callback_query(AdminMenuCb.filter(F.action == "back"))
+async def cb_back(callback: CallbackQuery) -> None:
     await callback.answer()
     stats = db.get_statistics()
     await callback.message.edit_text(
@@ -687,23 +1042,15 @@ async def cb_back(callback: CallbackQuery) -> None:
     )
 
 
-@admin_router.callback_query(F.data == "admin_restart_bot")
+@admin_router.callback_query(AdminMenuCb.filter(F.action == "restart_bot"))
 async def cb_restart_bot(callback: CallbackQuery) -> None:
-    if not config.is_admin(callback.from_user.id):
-        await callback.answer("Access denied", show_alert=True)
-        return
-    
     await callback.answer("🔄 Restarting...", show_alert=True)
     await callback.message.answer(ADMIN_BOT_RESTARTING, parse_mode="Markdown")
     # In production, use process manager like systemd/supervisor to restart
 
 
-@admin_router.callback_query(F.data == "admin_stop_bot")
+@admin_router.callback_query(AdminMenuCb.filter(F.action == "stop_bot"))
 async def cb_stop_bot(callback: CallbackQuery) -> None:
-    if not config.is_admin(callback.from_user.id):
-        await callback.answer("Access denied", show_alert=True)
-        return
-    
     await callback.answer("🛑 Stopping...", show_alert=True)
     await callback.message.answer(ADMIN_BOT_STOPPING, parse_mode="Markdown")
     # In production, signal the bot to shut down gracefully
\ No newline at end of file
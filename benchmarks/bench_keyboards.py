@@ -0,0 +1,91 @@
+"""
+Benchmark: keyboard cost per response, building fresh pydantic markups and
+dumping them for every request vs. prebuilt keyboards with cached JSON.
+
+Reports time per response and peak memory allocated while building the
+markup and the sendMessage form.
+
+Usage: python benchmarks/bench_keyboards.py [responses]
+"""
+
+import itertools
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import SendMessage
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup
+
+from bot import PrebuiltMarkupSession
+from callbacks import LikeCb, SkipCb
+from keyboards import get_main_menu_keyboard, get_matching_keyboard
+from texts import (
+    BTN_DELETE_ACCOUNT, BTN_EDIT_PROFILE, BTN_FIND_PARTNER, BTN_LIKE, BTN_MY_FILTERS, BTN_MY_PROFILE, BTN_SKIP
+)
+
+
+def legacy_main_menu() -> ReplyKeyboardMarkup:
+    """The previous factory: a new markup tree per call."""
+    return ReplyKeyboardMarkup(keyboard=[
+        [KeyboardButton(text=BTN_FIND_PARTNER)],
+        [KeyboardButton(text=BTN_MY_PROFILE), KeyboardButton(text=BTN_EDIT_PROFILE)],
+        [KeyboardButton(text=BTN_MY_FILTERS), KeyboardButton(text=BTN_DELETE_ACCOUNT)]
+    ], resize_keyboard=True)
+
+
+def legacy_matching(user_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text=BTN_LIKE, callback_data=LikeCb(user_id=user_id).pack()),
+        InlineKeyboardButton(text=BTN_SKIP, callback_data=SkipCb(user_id=user_id).pack())
+    ]])
+
+
+def response(bot: Bot, session: AiohttpSession, build):
+    """Build the keyboard and the sendMessage form, as for one reply."""
+    method = SendMessage(chat_id=1000, text="Hello!", reply_markup=build())
+    return session.build_form_data(bot, method)
+
+
+def peak_bytes(func) -> int:
+    func()  # warm caches
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def run(responses: int) -> None:
+    legacy_session = AiohttpSession()
+    prebuilt_session = PrebuiltMarkupSession()
+    bot = Bot(token=os.environ["BOT_TOKEN"], session=legacy_session)
+    
+    ids = itertools.count(1)
+    cases = [
+        ("main menu", lambda: legacy_main_menu(), lambda: get_main_menu_keyboard("active_finding")),
+        ("matching, candidate seen before", lambda: legacy_matching(123456789),
+         lambda: get_matching_keyboard(123456789)),
+        ("matching, new candidate", lambda: legacy_matching(next(ids)), lambda: get_matching_keyboard(next(ids)))
+    ]
+    for name, legacy, prebuilt in cases:
+        old = lambda: response(bot, legacy_session, legacy)
+        new = lambda: response(bot, prebuilt_session, prebuilt)
+        old_us = min(timeit.repeat(old, number=responses, repeat=3)) / responses * 1e6
+        new_us = min(timeit.repeat(new, number=responses, repeat=3)) / responses * 1e6
+        build_old = min(timeit.repeat(legacy, number=responses, repeat=3)) / responses * 1e6
+        build_new = min(timeit.repeat(prebuilt, number=responses, repeat=3)) / responses * 1e6
+        print(f"{name}:")
+        print(f"  Build markup:    {build_old:.2f}us -> {build_new:.2f}us")
+        print(f"  Build + form:    {old_us:.2f}us -> {new_us:.2f}us per response")
+        print(f"  Peak allocated:  {peak_bytes(old)} -> {peak_bytes(new)} bytes per response")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,72 @@
+"""
+Benchmark: Markdown escaping and profile card rendering cost per card.
+
+Usage: python benchmarks/bench_render.py [cards]
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("BOT_TOKEN", "bench")
+
+import helpers
+from helpers import PARTNER, PROFILE, escape_markdown, format_card, render_card
+
+USERS = 500  # distinct profiles cycled through, all fitting in the card cache
+
+
+def legacy_escape(text: str) -> str:
+    """The previous escaper: one str.replace pass per special character."""
+    if not text:
+        return ""
+    special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
+    for char in special_chars:
+        text = text.replace(char, f'\\{char}')
+    return text
+
+
+def make_user(user_id: int) -> dict:
+    return {
+        "user_id": user_id, "username": f"user_{user_id}", "first_name": "Anna-Maria",
+        "last_name": "O'Neil", "age": 20, "gender": "female", "course": "Computer Science",
+        "interests": "salsa, jazz (mostly), hiking & c++", "about_me": "Dancing since 2015! Let's waltz :)",
+        "media_file_id": f"photo{user_id}", "media_type": "photo", "approval_status": "approved",
+        "pairing_status": "active_finding", "preferred_gender": "male", "preferred_age_min": 18,
+        "preferred_age_max": 24, "profile_version": 1
+    }
+
+
+def per_call_us(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def run(cards: int) -> None:
+    users = [make_user(i) for i in range(USERS)]
+    fields = [users[0][key] for key in ("first_name", "username", "course", "interests", "about_me")]
+    assert all(legacy_escape(field) == escape_markdown(field) for field in fields)
+    
+    def escape_with(escaper):
+        return lambda: [escaper(field) for field in fields]
+    
+    def render_with(renderer, kind):
+        state = {"i": 0}
+        
+        def render():
+            state["i"] += 1
+            return renderer(users[state["i"] % USERS], kind)
+        return render
+    
+    print(f"Escape 5 fields:  legacy {per_call_us(escape_with(legacy_escape), cards):.2f}us, "
+          f"translate {per_call_us(escape_with(escape_markdown), cards):.2f}us")
+    for kind in (PARTNER, PROFILE):
+        uncached = per_call_us(render_with(format_card, kind), cards)
+        helpers._cards.clear()
+        cached = per_call_us(render_with(render_card, kind), cards)
+        print(f"Render {kind + ' card:':<14} uncached {uncached:.2f}us, cached {cached:.2f}us")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
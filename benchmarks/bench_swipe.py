@@ -0,0 +1,112 @@
+"""
+Benchmark: Bot API calls and latency per swipe, editing the card in place vs.
+sending a new card.
+
+Swipers skip through photo candidates against the fake Bot API (with a
+simulated round trip per call) in each SWIPE_MODE.
+
+Usage: python benchmarks/bench_swipe.py [swipers] [swipes_per_user] [rtt_ms]
+"""
+
+import asyncio
+import shutil
+import sys
+import time
+from typing import List
+
+from fake_telegram import API_PORT, TMP_DIR, FakeTelegram, percentile, start_site
+
+import database as db
+from bot import create_bot, create_dispatcher
+from callbacks import SkipCb
+from config import config
+
+MODES = ("send", "edit")
+
+
+def seed(swipers: int, candidates: int) -> None:
+    """Swipers per mode (male, 20) and photo candidates (female, 20), all searching."""
+    db.init_database()
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    
+    users = []
+    for i in range(swipers * len(MODES)):
+        users.append((i + 1, f"swiper{i}", "Swiper", "", 20, "male", None, None))
+    for i in range(candidates):
+        users.append((100000 + i, f"cand{i}", "Candidate", "", 20, "female", f"photo{i}", "photo"))
+    cursor.executemany("""
+        INSERT INTO users (user_id, username, first_name, last_name, age, gender,
+            media_file_id, media_type, approval_status, pairing_status)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'approved', 'active_finding')
+    """, users)
+    
+    conn.commit()
+    conn.close()
+
+
+def make_swipe(update_id: int, user_id: int, target_id: int) -> dict:
+    """Skip tapped on the photo card currently showing `target_id`."""
+    user = {"id": user_id, "is_bot": False, "first_name": "Swiper", "username": f"swiper{user_id}"}
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": user,
+            "chat_instance": "bench",
+            "data": SkipCb(user_id=target_id).pack(),
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "photo": [{"file_id": "photo", "file_unique_id": "photo", "width": 640, "height": 640}],
+                "caption": "Candidate, 20"
+            }
+        }
+    }
+
+
+async def run(swipers: int, swipes_per_user: int, rtt: float) -> None:
+    seed(swipers, swipers * swipes_per_user * len(MODES) + 10)
+    
+    fake = FakeTelegram(delay=rtt)
+    api_runner = await start_site(fake.create_app(), API_PORT)
+    bot = create_bot()
+    dp = create_dispatcher()
+    
+    update_id = 0
+    for offset, mode in enumerate(MODES):
+        config._swipe_mode = mode
+        fake.calls.clear()
+        latencies: List[float] = []
+        calls: List[int] = []
+        
+        for user_id in range(offset * swipers + 1, (offset + 1) * swipers + 1):
+            target_id = 100000
+            for _ in range(swipes_per_user):
+                update_id += 1
+                before = sum(fake.calls.values())
+                started = time.perf_counter()
+                await dp.feed_raw_update(bot, make_swipe(update_id, user_id, target_id))
+                latencies.append(time.perf_counter() - started)
+                calls.append(sum(fake.calls.values()) - before)
+                target_id += 1
+        
+        print(f"SWIPE_MODE={mode}")
+        print(f"  Swipes:        {len(latencies)} (simulated RTT {rtt * 1000:.0f}ms)")
+        print(f"  API calls:     {sum(calls) / len(calls):.2f}/swipe {dict(fake.calls)}")
+        print(f"  Latency:       p50 {percentile(latencies, 0.5) * 1000:.1f}ms, "
+              f"p95 {percentile(latencies, 0.95) * 1000:.1f}ms")
+    
+    await bot.session.close()
+    await api_runner.cleanup()
+
+
+if __name__ == "__main__":
+    swipers = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    swipes_per_user = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    rtt = (float(sys.argv[3]) if len(sys.argv) > 3 else 30) / 1000
+    try:
+        asyncio.run(run(swipers, swipes_per_user, rtt))
+    finally:
+        shutil.rmtree(TMP_DIR, ignore_errors=True)
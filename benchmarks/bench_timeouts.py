@@ -0,0 +1,89 @@
+"""
+Benchmark: per-user timeout handling vs. the bulk expire_timeouts sweep.
+
+Usage: python benchmarks/bench_timeouts.py [expirations]
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TMP_DIR = tempfile.mkdtemp(prefix="meetme_bench_")
+os.environ.setdefault("BOT_TOKEN", "bench")
+os.environ["DATABASE_PATH"] = os.path.join(TMP_DIR, "bench.db")
+
+import database as db
+from config import config
+
+
+def seed(expirations: int) -> None:
+    """Create `expirations` stale pending matches and as many stale unpair requests."""
+    db.init_database()
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    stale = "2000-01-01 00:00:00"
+    
+    users = []
+    for i in range(expirations * 2):
+        status = "pending_pair" if i < expirations else "rejection_pending"
+        users.append((i + 1, f"user{i}", "Bench", "User", 20, "male" if i % 2 else "female",
+                      "approved", status, stale))
+    cursor.executemany("""
+        INSERT INTO users (user_id, username, first_name, last_name, age, gender,
+            approval_status, pairing_status, status_updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, users)
+    
+    half = expirations // 2
+    cursor.executemany("INSERT INTO matches (user1_id, user2_id, created_at) VALUES (?, ?, ?)",
+                      [(2 * i + 1, 2 * i + 2, stale) for i in range(half)])
+    cursor.executemany("""
+        INSERT INTO rejection_requests (user_id, partner_id, reason, created_at) VALUES (?, ?, ?, ?)
+    """, [(expirations + 2 * i + 1, expirations + 2 * i + 2, "bench", stale) for i in range(half)])
+    cursor.executemany("INSERT INTO pair_history (user1_id, user2_id) VALUES (?, ?)",
+                      [(expirations + 2 * i + 1, expirations + 2 * i + 2) for i in range(half)])
+    
+    conn.commit()
+    conn.close()
+
+
+def legacy_sweep() -> int:
+    """The previous scheduler loop: one lookup + transaction per user / request."""
+    notified = 0
+    for user in db.get_timed_out_pending_pairs(config.pending_timeout):
+        success, partner_id = db.auto_expire_pending_match(user["user_id"])
+        if success:
+            notified += 2
+    for req in db.get_timed_out_rejections(config.rejection_timeout):
+        success, user_id, partner_id = db.auto_approve_rejection(req["id"])
+        if success:
+            notified += 2
+    return notified
+
+
+def bulk_sweep() -> int:
+    return len(db.expire_timeouts(config.pending_timeout, config.rejection_timeout))
+
+
+def run(name: str, sweep, template: str) -> None:
+    shutil.copy(template, config.database_path)
+    start = time.perf_counter()
+    notified = sweep()
+    elapsed = time.perf_counter() - start
+    print(f"{name:8s} {elapsed * 1000:10.1f} ms  ({notified} notifications)")
+
+
+if __name__ == "__main__":
+    expirations = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    seed(expirations)
+    template = os.path.join(TMP_DIR, "template.db")
+    shutil.copy(config.database_path, template)
+    
+    print(f"Timeout sweep, {expirations} expirations")
+    run("legacy", legacy_sweep, template)
+    run("bulk", bulk_sweep, template)
+    shutil.rmtree(TMP_DIR, ignore_errors=True)
@@ -0,0 +1,161 @@
+"""
+Load test: webhook ingestion against a local fake Telegram Bot API.
+
+Starts a fake Bot API server, runs the bot's webhook app pointed at it and
+posts /start updates from distinct users. Reports webhook ack latency and
+end-to-end time until every reply has reached the fake API.
+
+Usage: python benchmarks/fake_telegram.py [updates] [concurrency]
+"""
+
+import asyncio
+import os
+import sys
+import shutil
+import tempfile
+import time
+from collections import Counter
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+API_PORT = 8081
+WEBHOOK_PORT = 8082
+SECRET = "bench-secret"
+
+TMP_DIR = tempfile.mkdtemp(prefix="meetme_bench_")
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+os.environ["DATABASE_PATH"] = os.path.join(TMP_DIR, "bench.db")
+os.environ["RUN_MODE"] = "webhook"
+os.environ["WEBHOOK_URL"] = f"http://127.0.0.1:{WEBHOOK_PORT}"
+os.environ["WEBHOOK_SECRET"] = SECRET
+os.environ["TELEGRAM_API_URL"] = f"http://127.0.0.1:{API_PORT}"
+
+from aiohttp import ClientSession, web
+
+import database as db
+from bot import create_bot, create_dispatcher
+from config import config
+from server import create_webhook_app
+
+
+class FakeTelegram:
+    """Minimal Bot API: answers every method with a plausible result and counts calls."""
+    
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay  # simulated Bot API round trip
+        self.calls = Counter()
+        self.message_id = 0
+        self.replies = asyncio.Event()
+        self.expected_replies = 0
+    
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        data = await request.post()
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        
+        if method == "getMe":
+            result = {"id": 123456, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        elif method.startswith("send"):
+            self.message_id += 1
+            result = {
+                "message_id": self.message_id,
+                "date": int(time.time()),
+                "chat": {"id": int(data["chat_id"]), "type": "private"},
+                "text": data.get("text", data.get("caption", ""))
+            }
+            if method == "sendMessage" and self.calls[method] >= self.expected_replies:
+                self.replies.set()
+        else:
+            result = True
+        
+        return web.json_response({"ok": True, "result": result})
+    
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+
+def make_update(update_id: int, user_id: int) -> dict:
+    user = {"id": user_id, "is_bot": False, "first_name": "User", "username": f"user{user_id}"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": user,
+            "text": "/start",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}]
+        }
+    }
+
+
+def percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def start_site(app: web.Application, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def run(updates: int, concurrency: int) -> None:
+    db.init_database()
+    
+    fake = FakeTelegram()
+    fake.expected_replies = updates
+    api_runner = await start_site(fake.create_app(), API_PORT)
+    
+    bot = create_bot()
+    dp = create_dispatcher()
+    webhook_runner = await start_site(create_webhook_app(dp, bot), WEBHOOK_PORT)
+    
+    url = f"http://127.0.0.1:{WEBHOOK_PORT}{config.webhook_path}"
+    acks: List[float] = []
+    queue = asyncio.Queue()
+    for i in range(updates):
+        queue.put_nowait(make_update(i + 1, 1000 + i))
+    
+    async with ClientSession() as session:
+        async with session.post(url, json=make_update(0, 999), headers={}) as response:
+            print(f"Without secret token: HTTP {response.status}")
+        
+        async def worker():
+            while not queue.empty():
+                update = queue.get_nowait()
+                started = time.perf_counter()
+                async with session.post(url, json=update,
+                                        headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}) as response:
+                    await response.read()
+                acks.append(time.perf_counter() - started)
+        
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        acked = time.perf_counter() - started
+        await asyncio.wait_for(fake.replies.wait(), timeout=120)
+        elapsed = time.perf_counter() - started
+    
+    print(f"Updates:         {updates} (concurrency {concurrency}, max in flight {config.webhook_max_updates})")
+    print(f"Acked in:        {acked:.2f}s")
+    print(f"Ack latency:     p50 {percentile(acks, 0.5) * 1000:.1f}ms, p95 {percentile(acks, 0.95) * 1000:.1f}ms")
+    print(f"All replies in:  {elapsed:.2f}s ({updates / elapsed:.0f} updates/s)")
+    print(f"Bot API calls:   {dict(fake.calls)}")
+    
+    await webhook_runner.cleanup()
+    await api_runner.cleanup()
+
+
+if __name__ == "__main__":
+    updates = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    try:
+        asyncio.run(run(updates, concurrency))
+    finally:
+        shutil.rmtree(TMP_DIR, ignore_errors=True)
@@ -1,27 +1,27 @@
 import asyncio
 import logging
-import threading
-from flask import Flask, jsonify
 
+from aiohttp import FormData, web
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
 from aiogram.enums import ParseMode
+from aiogram.methods import TelegramMethod
 
 from config.settings import config
 import database as db
 from handlers import user_router, matching_router, admin_router
 from scheduler import scheduler_loop
-
-# --- Flask для Keep-Alive ---
-app = Flask(__name__)
-
-@app.route("/health")
-def health():
-    return jsonify({"status": "ok"})
-
-def run_flask():
-    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)), use_reloader=False)
+from broadcast import resume_running_jobs
+from server import create_app, create_webhook_app, set_webhook
+from middlewares import (
+    UpdateMetricsMiddleware, HandlerNameMiddleware, UserLockMiddleware, BanGateMiddleware,
+    ReachableMiddleware, ThrottleMiddleware, LoadShedMiddleware
+)
+from lagmonitor import watchdog
+from storage import SQLiteStorage, TrackedStorage
+from keyboards import payload
 
 # --- Логирование ---
 logging.basicConfig(
@@ -30,37 +30,105 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+class PrebuiltMarkupSession(AiohttpSession):
+    """Sends prebuilt keyboards' cached JSON instead of dumping and re-encoding them."""
+    
+    def build_form_data(self, bot: Bot, method: TelegramMethod) -> FormData:
+        markup_json = payload(getattr(method, "reply_markup", None))
+        if markup_json is None:
+            return super().build_form_data(bot, method)
+        
+        # Build the form without the markup (empty fields are skipped), then add the cached JSON
+        form = super().build_form_data(bot, method.model_copy(update={"reply_markup": None}))
+        form.add_field("reply_markup", markup_json)
+        return form
+
+
 # --- aiogram бот ---
-async def main() -> None:
-    logger.info("Initializing database...")
-    db.init_database()
+def create_bot() -> Bot:
+    api = TelegramAPIServer.from_base(config.telegram_api_url) if config.telegram_api_url else PRODUCTION
     
-    bot = Bot(
+    return Bot(
         token=config.bot_token,
+        session=PrebuiltMarkupSession(api=api),
         default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN)
     )
+
+
+async def on_startup(bot: Bot, dispatcher: Dispatcher) -> None:
+    if config.run_mode == "webhook":
+        await set_webhook(bot, dispatcher)
+    else:
+        await bot.delete_webhook(drop_pending_updates=True)
     
-    dp = Dispatcher(storage=MemoryStorage())
+    dispatcher["scheduler_task"] = asyncio.create_task(scheduler_loop(bot, interval_minutes=60))
+    watchdog.start()
+    resume_running_jobs(bot)
+
+
+async def on_shutdown(dispatcher: Dispatcher) -> None:
+    dispatcher["scheduler_task"].cancel()
+    watchdog.stop()
+    logger.info("Bot stopped!")
+
+
+def create_dispatcher() -> Dispatcher:
+    dp = Dispatcher(storage=TrackedStorage(SQLiteStorage()))
+    # Banned users are dropped before aiogram's FSM middleware loads their state
+    dp.update.outer_middleware.unregister(dp.fsm)
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.update.outer_middleware(BanGateMiddleware())
+    dp.update.outer_middleware(dp.fsm)
+    dp.update.outer_middleware(ReachableMiddleware())
+    dp.update.outer_middleware(ThrottleMiddleware())
+    dp.update.outer_middleware(UserLockMiddleware())
+    dp.update.outer_middleware(LoadShedMiddleware())
+    dp.message.middleware(HandlerNameMiddleware())
+    dp.callback_query.middleware(HandlerNameMiddleware())
     
     dp.include_router(admin_router)
     dp.include_router(matching_router)
     dp.include_router(user_router)
     
-    logger.info("Starting Meet Me Waltz Partner bot...")
-    await bot.delete_webhook(drop_pending_updates=True)
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    return dp
+
+
+async def main() -> None:
+    logger.info("Initializing database...")
+    db.init_database()
+    
+    bot = create_bot()
+    dp = create_dispatcher()
     
-    scheduler_task = asyncio.create_task(scheduler_loop(bot, interval_minutes=60))
+    # /health and /metrics, served from the same event loop
+    runner = web.AppRunner(create_app())
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", config.port).start()
     
+    logger.info("Starting Meet Me Waltz Partner bot...")
     try:
         await dp.start_polling(bot)
     finally:
-        scheduler_task.cancel()
+        await runner.cleanup()
         await bot.session.close()
-        logger.info("Bot stopped!")
+
+
+def main_webhook() -> None:
+    logger.info("Initializing database...")
+    db.init_database()
+    
+    bot = create_bot()
+    dp = create_dispatcher()
+    
+    logger.info("Starting Meet Me Waltz Partner bot (webhook mode)...")
+    web.run_app(create_webhook_app(dp, bot), host="0.0.0.0", port=config.port)
 
 # --- запуск ---
 if __name__ == "__main__":
-    # старт Flask в отдельном потоке
-    threading.Thread(target=run_flask, daemon=True).start()
-    # старт aiogram
-    asyncio.run(main())
+    if config.run_mode == "webhook":
+        main_webhook()
+    else:
+        asyncio.run(main())
@@ -0,0 +1,133 @@
+"""
+Broadcast jobs - resumable, throttled delivery with persisted progress.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Dict
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+
+import database as db
+from keyboards import get_admin_menu_keyboard, get_broadcast_control_keyboard
+from notifier import notifier
+from texts import ADMIN_BROADCAST_PROGRESS, ADMIN_BROADCAST_SENT, format_broadcast_status
+
+logger = logging.getLogger(__name__)
+
+# Recipients per page; the cursor is persisted after each page, so at most
+# one page is re-sent after a crash
+PAGE_SIZE = 30
+PROGRESS_INTERVAL = 5  # seconds between progress edits
+
+_tasks: Dict[int, asyncio.Task] = {}
+
+
+def render_progress(job) -> str:
+    """Build progress text for a job row."""
+    return ADMIN_BROADCAST_PROGRESS.format(
+        id=job["id"],
+        status=format_broadcast_status(job["status"]),
+        processed=job["sent"] + job["failed"] + job["blocked"],
+        total=job["total"],
+        sent=job["sent"],
+        failed=job["failed"],
+        blocked=job["blocked"]
+    )
+
+
+async def update_progress(bot: Bot, job_id: int) -> None:
+    """Edit the admin's progress message in place."""
+    job = db.get_broadcast_job(job_id)
+    if not job or not job["progress_message_id"]:
+        return
+    
+    try:
+        await bot.edit_message_text(
+            render_progress(job),
+            chat_id=job["chat_id"],
+            message_id=job["progress_message_id"],
+            parse_mode="Markdown",
+            reply_markup=get_broadcast_control_keyboard(job_id, job["status"])
+        )
+    except TelegramBadRequest:
+        # Unchanged text or deleted message
+        pass
+
+
+async def run_job(bot: Bot, job_id: int) -> None:
+    """Stream recipients in ID order and send until done, paused or cancelled."""
+    last_edit = 0.0
+    
+    try:
+        while True:
+            job = db.get_broadcast_job(job_id)
+            if not job or job["status"] != "running":
+                break
+            
+            segment = json.loads(job["segment"]) if job["segment"] else None
+            recipients = db.get_broadcast_recipients(job["cursor"], PAGE_SIZE, segment)
+            if not recipients:
+                db.set_broadcast_status(job_id, "done", ("running",))
+                break
+            
+            result = await notifier.notify(bot, recipients, job["message"], parse_mode="Markdown")
+            db.advance_broadcast_job(job_id, recipients[-1], result.sent, result.failed, result.blocked)
+            
+            if time.monotonic() - last_edit >= PROGRESS_INTERVAL:
+                await update_progress(bot, job_id)
+                last_edit = time.monotonic()
+    except Exception as e:
+        logger.error(f"Broadcast #{job_id} error: {e}")
+        # Leave it resumable from the admin panel
+        pause_job(job_id)
+    finally:
+        _tasks.pop(job_id, None)
+    
+    await update_progress(bot, job_id)
+    
+    job = db.get_broadcast_job(job_id)
+    if job and job["status"] == "done":
+        logger.info(f"Broadcast #{job_id} done: {job['sent']}/{job['total']} sent")
+        await notifier.send(
+            bot,
+            job["chat_id"],
+            ADMIN_BROADCAST_SENT.format(success=job["sent"], total=job["total"]),
+            parse_mode="Markdown",
+            reply_markup=get_admin_menu_keyboard()
+        )
+
+
+def start_job(bot: Bot, job_id: int) -> None:
+    """Start the worker for a job unless it is already running."""
+    if job_id in _tasks:
+        return
+    _tasks[job_id] = asyncio.create_task(run_job(bot, job_id))
+
+
+def pause_job(job_id: int) -> bool:
+    """Pause a running job; the worker stops after the current page."""
+    return db.set_broadcast_status(job_id, "paused", ("running",))
+
+
+def resume_job(bot: Bot, job_id: int) -> bool:
+    """Resume a paused job from its cursor."""
+    if not db.set_broadcast_status(job_id, "running", ("paused",)):
+        return False
+    start_job(bot, job_id)
+    return True
+
+
+def cancel_job(job_id: int) -> bool:
+    """Cancel a running or paused job."""
+    return db.set_broadcast_status(job_id, "cancelled", ("running", "paused"))
+
+
+def resume_running_jobs(bot: Bot) -> None:
+    """Restart workers for jobs interrupted by a restart."""
+    for job in db.get_running_broadcast_jobs():
+        logger.info(f"Resuming broadcast #{job['id']} after user {job['cursor']}")
+        start_job(bot, job["id"])
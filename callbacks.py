@@ -0,0 +1,123 @@
+"""
+Callback data - typed factories with short, unique prefixes.
+
+Packed as "<prefix>:<field>:<field>", e.g. "lk:123456789". Each router only
+accepts its own prefixes (one set lookup), so a user's "rm:<id>" can never
+reach an admin handler the way "reject_match_<id>" used to hit "reject_".
+"""
+
+from typing import Dict, Optional, Set, Type
+
+from aiogram.filters import Filter
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import CallbackQuery
+
+
+# ==================== MATCHING ====================
+
+class LikeCb(CallbackData, prefix="lk"):
+    user_id: int
+
+
+class SkipCb(CallbackData, prefix="sk"):
+    user_id: int
+
+
+class ConfirmPairCb(CallbackData, prefix="cp"):
+    user_id: int
+
+
+class RejectMatchCb(CallbackData, prefix="rm"):
+    user_id: int
+
+
+# ==================== ADMIN ====================
+
+class AdminMenuCb(CallbackData, prefix="am"):
+    action: str
+
+
+class ApproveUserCb(CallbackData, prefix="au"):
+    user_id: int
+
+
+class RejectUserCb(CallbackData, prefix="ru"):
+    user_id: int
+
+
+class BanUserCb(CallbackData, prefix="bu"):
+    user_id: int
+
+
+class BatchReviewCb(CallbackData, prefix="br"):
+    action: str
+    user_id: int = 0
+    n: int = 0
+    selected: bool = False
+
+
+class PairsPageCb(CallbackData, prefix="pg"):
+    action: str
+    user_id: int
+
+
+class ApproveUnpairCb(CallbackData, prefix="ua"):
+    request_id: int
+
+
+class DenyUnpairCb(CallbackData, prefix="ud"):
+    request_id: int
+
+
+class BroadcastCb(CallbackData, prefix="bd"):
+    action: str
+
+
+class BroadcastSegmentCb(CallbackData, prefix="bs"):
+    segment: str
+
+
+class BroadcastControlCb(CallbackData, prefix="bc"):
+    action: str
+    job_id: int
+
+
+# ==================== ROUTING ====================
+
+MATCHING_CALLBACKS = (LikeCb, SkipCb, ConfirmPairCb, RejectMatchCb)
+ADMIN_CALLBACKS = (
+    AdminMenuCb, ApproveUserCb, RejectUserCb, BanUserCb, BatchReviewCb, PairsPageCb, ApproveUnpairCb,
+    DenyUnpairCb, BroadcastCb, BroadcastSegmentCb, BroadcastControlCb
+)
+
+# Callbacks that change both users of a pair; `user_id` is the other user
+PAIR_CALLBACKS: Dict[str, Type[CallbackData]] = {
+    cls.__prefix__: cls for cls in (LikeCb, ConfirmPairCb, RejectMatchCb)
+}
+
+
+def callback_prefix(data: str) -> str:
+    return data.partition(":")[0]
+
+
+def pair_partner_id(data: Optional[str]) -> Optional[int]:
+    """Other user touched by a pair callback, if `data` is one."""
+    if not data:
+        return None
+    cls = PAIR_CALLBACKS.get(callback_prefix(data))
+    if cls is None:
+        return None
+    try:
+        return cls.unpack(data).user_id
+    except (TypeError, ValueError):
+        return None
+
+
+class CallbackPrefix(Filter):
+    """Router-level filter: accept only callbacks whose prefix belongs to the router."""
+    
+    def __init__(self, *factories: Type[CallbackData]):
+        self.prefixes: Set[str] = {factory.__prefix__ for factory in factories}
+    
+    async def __call__(self, callback: CallbackQuery) -> bool:
+        return bool(callback.data) and callback_prefix(callback.data) in self.prefixes
@@ -2,19 +2,195 @@
 Database module - all SQLite operations.
 """
 
+import json
+import logging
+import re
 import sqlite3
-from typing import Optional, List, Tuple
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Deque, Dict, Optional, List, Set, Tuple
 from datetime import datetime, timedelta
 from config import config, DEFAULT_AGE_DIFF
+import metrics
 
+logger = logging.getLogger(__name__)
+
+
+# ==================== QUERY PROFILER ====================
+
+SLOW_QUERY_LOG_SIZE = 50
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+_PLACEHOLDER_LIST = re.compile(r"\?(\s*,\s*\?)+")
+_STRING_LITERAL = re.compile(r"'[^']*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class QueryStats:
+    """Accumulated timings for one statement template."""
+    template: str
+    calls: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    # Last concrete statement, kept for on-demand EXPLAIN
+    sql: str = ""
+    params: tuple = ()
+
+
+_query_stats: Dict[str, QueryStats] = {}
+_slow_queries: Deque[dict] = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_stats_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql: str) -> str:
+    """Reduce a statement to its template: literals and IN-lists collapsed."""
+    template = _WHITESPACE.sub(" ", sql).strip()
+    template = _STRING_LITERAL.sub("?", template)
+    template = _NUMBER_LITERAL.sub("?", template)
+    return _PLACEHOLDER_LIST.sub("?, ...", template)
+
+
+def explain(conn: sqlite3.Connection, sql: str, params=()) -> List[str]:
+    """EXPLAIN QUERY PLAN lines for a statement (empty for non-DML)."""
+    if not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return []
+    # Connection.execute uses a plain cursor, so this isn't profiled itself
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return [row["detail"] for row in rows]
+
+
+def _record_query(conn: sqlite3.Connection, sql: str, params, elapsed: float) -> str:
+    metrics.DB_QUERIES.observe(elapsed)
+    template = normalize_sql(sql)
+    params = params if isinstance(params, dict) else tuple(params or ())
+    
+    with _stats_lock:
+        stats = _query_stats.get(template)
+        if stats is None:
+            stats = _query_stats[template] = QueryStats(template)
+        stats.calls += 1
+        stats.total += elapsed
+        stats.max = max(stats.max, elapsed)
+        stats.sql = sql
+        stats.params = params
+    
+    if elapsed * 1000 >= config.slow_query_ms:
+        try:
+            # This statement's own params: stats.params may already be another thread's
+            plan = explain(conn, sql, params)
+        except sqlite3.Error as e:
+            plan = [f"EXPLAIN failed: {e}"]
+        _slow_queries.append({"template": template, "ms": elapsed * 1000, "plan": plan, "at": datetime.now()})
+        logger.warning(f"Slow query ({elapsed * 1000:.0f}ms): {template} | plan: {'; '.join(plan)}")
+    return template
+
+
+def _record_fetch(template: str, elapsed: float, statement_total: float) -> None:
+    """Add fetch time to a template already counted by _record_query."""
+    with _stats_lock:
+        stats = _query_stats.get(template)
+        if stats is not None:
+            stats.total += elapsed
+            stats.max = max(stats.max, statement_total)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Cursor that records statement time per statement template. SQLite produces
+    most rows while they are fetched, so fetchone/fetchmany/fetchall time is
+    added to the statement's total (the slow query log still only sees execute).
+    """
+    _template: Optional[str] = None
+    _elapsed: float = 0.0
+    
+    def execute(self, sql: str, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._elapsed = time.perf_counter() - started
+            self._template = _record_query(self.connection, sql, parameters, self._elapsed)
+    
+    def executemany(self, sql: str, seq_of_parameters):
+        seq_of_parameters = list(seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            first = seq_of_parameters[0] if seq_of_parameters else ()
+            self._template = None
+            _record_query(self.connection, sql, first, time.perf_counter() - started)
+    
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+    
+    def fetchmany(self, *args):
+        return self._timed_fetch(super().fetchmany, *args)
+    
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+    
+    def _timed_fetch(self, fetch, *args):
+        started = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            if self._template is not None:
+                elapsed = time.perf_counter() - started
+                self._elapsed += elapsed
+                _record_fetch(self._template, elapsed, self._elapsed)
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors are TimedCursor."""
+    
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+
+def get_query_stats(limit: int = 10) -> List[QueryStats]:
+    """Statement templates with the most total time first."""
+    with _stats_lock:
+        stats = list(_query_stats.values())
+    return sorted(stats, key=lambda s: s.total, reverse=True)[:limit]
+
+
+def get_slow_queries() -> List[dict]:
+    """Recent slow statements, newest first."""
+    return list(reversed(_slow_queries))
+
+
+def explain_query(stats: QueryStats) -> List[str]:
+    """Run EXPLAIN QUERY PLAN for the last statement seen with this template."""
+    conn = get_connection()
+    try:
+        return explain(conn, stats.sql, stats.params)
+    finally:
+        conn.close()
+
+
+# ==================== CONNECTION ====================
 
 def get_connection() -> sqlite3.Connection:
     """Create database connection."""
-    conn = sqlite3.connect(config.database_path)
+    conn = sqlite3.connect(config.database_path, factory=TimedConnection)
     conn.row_factory = sqlite3.Row
     return conn
 
 
+def _add_column_if_missing(cursor: sqlite3.Cursor, table: str, column: str, definition: str) -> None:
+    """Add a column to an existing table (CREATE TABLE IF NOT EXISTS won't)."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in [row["name"] for row in cursor.fetchall()]:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
 def init_database() -> None:
     """Initialize all tables."""
     conn = get_connection()
@@ -42,11 +218,14 @@ def init_database() -> None:
             preferred_age_min INTEGER DEFAULT 16,
             preferred_age_max INTEGER DEFAULT 100,
             search_expanded INTEGER DEFAULT 0,
+            profile_version INTEGER DEFAULT 0,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             status_updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (partner_id) REFERENCES users(user_id)
         )
     """)
+    _add_column_if_missing(cursor, "users", "profile_version", "INTEGER DEFAULT 0")
+    
     
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS likes (
@@ -104,8 +283,153 @@ def init_database() -> None:
         )
     """)
     
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS broadcast_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            progress_message_id INTEGER DEFAULT NULL,
+            message TEXT NOT NULL,
+            status TEXT DEFAULT 'running',
+            cursor INTEGER DEFAULT 0,
+            total INTEGER DEFAULT 0,
+            sent INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            blocked INTEGER DEFAULT 0,
+            segment TEXT DEFAULT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    _add_column_if_missing(cursor, "broadcast_jobs", "segment", "TEXT DEFAULT NULL")
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS undeliverable (
+            user_id INTEGER PRIMARY KEY,
+            reason TEXT NOT NULL,
+            failed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    # Persistent FSM storage (see storage.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}',
+            updated_at REAL NOT NULL
+        )
+    """)
+    
+    # Admin review queue: profiles handed to an admin, and the maintained pending count
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS review_claims (
+            user_id INTEGER PRIMARY KEY,
+            admin_id INTEGER NOT NULL,
+            claimed_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    
+    # Profile versions are the card cache key (see helpers.py). They come from one global
+    # sequence, so a deleted and re-registered account never reuses a version of the old one.
+    cursor.execute("""
+        INSERT OR IGNORE INTO counters (name, value)
+        SELECT 'profile_version', COALESCE(MAX(profile_version), 0) FROM users
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_users_profile_version_insert
+        AFTER INSERT ON users
+        BEGIN
+            UPDATE counters SET value = value + 1 WHERE name = 'profile_version';
+            UPDATE users SET profile_version = (SELECT value FROM counters WHERE name = 'profile_version')
+            WHERE user_id = NEW.user_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_users_profile_version_update
+        AFTER UPDATE OF username, first_name, last_name, age, gender, course, interests, about_me ON users
+        BEGIN
+            UPDATE counters SET value = value + 1 WHERE name = 'profile_version';
+            UPDATE users SET profile_version = (SELECT value FROM counters WHERE name = 'profile_version')
+            WHERE user_id = NEW.user_id;
+        END
+    """)
+    
+    cursor.execute("""
+        INSERT OR REPLACE INTO counters (name, value)
+        SELECT 'pending_review', COUNT(*) FROM users WHERE approval_status = 'pending' AND is_banned = 0
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_users_pending_insert
+        AFTER INSERT ON users WHEN NEW.approval_status = 'pending' AND NEW.is_banned = 0
+        BEGIN
+            UPDATE counters SET value = value + 1 WHERE name = 'pending_review';
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_users_pending_delete
+        AFTER DELETE ON users WHEN OLD.approval_status = 'pending' AND OLD.is_banned = 0
+        BEGIN
+            UPDATE counters SET value = value - 1 WHERE name = 'pending_review';
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_users_pending_update
+        AFTER UPDATE OF approval_status, is_banned ON users
+        WHEN (OLD.approval_status = 'pending' AND OLD.is_banned = 0)
+            != (NEW.approval_status = 'pending' AND NEW.is_banned = 0)
+        BEGIN
+            UPDATE counters
+            SET value = value + (CASE WHEN NEW.approval_status = 'pending' AND NEW.is_banned = 0 THEN 1 ELSE -1 END)
+            WHERE name = 'pending_review';
+        END
+    """)
+    
+    # Indexes for the timeout sweep and unpair bookkeeping
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_pairing_updated
+        ON users(pairing_status, status_updated_at)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_matches_status ON matches(status, user1_id, user2_id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_rejections_status_created
+        ON rejection_requests(status, created_at)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_pair_history_users ON pair_history(user1_id, user2_id)
+    """)
+    
+    # Broadcast segments: keyset scans by user_id within a status
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_pairing_id ON users(pairing_status, user_id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_approval_id ON users(approval_status, user_id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_created ON users(created_at)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states(updated_at)
+    """)
+    
+    # Review queue keyset: pending, unbanned profiles oldest first
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_review_queue
+        ON users(approval_status, is_banned, created_at, user_id)
+    """)
+    
     conn.commit()
     conn.close()
+    load_banned()
     print("Database initialized!")
 
 
@@ -179,18 +503,80 @@ def get_all_users() -> List[sqlite3.Row]:
     return users
 
 
-def get_pending_users() -> List[sqlite3.Row]:
-    """Get users pending approval."""
+REVIEW_CLAIM_TTL = 900  # seconds an admin keeps a claimed profile to themselves
+
+# Each admin's position in the review queue, (created_at, user_id) of the last profile handed out
+_review_positions: Dict[int, Tuple[str, int]] = {}
+
+
+def _unclaimed_pending(cursor: sqlite3.Cursor, limit: int, after: Optional[Tuple[str, int]] = None,
+                       until: Optional[Tuple[str, int]] = None) -> List[sqlite3.Row]:
+    """Pending profiles without a live claim, in queue order, within a keyset range."""
+    conditions = [
+        "approval_status = 'pending'", "is_banned = 0",
+        "NOT EXISTS (SELECT 1 FROM review_claims WHERE review_claims.user_id = users.user_id)"
+    ]
+    params: list = []
+    if after is not None:
+        conditions.append("(created_at, user_id) > (?, ?)")
+        params.extend(after)
+    if until is not None:
+        conditions.append("(created_at, user_id) <= (?, ?)")
+        params.extend(until)
+    cursor.execute(f"""
+        SELECT * FROM users WHERE {" AND ".join(conditions)}
+        ORDER BY created_at, user_id
+        LIMIT ?
+    """, (*params, limit))
+    return cursor.fetchall()
+
+
+def claim_pending_batch(admin_id: int, limit: int, ttl: int = REVIEW_CLAIM_TTL) -> List[sqlite3.Row]:
+    """
+    Next pending profiles nobody else is reviewing, claimed for `admin_id`.
+    Pages through the review-queue index from the admin's last position and
+    wraps to the head for profiles left behind; the admin's previous claims
+    are released.
+    """
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE approval_status = 'pending' AND is_banned = 0 ORDER BY created_at")
-    users = cursor.fetchall()
-    conn.close()
-    return users
+    now = time.time()
+    position = _review_positions.get(admin_id)
+    try:
+        cursor.execute("DELETE FROM review_claims WHERE admin_id = ? OR claimed_at < ?", (admin_id, now - ttl))
+        users = _unclaimed_pending(cursor, limit, after=position)
+        if len(users) < limit and position is not None:
+            users += _unclaimed_pending(cursor, limit - len(users), until=position)
+        if users:
+            cursor.executemany("INSERT OR REPLACE INTO review_claims (user_id, admin_id, claimed_at) VALUES (?, ?, ?)",
+                              [(u["user_id"], admin_id, now) for u in users])
+            _review_positions[admin_id] = (users[-1]["created_at"], users[-1]["user_id"])
+        conn.commit()
+        return users
+    finally:
+        conn.close()
+
+
+def claim_next_pending(admin_id: int, ttl: int = REVIEW_CLAIM_TTL) -> Optional[sqlite3.Row]:
+    """Oldest unclaimed pending profile, claimed for `admin_id`."""
+    users = claim_pending_batch(admin_id, 1, ttl)
+    return users[0] if users else None
+
+
+def get_pending_count() -> int:
+    """Pending, unbanned profiles (trigger-maintained, no table scan)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT value FROM counters WHERE name = 'pending_review'")
+        row = cursor.fetchone()
+        return row["value"] if row else 0
+    finally:
+        conn.close()
 
 
 def update_approval_status(user_id: int, status: str) -> bool:
-    """Update approval status."""
+    """Update approval status and release the profile's review claim."""
     conn = get_connection()
     cursor = conn.cursor()
     try:
@@ -204,8 +590,55 @@ def update_approval_status(user_id: int, status: str) -> bool:
                 UPDATE users SET approval_status=?, status_updated_at=CURRENT_TIMESTAMP
                 WHERE user_id=?
             """, (status, user_id))
+        updated = cursor.rowcount > 0
+        cursor.execute("DELETE FROM review_claims WHERE user_id = ?", (user_id,))
         conn.commit()
-        return cursor.rowcount > 0
+        return updated
+    finally:
+        conn.close()
+
+
+def get_pending_by_ids(user_ids: List[int]) -> Dict[int, sqlite3.Row]:
+    """The given profiles that are still pending and not banned, by user_id."""
+    if not user_ids:
+        return {}
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    placeholders = ", ".join("?" * len(user_ids))
+    try:
+        cursor.execute(f"""
+            SELECT * FROM users
+            WHERE user_id IN ({placeholders}) AND +approval_status = 'pending' AND +is_banned = 0
+        """, user_ids)
+        return {row["user_id"]: row for row in cursor.fetchall()}
+    finally:
+        conn.close()
+
+
+def update_approval_status_batch(user_ids: List[int], status: str) -> List[int]:
+    """
+    Decide several pending profiles in one UPDATE and release their claims.
+    Returns the ids actually changed (profiles still pending and not banned).
+    """
+    if not user_ids:
+        return []
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    placeholders = ", ".join("?" * len(user_ids))
+    pairing = "pairing_status='active_finding', " if status == "approved" else ""
+    try:
+        # Unary + keeps the planner on primary-key lookups instead of the review-queue index
+        cursor.execute(f"""
+            UPDATE users SET approval_status=?, {pairing}status_updated_at=CURRENT_TIMESTAMP
+            WHERE user_id IN ({placeholders}) AND +approval_status = 'pending' AND +is_banned = 0
+            RETURNING user_id
+        """, (status, *user_ids))
+        decided = [row["user_id"] for row in cursor.fetchall()]
+        cursor.execute(f"DELETE FROM review_claims WHERE user_id IN ({placeholders})", user_ids)
+        conn.commit()
+        return decided
     finally:
         conn.close()
 
@@ -237,6 +670,37 @@ def set_search_expanded(user_id: int, expanded: bool) -> bool:
         conn.close()
 
 
+# Banned users, loaded by init_database and kept in sync by ban_user/unban_user,
+# so gating an update never touches the database
+_banned: Optional[Dict[int, str]] = None
+
+
+def load_banned() -> None:
+    """(Re)load the in-memory ban list from the users table."""
+    global _banned
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT user_id, ban_reason FROM users WHERE is_banned = 1")
+    _banned = {row["user_id"]: row["ban_reason"] or "" for row in cursor.fetchall()}
+    conn.close()
+
+
+def _get_banned() -> Dict[int, str]:
+    if _banned is None:
+        load_banned()
+    return _banned
+
+
+def is_banned(user_id: int) -> bool:
+    """Check the in-memory ban list."""
+    return user_id in _get_banned()
+
+
+def get_ban_reason(user_id: int) -> Optional[str]:
+    """Ban reason for a banned user ("" if none was given), None if not banned."""
+    return _get_banned().get(user_id)
+
+
 def ban_user(user_id: int, reason: str) -> bool:
     """Ban a user."""
     conn = get_connection()
@@ -255,8 +719,14 @@ def ban_user(user_id: int, reason: str) -> bool:
             UPDATE users SET is_banned=1, ban_reason=?, pairing_status='inactive',
                 partner_id=NULL, status_updated_at=CURRENT_TIMESTAMP WHERE user_id=?
         """, (reason, user_id))
+        banned = cursor.rowcount > 0
+        cursor.execute("DELETE FROM review_claims WHERE user_id = ?", (user_id,))
         conn.commit()
-        return cursor.rowcount > 0
+        
+        if banned:
+            _get_banned()[user_id] = reason or ""
+            return True
+        return False
     finally:
         conn.close()
 
@@ -271,6 +741,7 @@ def unban_user(user_id: int) -> bool:
                 status_updated_at=CURRENT_TIMESTAMP WHERE user_id=?
         """, (user_id,))
         conn.commit()
+        _get_banned().pop(user_id, None)
         return cursor.rowcount > 0
     finally:
         conn.close()
@@ -309,9 +780,11 @@ def delete_user_account(user_id: int) -> Tuple[bool, int]:
         cursor.execute("DELETE FROM matches WHERE user1_id = ? OR user2_id = ?", (user_id, user_id))
         cursor.execute("DELETE FROM rejection_requests WHERE user_id = ? OR partner_id = ?", (user_id, user_id))
         cursor.execute("DELETE FROM pair_history WHERE user1_id = ? OR user2_id = ?", (user_id, user_id))
+        cursor.execute("DELETE FROM undeliverable WHERE user_id = ?", (user_id,))
         cursor.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
         
         conn.commit()
+        _get_banned().pop(user_id, None)
         return True, partner_id
     except Exception as e:
         print(f"Delete user error: {e}")
@@ -322,21 +795,11 @@ def delete_user_account(user_id: int) -> Tuple[bool, int]:
 
 # ==================== MATCHING ====================
 
-def get_potential_partners(user_id: int, expanded: bool = False) -> List[sqlite3.Row]:
-    """Get potential partners with smart filtering."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-    user = cursor.fetchone()
-    if not user:
-        conn.close()
-        return []
-    
-    # Base query
-    query = """
-        SELECT * FROM users 
-        WHERE user_id != ?
+def _candidate_filter(user: sqlite3.Row, expanded: bool) -> Tuple[str, list]:
+    """WHERE clause and params for users that may be shown to `user` as a candidate."""
+    user_id = user["user_id"]
+    clause = """
+        user_id != ?
         AND approval_status = 'approved'
         AND pairing_status = 'active_finding'
         AND is_banned = 0
@@ -351,26 +814,48 @@ def get_potential_partners(user_id: int, expanded: bool = False) -> List[sqlite3
     
     # Gender filter (opposite gender by default)
     if user["preferred_gender"] != "any":
-        query += " AND gender = ?"
+        clause += " AND gender = ?"
         params.append(user["preferred_gender"])
     else:
         # Default to opposite gender
         opposite = "female" if user["gender"] == "male" else "male"
-        query += " AND gender = ?"
+        clause += " AND gender = ?"
         params.append(opposite)
     
     # Age filter
     if expanded:
         # Expanded: use user's full preferred range
-        query += " AND age >= ? AND age <= ?"
+        clause += " AND age >= ? AND age <= ?"
         params.extend([user["preferred_age_min"], user["preferred_age_max"]])
     else:
         # Strict: within DEFAULT_AGE_DIFF (1 year)
-        query += " AND age >= ? AND age <= ?"
+        clause += " AND age >= ? AND age <= ?"
         params.extend([user["age"] - DEFAULT_AGE_DIFF, user["age"] + DEFAULT_AGE_DIFF])
     
-    # Prioritize by shared interests
-    query += " ORDER BY "
+    return clause, params
+
+
+def get_potential_partners(user_id: int, expanded: bool = False, exclude_id: Optional[int] = None) -> List[sqlite3.Row]:
+    """Get potential partners with smart filtering (never `exclude_id`, e.g. the card on screen)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
+    user = cursor.fetchone()
+    if not user:
+        conn.close()
+        return []
+    
+    clause, params = _candidate_filter(user, expanded)
+    query = f"SELECT * FROM users WHERE {clause}"
+    
+    if exclude_id is not None:
+        query += " AND user_id != ?"
+        params.append(exclude_id)
+    
+    # Users who blocked the bot go last (a match with them would never be seen),
+    # then prioritize by shared interests
+    query += " ORDER BY (user_id IN (SELECT user_id FROM undeliverable)), "
     if user["interests"]:
         interests = user["interests"].lower().split(",")
         interest_conditions = []
@@ -389,6 +874,24 @@ def get_potential_partners(user_id: int, expanded: bool = False) -> List[sqlite3
     return users
 
 
+def get_available_candidate(user_id: int, candidate_id: int, expanded: bool = False) -> Optional[sqlite3.Row]:
+    """Candidate's current row if get_potential_partners() could still return them to `user_id`."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
+        user = cursor.fetchone()
+        if not user:
+            return None
+        
+        clause, params = _candidate_filter(user, expanded)
+        cursor.execute(f"SELECT * FROM users WHERE user_id = ? AND {clause}", [candidate_id, *params])
+        return cursor.fetchone()
+    finally:
+        conn.close()
+
+
 def has_more_partners(user_id: int, expanded: bool) -> bool:
     """Check if there are more potential partners."""
     partners = get_potential_partners(user_id, expanded)
@@ -727,6 +1230,286 @@ def auto_approve_rejection(request_id: int) -> Tuple[bool, int, int]:
     return approve_rejection(request_id, "Auto-approved (timeout)")
 
 
+def expire_timeouts(pending_hours: int, rejection_hours: int) -> List[Tuple[int, str]]:
+    """
+    Expire all due pending matches and auto-approve all due unpair requests
+    in one transaction.
+    Returns (user_id, kind) notifications, kind is 'match_expired' or 'unpair_auto_approved'.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    now = datetime.now()
+    pending_cutoff = now - timedelta(hours=pending_hours)
+    rejection_cutoff = now - timedelta(hours=rejection_hours)
+    notifications = []
+    
+    try:
+        # One row per match, even when both members are due
+        cursor.execute("""
+            SELECT m.id, m.user1_id, m.user2_id FROM matches m
+            JOIN users u1 ON u1.user_id = m.user1_id
+            JOIN users u2 ON u2.user_id = m.user2_id
+            WHERE m.status = 'pending'
+            AND ((u1.pairing_status = 'pending_pair' AND u1.status_updated_at < ?)
+                OR (u2.pairing_status = 'pending_pair' AND u2.status_updated_at < ?))
+        """, (pending_cutoff, pending_cutoff))
+        matches = cursor.fetchall()
+        
+        if matches:
+            # A user can be in several due matches; reset and notify them once
+            expired_users = list(dict.fromkeys(uid for m in matches for uid in (m["user1_id"], m["user2_id"])))
+            cursor.executemany("UPDATE matches SET status = 'rejected' WHERE id = ?",
+                              [(m["id"],) for m in matches])
+            cursor.executemany("""
+                UPDATE users SET pairing_status='active_finding', partner_id=NULL,
+                    status_updated_at=CURRENT_TIMESTAMP WHERE user_id = ?
+            """, [(uid,) for uid in expired_users])
+            cursor.executemany("INSERT OR IGNORE INTO skips (from_user_id, to_user_id) VALUES (?, ?)",
+                              [(m["user1_id"], m["user2_id"]) for m in matches] +
+                              [(m["user2_id"], m["user1_id"]) for m in matches])
+            notifications.extend((uid, "match_expired") for uid in expired_users)
+        
+        cursor.execute("""
+            SELECT id, user_id, partner_id FROM rejection_requests
+            WHERE status = 'pending' AND created_at < ?
+        """, (rejection_cutoff,))
+        requests = cursor.fetchall()
+        
+        if requests:
+            cursor.executemany("""
+                UPDATE rejection_requests SET status='approved', admin_comment=?,
+                    resolved_at=CURRENT_TIMESTAMP WHERE id=?
+            """, [("Auto-approved (timeout)", r["id"]) for r in requests])
+            # Both partners may have asked; same as above, once per user
+            unpaired_users = list(dict.fromkeys(uid for r in requests for uid in (r["user_id"], r["partner_id"])))
+            cursor.executemany("""
+                UPDATE users SET pairing_status='active_finding', partner_id=NULL,
+                    status_updated_at=CURRENT_TIMESTAMP WHERE user_id = ?
+            """, [(uid,) for uid in unpaired_users])
+            cursor.executemany("""
+                UPDATE pair_history SET unpaired_at=CURRENT_TIMESTAMP
+                WHERE user1_id=? AND user2_id=? AND unpaired_at IS NULL
+            """, [(min(r["user_id"], r["partner_id"]), max(r["user_id"], r["partner_id"]))
+                  for r in requests])
+            notifications.extend((uid, "unpair_auto_approved") for uid in unpaired_users)
+        
+        conn.commit()
+        return notifications
+    finally:
+        conn.close()
+
+
+# ==================== BROADCAST JOBS ====================
+
+# Segment keys that map 1:1 to user columns (equality filters)
+SEGMENT_COLUMNS = ("pairing_status", "approval_status", "gender", "course")
+
+
+def compile_segment(segment: Optional[dict]) -> Tuple[str, list]:
+    """
+    Compile a broadcast segment into a WHERE clause and params.
+    Supported keys: SEGMENT_COLUMNS plus 'since' (registered on/after YYYY-MM-DD).
+    """
+    segment = segment or {}
+    clauses = ["is_banned = 0", "user_id NOT IN (SELECT user_id FROM undeliverable)"]
+    params = []
+    
+    for column in SEGMENT_COLUMNS:
+        if segment.get(column):
+            clauses.append(f"{column} = ?")
+            params.append(segment[column])
+    
+    if segment.get("since"):
+        clauses.append("created_at >= ?")
+        params.append(segment["since"])
+    
+    return " AND ".join(clauses), params
+
+
+def count_broadcast_recipients(segment: Optional[dict] = None) -> int:
+    """Count broadcast recipients in a segment."""
+    where, params = compile_segment(segment)
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*) as c FROM users WHERE {where}", params)
+    count = cursor.fetchone()["c"]
+    conn.close()
+    return count
+
+
+def get_broadcast_recipients(after_user_id: int, limit: int, segment: Optional[dict] = None) -> List[int]:
+    """Get the next page of recipient IDs after the cursor, in ID order."""
+    where, params = compile_segment(segment)
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT user_id FROM users WHERE {where} AND user_id > ?
+        ORDER BY user_id LIMIT ?
+    """, (*params, after_user_id, limit))
+    user_ids = [row["user_id"] for row in cursor.fetchall()]
+    conn.close()
+    return user_ids
+
+
+def create_broadcast_job(admin_id: int, chat_id: int, message: str, total: int,
+                         segment: Optional[dict] = None) -> int:
+    """Create broadcast job. Returns job ID."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO broadcast_jobs (admin_id, chat_id, message, total, segment) VALUES (?, ?, ?, ?, ?)
+        """, (admin_id, chat_id, message, total, json.dumps(segment) if segment else None))
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+
+def get_broadcast_job(job_id: int) -> Optional[sqlite3.Row]:
+    """Get broadcast job by ID."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM broadcast_jobs WHERE id = ?", (job_id,))
+    job = cursor.fetchone()
+    conn.close()
+    return job
+
+
+def get_running_broadcast_jobs() -> List[sqlite3.Row]:
+    """Get jobs that were running (e.g. before a restart)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM broadcast_jobs WHERE status = 'running' ORDER BY id")
+    jobs = cursor.fetchall()
+    conn.close()
+    return jobs
+
+
+def set_broadcast_progress_message(job_id: int, message_id: int) -> bool:
+    """Remember the admin message that shows job progress."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("UPDATE broadcast_jobs SET progress_message_id=? WHERE id=?", (message_id, job_id))
+        conn.commit()
+        return cursor.rowcount > 0
+    finally:
+        conn.close()
+
+
+def advance_broadcast_job(job_id: int, cursor_user_id: int, sent: int, failed: int, blocked: int) -> bool:
+    """Move the recipient cursor and add delivery counts."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            UPDATE broadcast_jobs SET cursor=?, sent=sent+?, failed=failed+?, blocked=blocked+?,
+                updated_at=CURRENT_TIMESTAMP WHERE id=?
+        """, (cursor_user_id, sent, failed, blocked, job_id))
+        conn.commit()
+        return cursor.rowcount > 0
+    finally:
+        conn.close()
+
+
+def set_broadcast_status(job_id: int, status: str, from_statuses: Tuple[str, ...]) -> bool:
+    """Change job status if it is currently one of from_statuses."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        placeholders = ", ".join("?" * len(from_statuses))
+        cursor.execute(f"""
+            UPDATE broadcast_jobs SET status=?, updated_at=CURRENT_TIMESTAMP
+            WHERE id=? AND status IN ({placeholders})
+        """, (status, job_id, *from_statuses))
+        conn.commit()
+        return cursor.rowcount > 0
+    finally:
+        conn.close()
+
+
+# ==================== DELIVERABILITY ====================
+
+def mark_undeliverable(user_id: int, reason: str) -> None:
+    """Record a chat we can't deliver to (blocked bot / chat not found)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            INSERT OR REPLACE INTO undeliverable (user_id, reason, failed_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+        """, (user_id, reason))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def clear_undeliverable(user_id: int) -> bool:
+    """Forget a recorded delivery failure."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM undeliverable WHERE user_id = ?", (user_id,))
+        conn.commit()
+        return cursor.rowcount > 0
+    finally:
+        conn.close()
+
+
+def get_undeliverable_ids() -> Set[int]:
+    """Get IDs of all unreachable users."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT user_id FROM undeliverable")
+    user_ids = {row["user_id"] for row in cursor.fetchall()}
+    conn.close()
+    return user_ids
+
+
+# ==================== FSM STORAGE ====================
+
+def get_fsm_record(key: str) -> Optional[sqlite3.Row]:
+    """Get stored FSM state and data for a storage key."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT state, data, updated_at FROM fsm_states WHERE key = ?", (key,))
+    row = cursor.fetchone()
+    conn.close()
+    return row
+
+
+def save_fsm_records(records: List[Tuple[str, Optional[str], str, float]],
+                     deleted_keys: List[str]) -> None:
+    """Write a batch of (key, state, data, updated_at) and drop emptied keys in one transaction."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        if records:
+            cursor.executemany("""
+                INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    state = excluded.state, data = excluded.data, updated_at = excluded.updated_at
+            """, records)
+        if deleted_keys:
+            cursor.executemany("DELETE FROM fsm_states WHERE key = ?", [(key,) for key in deleted_keys])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def delete_expired_fsm_records(before: float) -> int:
+    """Drop FSM sessions untouched since `before` (unix time)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM fsm_states WHERE updated_at < ?", (before,))
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
 # ==================== STATISTICS ====================
 
 def get_statistics() -> dict:
@@ -738,7 +1521,7 @@ def get_statistics() -> dict:
         "total_users": 0, "pending_approval": 0, "approved": 0, "rejected": 0,
         "banned": 0, "active_finding": 0, "pending_pair": 0, "have_pair": 0,
         "rejection_pending": 0, "total_pairs": 0, "total_pair_history": 0,
-        "pending_rejections": 0, "total_likes": 0, "total_skips": 0
+        "pending_rejections": 0, "total_likes": 0, "total_skips": 0, "unreachable": 0
     }
     
     cursor.execute("SELECT COUNT(*) as c FROM users")
@@ -779,6 +1562,9 @@ def get_statistics() -> dict:
     cursor.execute("SELECT COUNT(*) as c FROM skips")
     stats["total_skips"] = cursor.fetchone()["c"]
     
+    cursor.execute("SELECT COUNT(*) as c FROM undeliverable")
+    stats["unreachable"] = cursor.fetchone()["c"]
+    
     conn.close()
     return stats
 
@@ -792,7 +1578,47 @@ def get_all_pairs() -> List[sqlite3.Row]:
                u2.last_name as partner_last_name, u2.username as partner_username
         FROM users u1 JOIN users u2 ON u1.partner_id = u2.user_id
         WHERE u1.pairing_status = 'have_pair' AND u1.user_id < u1.partner_id
+        ORDER BY u1.user_id
     """)
     pairs = cursor.fetchall()
     conn.close()
-    return pairs
\ No newline at end of file
+    return pairs
+
+
+def get_pairs_page(after: int = 0, before: Optional[int] = None, limit: int = 100) -> List[sqlite3.Row]:
+    """
+    Pairs keyed by their lower user_id, ascending: the `limit` pairs after
+    `after`, or with `before` the `limit` pairs preceding it.
+    Keyset scan on idx_users_pairing_id, so any page costs the same.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        if before is None:
+            key, order = "u1.user_id > ?", "ASC"
+        else:
+            key, order = "u1.user_id < ?", "DESC"
+        cursor.execute(f"""
+            SELECT u1.user_id, u1.first_name, u1.username,
+                   u2.user_id as partner_user_id, u2.first_name as partner_first_name,
+                   u2.username as partner_username
+            FROM users u1 JOIN users u2 ON u1.partner_id = u2.user_id
+            WHERE u1.pairing_status = 'have_pair' AND {key} AND u1.user_id < u1.partner_id
+            ORDER BY u1.user_id {order}
+            LIMIT ?
+        """, (after if before is None else before, limit))
+        pairs = cursor.fetchall()
+        return pairs if before is None else pairs[::-1]
+    finally:
+        conn.close()
+
+
+def get_pairs_count() -> int:
+    """Number of current pairs."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM users WHERE pairing_status = 'have_pair' AND user_id < partner_id")
+        return cursor.fetchone()[0]
+    finally:
+        conn.close()
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+Data export - stream a table or report into a gzip-compressed CSV or JSONL file.
+
+Rows come off an open SQLite cursor in batches and go straight into the
+compressed file, so memory stays flat however large the table is. Used by
+the admin /export command and from the command line for offline analysis:
+    
+    python export.py users --format jsonl --output users.jsonl.gz
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import BinaryIO, Dict, Optional
+
+import database as db
+
+EXPORT_BATCH = 500  # rows fetched from the cursor at a time
+COMPRESS_LEVEL = 6  # gzip's own default; 9 costs ~2x the CPU for a few % smaller files
+FORMATS = ("csv", "jsonl")
+
+EXPORTS: Dict[str, str] = {
+    "users": "SELECT * FROM users ORDER BY user_id",
+    "pairs": """
+        SELECT u1.user_id, u1.first_name, u1.last_name, u1.username,
+               u2.user_id AS partner_id, u2.first_name AS partner_first_name,
+               u2.last_name AS partner_last_name, u2.username AS partner_username
+        FROM users u1 JOIN users u2 ON u1.partner_id = u2.user_id
+        WHERE u1.pairing_status = 'have_pair' AND u1.user_id < u1.partner_id
+        ORDER BY u1.user_id
+    """,
+    "pair_history": "SELECT * FROM pair_history ORDER BY id",
+    "rejection_requests": "SELECT * FROM rejection_requests ORDER BY id",
+    # Likes/skips given and received per user
+    "swipes": """
+        SELECT u.user_id, u.first_name, u.username, u.approval_status, u.pairing_status,
+               COALESCE(lg.n, 0) AS likes_given, COALESCE(lr.n, 0) AS likes_received,
+               COALESCE(sg.n, 0) AS skips_given, COALESCE(sr.n, 0) AS skips_received
+        FROM users u
+        LEFT JOIN (SELECT from_user_id AS user_id, COUNT(*) AS n FROM likes GROUP BY from_user_id) lg
+            ON lg.user_id = u.user_id
+        LEFT JOIN (SELECT to_user_id AS user_id, COUNT(*) AS n FROM likes GROUP BY to_user_id) lr
+            ON lr.user_id = u.user_id
+        LEFT JOIN (SELECT from_user_id AS user_id, COUNT(*) AS n FROM skips GROUP BY from_user_id) sg
+            ON sg.user_id = u.user_id
+        LEFT JOIN (SELECT to_user_id AS user_id, COUNT(*) AS n FROM skips GROUP BY to_user_id) sr
+            ON sr.user_id = u.user_id
+        ORDER BY u.user_id
+    """
+}
+
+
+@dataclass
+class ExportResult:
+    """A finished export file."""
+    name: str
+    fmt: str
+    path: str
+    rows: int
+    size: int
+    seconds: float
+
+
+def export_filename(name: str, fmt: str, when: Optional[datetime] = None) -> str:
+    return f"{name}_{(when or datetime.now()).strftime('%Y%m%d_%H%M%S')}.{fmt}.gz"
+
+
+def write_export(name: str, fmt: str, fileobj: BinaryIO) -> int:
+    """Stream an export into a binary file object as gzip. Returns the row count."""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(EXPORTS[name])
+        columns = [column[0] for column in cursor.description]
+        rows = 0
+        
+        with gzip.GzipFile(fileobj=fileobj, mode="wb", compresslevel=COMPRESS_LEVEL) as gz:
+            out = io.TextIOWrapper(gz, encoding="utf-8", newline="")
+            writer = csv.writer(out) if fmt == "csv" else None
+            if writer:
+                writer.writerow(columns)
+            
+            while True:
+                batch = cursor.fetchmany(EXPORT_BATCH)
+                if not batch:
+                    break
+                if writer:
+                    writer.writerows(batch)
+                else:
+                    out.writelines(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in batch)
+                rows += len(batch)
+            
+            out.flush()
+            out.detach()
+        return rows
+    finally:
+        conn.close()
+
+
+def export_to_file(name: str, fmt: str = "csv", path: Optional[str] = None) -> ExportResult:
+    """Write an export to `path` (default: a new temporary file, the caller removes it)."""
+    if name not in EXPORTS:
+        raise ValueError(f"Unknown export: {name}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+    
+    if path is None:
+        fd, path = tempfile.mkstemp(prefix=f"{name}_", suffix=f".{fmt}.gz")
+        os.close(fd)
+    
+    started = time.monotonic()
+    try:
+        with open(path, "wb") as f:
+            rows = write_export(name, fmt, f)
+    except BaseException:
+        os.remove(path)
+        raise
+    return ExportResult(name, fmt, path, rows, os.path.getsize(path), time.monotonic() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export bot data as gzip-compressed CSV or JSONL.")
+    parser.add_argument("name", choices=list(EXPORTS))
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--output", help="file to write (default: <name>_<timestamp>.<format>.gz)")
+    args = parser.parse_args()
+    
+    result = export_to_file(args.name, args.format, args.output or export_filename(args.name, args.format))
+    print(f"{result.rows} rows -> {result.path} ({result.size} bytes, {result.seconds:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
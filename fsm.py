@@ -28,6 +28,7 @@ class RejectionStates(StatesGroup):
 class AdminStates(StatesGroup):
     """Admin operations."""
     waiting_for_broadcast = State()
+    choose_broadcast_segment = State()
     confirm_broadcast = State()
     waiting_for_dm_user_id = State()
     waiting_for_dm_message = State()
@@ -0,0 +1,135 @@
+"""
+Rendering helpers - Markdown escaping and profile cards shared by the handlers.
+
+Card text for a users row is memoized per (user_id, profile_version, kind).
+Triggers draw a new version from a global sequence whenever a row is inserted
+or a profile field changes, so a cached card never goes stale or outlives its
+account. The own-profile card also shows statuses and search preferences,
+which change far more often; it is always rendered fresh.
+"""
+
+from collections import OrderedDict
+from typing import Tuple
+
+from aiogram import Bot
+
+import metrics
+from texts import (
+    PARTNER_CARD, PROFILE_VIEW, ADMIN_PROFILE_REVIEW, REG_PREVIEW,
+    get_gender_emoji, get_gender_text, format_approval_status, format_pairing_status
+)
+
+MARKDOWN_SPECIAL = "_*[]()~`>#+-=|{}.!"
+_MARKDOWN_ESCAPES = str.maketrans({char: f"\\{char}" for char in MARKDOWN_SPECIAL})
+
+# Card kinds
+PARTNER = "partner"  # candidate shown while swiping
+PARTNER_CONTACT = "partner_contact"  # match / partner view, with @username
+PROFILE = "profile"  # the user's own profile
+REVIEW = "review"  # admin approval queue
+PREVIEW = "preview"  # registration preview (FSM data, never cached)
+
+NO_PHOTO = "\n\n📷 [No photo]"
+NO_MEDIA = "\n\n📷 [No media]"
+
+CARD_CACHE_SIZE = 4096
+_cards: "OrderedDict[Tuple[int, int, str], str]" = OrderedDict()
+
+
+def escape_markdown(text: str) -> str:
+    """Escape special characters for Markdown."""
+    if not text:
+        return ""
+    return text.translate(_MARKDOWN_ESCAPES)
+
+
+def format_card(user: dict, kind: str) -> str:
+    """Card text for a users row (or registration data) of the given kind."""
+    course = escape_markdown(user.get("course", ""))
+    interests = escape_markdown(user.get("interests", ""))
+    about_me = escape_markdown(user.get("about_me", ""))
+    fields = {
+        "first_name": escape_markdown(user["first_name"]),
+        "age": user["age"],
+        "gender_emoji": get_gender_emoji(user["gender"]),
+        "gender": get_gender_text(user["gender"])
+    }
+    
+    if kind in (PARTNER, PARTNER_CONTACT):
+        username = escape_markdown(user.get("username", ""))
+        return PARTNER_CARD.format(
+            **fields,
+            username_line=f"📱 @{username}\n" if kind == PARTNER_CONTACT and username else "",
+            course_line=f"🎓 {course}\n" if course else "",
+            interests_line=f"💝 {interests}\n" if interests else "",
+            about_line=f"💭 {about_me}" if about_me else ""
+        )
+    
+    fields["user_id"] = user["user_id"]
+    fields["last_name"] = escape_markdown(user["last_name"])
+    
+    if kind == REVIEW:
+        return ADMIN_PROFILE_REVIEW.format(
+            **fields,
+            username=escape_markdown(user["username"]),
+            course_line=f"🎓 {course}\n" if course else "",
+            interests_line=f"💝 {interests}\n" if interests else "",
+            about_line=f"💭 {about_me}" if about_me else ""
+        )
+    
+    fields.update(
+        course_line=f"🎓 Course: {course}\n" if course else "",
+        interests_line=f"💝 Interests: {interests}\n" if interests else "",
+        about_line=f"💭 About: {about_me}\n" if about_me else "",
+        pref_gender=user["preferred_gender"].title(),
+        pref_age_min=user["preferred_age_min"],
+        pref_age_max=user["preferred_age_max"]
+    )
+    if kind == PREVIEW:
+        return REG_PREVIEW.format(**fields)
+    
+    return PROFILE_VIEW.format(
+        **fields,
+        username=escape_markdown(user["username"]),
+        approval_status=format_approval_status(user["approval_status"]),
+        pairing_status=format_pairing_status(user["pairing_status"])
+    )
+
+
+def render_card(user: dict, kind: str) -> str:
+    """format_card() memoized per (user_id, profile_version, kind); PROFILE is never cached."""
+    version = user.get("profile_version")
+    if version is None or kind == PROFILE:
+        return format_card(user, kind)
+    
+    key = (user["user_id"], version, kind)
+    text = _cards.get(key)
+    metrics.record_cache("cards", text is not None)
+    if text is not None:
+        _cards.move_to_end(key)
+        return text
+    
+    text = _cards[key] = format_card(user, kind)
+    if len(_cards) > CARD_CACHE_SIZE:
+        _cards.popitem(last=False)
+    return text
+
+
+async def send_card(bot: Bot, chat_id: int, user: dict, text: str,
+                    reply_markup=None, placeholder: str = NO_MEDIA) -> None:
+    """Send card text with the user's photo/video; video notes go first as their own message."""
+    media_file_id = user.get("media_file_id")
+    media_type = user.get("media_type") if media_file_id else None
+    
+    if media_type == "photo":
+        await bot.send_photo(chat_id, media_file_id, caption=text,
+                             parse_mode="Markdown", reply_markup=reply_markup)
+    elif media_type == "video":
+        await bot.send_video(chat_id, media_file_id, caption=text,
+                             parse_mode="Markdown", reply_markup=reply_markup)
+    elif media_type == "video_note":
+        await bot.send_video_note(chat_id, media_file_id)
+        await bot.send_message(chat_id, text, parse_mode="Markdown", reply_markup=reply_markup)
+    elif not media_type:
+        await bot.send_message(chat_id, text + placeholder,
+                               parse_mode="Markdown", reply_markup=reply_markup)
@@ -1,14 +1,28 @@
 """
 All keyboard layouts.
+
+Keyboards are built once at import and shared by every response; each keeps
+its Bot API JSON, which the bot session sends as-is instead of dumping and
+re-encoding the markup (see payload()). Inline keyboards that carry an id
+come from a template: the id is substituted into the cached JSON and the
+markup is interned per id.
 """
 
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple, Type, Union
+from aiogram.filters.callback_data import CallbackData
 from aiogram.types import (
     ReplyKeyboardMarkup,
     KeyboardButton,
     InlineKeyboardMarkup,
     InlineKeyboardButton
 )
+from pydantic import ConfigDict, PrivateAttr
 from config import COURSES
+from callbacks import (
+    LikeCb, SkipCb, ConfirmPairCb, RejectMatchCb, AdminMenuCb, ApproveUserCb, RejectUserCb, BanUserCb,
+    BatchReviewCb, PairsPageCb, ApproveUnpairCb, DenyUnpairCb, BroadcastCb, BroadcastSegmentCb, BroadcastControlCb
+)
 from texts import (
     BTN_FIND_PARTNER, BTN_MY_PROFILE, BTN_EDIT_PROFILE, BTN_MY_FILTERS,
     BTN_DELETE_ACCOUNT, BTN_VIEW_MATCH, BTN_MY_PARTNER, BTN_REQUEST_UNPAIR, BTN_CHECK_STATUS,
@@ -16,183 +30,324 @@ from texts import (
     BTN_MALE, BTN_FEMALE, BTN_ANY, BTN_SKIP_SIMPLE, BTN_SUBMIT, BTN_CANCEL,
     BTN_YES_UNPAIR, BTN_NO_CANCEL, BTN_ADMIN_PENDING, BTN_ADMIN_REJECTIONS,
     BTN_ADMIN_PAIRS, BTN_ADMIN_STATS, BTN_ADMIN_BROADCAST, BTN_ADMIN_DM,
-    BTN_ADMIN_BOT_CONTROL, BTN_APPROVE, BTN_REJECT, BTN_BAN
+    BTN_ADMIN_BOT_CONTROL, BTN_ADMIN_BATCH, BTN_APPROVE, BTN_REJECT, BTN_BAN,
+    BTN_BATCH_APPROVE_SELECTED, BTN_BATCH_REJECT_SELECTED, BTN_BATCH_APPROVE_ALL,
+    BTN_PAIRS_PREV, BTN_PAIRS_NEXT, BTN_PAIRS_EXPORT,
+    BTN_BROADCAST_PAUSE, BTN_BROADCAST_RESUME, BTN_BROADCAST_CANCEL,
+    BTN_SEGMENT_ALL, BTN_SEGMENT_SEARCHING, BTN_SEGMENT_PAIRED, BTN_SEGMENT_PENDING
 )
 
 
+# ==================== PREBUILT MARKUPS ====================
+
+class StaticReplyKeyboard(ReplyKeyboardMarkup):
+    """Immutable reply keyboard with its serialized form cached."""
+    model_config = ConfigDict(frozen=True)
+    _payload: str = PrivateAttr(default="")
+
+
+class StaticInlineKeyboard(InlineKeyboardMarkup):
+    """Immutable inline keyboard with its serialized form cached."""
+    model_config = ConfigDict(frozen=True)
+    _payload: str = PrivateAttr(default="")
+
+
+StaticMarkup = Union[StaticReplyKeyboard, StaticInlineKeyboard]
+
+
+def _prebuilt(markup: StaticMarkup) -> StaticMarkup:
+    markup._payload = markup.model_dump_json(exclude_none=True)
+    return markup
+
+
+def payload(markup) -> Optional[str]:
+    """Cached reply_markup JSON of a prebuilt keyboard, None for any other markup."""
+    if isinstance(markup, (StaticReplyKeyboard, StaticInlineKeyboard)):
+        return markup._payload or None
+    return None
+
+
+def _reply(*rows: Sequence[str], one_time: bool = True) -> StaticReplyKeyboard:
+    return _prebuilt(StaticReplyKeyboard(
+        keyboard=[[KeyboardButton(text=text) for text in row] for row in rows],
+        resize_keyboard=True, one_time_keyboard=one_time or None
+    ))
+
+
+def _inline(*rows: Sequence[Tuple[str, CallbackData]]) -> StaticInlineKeyboard:
+    return _prebuilt(StaticInlineKeyboard(
+        inline_keyboard=[
+            [InlineKeyboardButton(text=text, callback_data=data.pack()) for text, data in row]
+            for row in rows
+        ]
+    ))
+
+
+ID = "{id}"
+TEMPLATE_CACHE_SIZE = 1024  # interned markups per template
+
+
+def _callback_template(factory: Type[CallbackData], **fields) -> str:
+    """What factory(...).pack() returns, with ID in place of the field not given."""
+    values = [str(fields.get(name, ID)) for name in factory.model_fields]
+    return factory.__separator__.join([factory.__prefix__, *values])
+
+
+class InlineTemplate:
+    """
+    Inline layout whose callbacks all carry the same id, e.g. the candidate's
+    user_id. Markups are interned per id: a candidate shown to many users
+    reuses one keyboard.
+    """
+    
+    def __init__(self, *rows: Sequence[Tuple[str, str]], cache_size: int = TEMPLATE_CACHE_SIZE):
+        self.rows: List[List[Tuple[str, str]]] = [list(row) for row in rows]
+        self.payload = self._build(ID).model_dump_json(exclude_none=True)
+        self.cache_size = cache_size
+        self._markups: "OrderedDict[int, StaticInlineKeyboard]" = OrderedDict()
+    
+    def _build(self, value: str) -> StaticInlineKeyboard:
+        return StaticInlineKeyboard(inline_keyboard=[
+            [InlineKeyboardButton(text=text, callback_data=data.replace(ID, value)) for text, data in row]
+            for row in self.rows
+        ])
+    
+    def __call__(self, value: int) -> StaticInlineKeyboard:
+        markup = self._markups.get(value)
+        if markup is not None:
+            self._markups.move_to_end(value)
+            return markup
+        
+        markup = self._markups[value] = self._build(str(value))
+        markup._payload = self.payload.replace(ID, str(value))
+        if len(self._markups) > self.cache_size:
+            self._markups.popitem(last=False)
+        return markup
+
+
 # ==================== REGISTRATION ====================
 
+def _course_rows() -> List[List[str]]:
+    rows = [COURSES[i:i + 2] for i in range(0, len(COURSES), 2)]
+    rows.append([BTN_SKIP_SIMPLE])
+    return rows
+
+
+GENDER_KEYBOARD = _reply([BTN_MALE, BTN_FEMALE])
+COURSE_KEYBOARD = _reply(*_course_rows())
+SKIP_KEYBOARD = _reply([BTN_SKIP_SIMPLE])
+CONFIRM_KEYBOARD = _reply([BTN_SUBMIT, BTN_CANCEL])
+PREFERRED_GENDER_KEYBOARD = _reply([BTN_MALE, BTN_FEMALE], [BTN_ANY])
+CANCEL_KEYBOARD = _reply([BTN_CANCEL])
+
+
 def get_gender_keyboard() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup(
-        keyboard=[[KeyboardButton(text=BTN_MALE), KeyboardButton(text=BTN_FEMALE)]],
-        resize_keyboard=True, one_time_keyboard=True
-    )
+    return GENDER_KEYBOARD
 
 
 def get_course_keyboard() -> ReplyKeyboardMarkup:
-    rows = []
-    for i in range(0, len(COURSES), 2):
-        row = [KeyboardButton(text=COURSES[i])]
-        if i + 1 < len(COURSES):
-            row.append(KeyboardButton(text=COURSES[i + 1]))
-        rows.append(row)
-    rows.append([KeyboardButton(text=BTN_SKIP_SIMPLE)])
-    return ReplyKeyboardMarkup(keyboard=rows, resize_keyboard=True, one_time_keyboard=True)
+    return COURSE_KEYBOARD
 
 
 def get_skip_keyboard() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup(
-        keyboard=[[KeyboardButton(text=BTN_SKIP_SIMPLE)]],
-        resize_keyboard=True, one_time_keyboard=True
-    )
+    return SKIP_KEYBOARD
 
 
 def get_confirm_keyboard() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup(
-        keyboard=[[KeyboardButton(text=BTN_SUBMIT), KeyboardButton(text=BTN_CANCEL)]],
-        resize_keyboard=True, one_time_keyboard=True
-    )
+    return CONFIRM_KEYBOARD
 
 
 def get_preferred_gender_keyboard() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text=BTN_MALE), KeyboardButton(text=BTN_FEMALE)],
-            [KeyboardButton(text=BTN_ANY)]
-        ],
-        resize_keyboard=True, one_time_keyboard=True
-    )
+    return PREFERRED_GENDER_KEYBOARD
 
 
 # ==================== MAIN MENU ====================
 
+MAIN_MENUS: Dict[str, StaticReplyKeyboard] = {
+    "active_finding": _reply(
+        [BTN_FIND_PARTNER],
+        [BTN_MY_PROFILE, BTN_EDIT_PROFILE],
+        [BTN_MY_FILTERS, BTN_DELETE_ACCOUNT],
+        one_time=False
+    ),
+    "pending_pair": _reply(
+        [BTN_VIEW_MATCH],
+        [BTN_MY_PROFILE, BTN_DELETE_ACCOUNT],
+        one_time=False
+    ),
+    "have_pair": _reply(
+        [BTN_MY_PARTNER],
+        [BTN_MY_PROFILE, BTN_REQUEST_UNPAIR],
+        [BTN_DELETE_ACCOUNT],
+        one_time=False
+    ),
+    "rejection_pending": _reply(
+        [BTN_MY_PROFILE],
+        [BTN_CHECK_STATUS, BTN_CANCEL_REQUEST],
+        [BTN_DELETE_ACCOUNT],
+        one_time=False
+    )
+}
+DEFAULT_MAIN_MENU = _reply([BTN_MY_PROFILE], [BTN_DELETE_ACCOUNT], one_time=False)
+
+
 def get_main_menu_keyboard(pairing_status: str) -> ReplyKeyboardMarkup:
     """Dynamic main menu based on status."""
-    
-    if pairing_status == "active_finding":
-        keyboard = [
-            [KeyboardButton(text=BTN_FIND_PARTNER)],
-            [KeyboardButton(text=BTN_MY_PROFILE), KeyboardButton(text=BTN_EDIT_PROFILE)],
-            [KeyboardButton(text=BTN_MY_FILTERS), KeyboardButton(text=BTN_DELETE_ACCOUNT)]
-        ]
-    elif pairing_status == "pending_pair":
-        keyboard = [
-            [KeyboardButton(text=BTN_VIEW_MATCH)],
-            [KeyboardButton(text=BTN_MY_PROFILE), KeyboardButton(text=BTN_DELETE_ACCOUNT)]
-        ]
-    elif pairing_status == "have_pair":
-        keyboard = [
-            [KeyboardButton(text=BTN_MY_PARTNER)],
-            [KeyboardButton(text=BTN_MY_PROFILE), KeyboardButton(text=BTN_REQUEST_UNPAIR)],
-            [KeyboardButton(text=BTN_DELETE_ACCOUNT)]
-        ]
-    elif pairing_status == "rejection_pending":
-        keyboard = [
-            [KeyboardButton(text=BTN_MY_PROFILE)],
-            [KeyboardButton(text=BTN_CHECK_STATUS), KeyboardButton(text=BTN_CANCEL_REQUEST)],
-            [KeyboardButton(text=BTN_DELETE_ACCOUNT)]
-        ]
-    else:
-        keyboard = [
-            [KeyboardButton(text=BTN_MY_PROFILE)],
-            [KeyboardButton(text=BTN_DELETE_ACCOUNT)]
-        ]
-    
-    return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
+    return MAIN_MENUS.get(pairing_status, DEFAULT_MAIN_MENU)
 
 
 # ==================== MATCHING ====================
 
+MATCHING_TEMPLATE = InlineTemplate(
+    [(BTN_LIKE, _callback_template(LikeCb)), (BTN_SKIP, _callback_template(SkipCb))]
+)
+PAIR_CONFIRMATION_TEMPLATE = InlineTemplate(
+    [(BTN_WANT_PAIR, _callback_template(ConfirmPairCb))],
+    [(BTN_SEARCH_ANOTHER, _callback_template(RejectMatchCb))]
+)
+UNPAIR_CONFIRM_KEYBOARD = _reply([BTN_YES_UNPAIR], [BTN_NO_CANCEL])
+
+
 def get_matching_keyboard(target_user_id: int) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[[
-            InlineKeyboardButton(text=BTN_LIKE, callback_data=f"like_{target_user_id}"),
-            InlineKeyboardButton(text=BTN_SKIP, callback_data=f"skip_{target_user_id}")
-        ]]
-    )
+    return MATCHING_TEMPLATE(target_user_id)
 
 
 def get_pair_confirmation_keyboard(partner_id: int) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text=BTN_WANT_PAIR, callback_data=f"confirm_pair_{partner_id}")],
-            [InlineKeyboardButton(text=BTN_SEARCH_ANOTHER, callback_data=f"reject_match_{partner_id}")]
-        ]
-    )
+    return PAIR_CONFIRMATION_TEMPLATE(partner_id)
 
 
 def get_unpair_confirm_keyboard() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text=BTN_YES_UNPAIR)],
-            [KeyboardButton(text=BTN_NO_CANCEL)]
-        ],
-        resize_keyboard=True, one_time_keyboard=True
-    )
+    return UNPAIR_CONFIRM_KEYBOARD
 
 
 # ==================== ADMIN ====================
 
-def get_admin_menu_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text=BTN_ADMIN_PENDING, callback_data="admin_pending")],
-            [InlineKeyboardButton(text=BTN_ADMIN_REJECTIONS, callback_data="admin_rejections")],
-            [InlineKeyboardButton(text=BTN_ADMIN_PAIRS, callback_data="admin_pairs")],
-            [InlineKeyboardButton(text=BTN_ADMIN_STATS, callback_data="admin_stats")],
-            [
-                InlineKeyboardButton(text=BTN_ADMIN_BROADCAST, callback_data="admin_broadcast"),
-                InlineKeyboardButton(text=BTN_ADMIN_DM, callback_data="admin_dm")
-            ],
-            [InlineKeyboardButton(text=BTN_ADMIN_BOT_CONTROL, callback_data="admin_bot_control")]
-        ]
+ADMIN_MENU_KEYBOARD = _inline(
+    [(BTN_ADMIN_PENDING, AdminMenuCb(action="pending")), (BTN_ADMIN_BATCH, AdminMenuCb(action="batch"))],
+    [(BTN_ADMIN_REJECTIONS, AdminMenuCb(action="rejections"))],
+    [(BTN_ADMIN_PAIRS, AdminMenuCb(action="pairs"))],
+    [(BTN_ADMIN_STATS, AdminMenuCb(action="stats"))],
+    [(BTN_ADMIN_BROADCAST, AdminMenuCb(action="broadcast")), (BTN_ADMIN_DM, AdminMenuCb(action="dm"))],
+    [(BTN_ADMIN_BOT_CONTROL, AdminMenuCb(action="bot_control"))]
+)
+ADMIN_APPROVAL_TEMPLATE = InlineTemplate(
+    [(BTN_APPROVE, _callback_template(ApproveUserCb)), (BTN_REJECT, _callback_template(RejectUserCb))],
+    [(BTN_BAN, _callback_template(BanUserCb))]
+)
+BATCH_SELECTED = "☑️"
+BATCH_UNSELECTED = "⬜"
+BATCH_ROW_SIZE = 5
+BATCH_ACTION_ROWS = _inline(
+    [
+        (BTN_BATCH_APPROVE_SELECTED, BatchReviewCb(action="approve")),
+        (BTN_BATCH_REJECT_SELECTED, BatchReviewCb(action="reject"))
+    ],
+    [(BTN_BATCH_APPROVE_ALL, BatchReviewCb(action="approve_all"))]
+).inline_keyboard
+PAIRS_EXPORT_BUTTON = InlineKeyboardButton(
+    text=BTN_PAIRS_EXPORT, callback_data=AdminMenuCb(action="pairs_export").pack()
+)
+ADMIN_REJECTION_TEMPLATE = InlineTemplate(
+    [(BTN_APPROVE, _callback_template(ApproveUnpairCb)), (BTN_REJECT, _callback_template(DenyUnpairCb))]
+)
+
+
+def _bot_control_keyboard(profiler_button: Tuple[str, CallbackData]) -> StaticInlineKeyboard:
+    return _inline(
+        [profiler_button],
+        [("🔄 Restart Bot", AdminMenuCb(action="restart_bot"))],
+        [("🛑 Stop Bot", AdminMenuCb(action="stop_bot"))],
+        [("« Back", AdminMenuCb(action="back"))]
     )
 
 
+BOT_CONTROL_KEYBOARD = _bot_control_keyboard(("🔬 Start Profiler", AdminMenuCb(action="profiler_start")))
+BOT_CONTROL_PROFILING_KEYBOARD = _bot_control_keyboard(
+    ("⏹️ Stop Profiler & Send", AdminMenuCb(action="profiler_stop"))
+)
+
+BROADCAST_CONFIRM_KEYBOARD = _inline(
+    [("✅ Send", BroadcastCb(action="confirm")), ("❌ Cancel", BroadcastCb(action="cancel"))]
+)
+BROADCAST_SEGMENT_KEYBOARD = _inline(
+    [(BTN_SEGMENT_ALL, BroadcastSegmentCb(segment="all"))],
+    [
+        (BTN_SEGMENT_SEARCHING, BroadcastSegmentCb(segment="active_finding")),
+        (BTN_SEGMENT_PAIRED, BroadcastSegmentCb(segment="have_pair"))
+    ],
+    [(BTN_SEGMENT_PENDING, BroadcastSegmentCb(segment="pending"))]
+)
+BROADCAST_CONTROL_TEMPLATES: Dict[str, InlineTemplate] = {
+    "running": InlineTemplate([
+        (BTN_BROADCAST_PAUSE, _callback_template(BroadcastControlCb, action="pause")),
+        (BTN_BROADCAST_CANCEL, _callback_template(BroadcastControlCb, action="cancel"))
+    ]),
+    "paused": InlineTemplate([
+        (BTN_BROADCAST_RESUME, _callback_template(BroadcastControlCb, action="resume")),
+        (BTN_BROADCAST_CANCEL, _callback_template(BroadcastControlCb, action="cancel"))
+    ])
+}
+
+
+def get_admin_menu_keyboard() -> InlineKeyboardMarkup:
+    return ADMIN_MENU_KEYBOARD
+
+
 def get_admin_approval_keyboard(user_id: int) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text=BTN_APPROVE, callback_data=f"approve_{user_id}"),
-                InlineKeyboardButton(text=BTN_REJECT, callback_data=f"reject_{user_id}")
-            ],
-            [InlineKeyboardButton(text=BTN_BAN, callback_data=f"ban_{user_id}")]
-        ]
-    )
+    return ADMIN_APPROVAL_TEMPLATE(user_id)
+
+
+def get_batch_review_keyboard(entries: Sequence[Tuple[int, int, bool]]) -> InlineKeyboardMarkup:
+    """
+    Batch review page: a toggle per (line number, user_id, selected) entry,
+    then the page actions. The selection lives in the toggles' callback data.
+    """
+    toggles = [
+        InlineKeyboardButton(
+            text=f"{BATCH_SELECTED if selected else BATCH_UNSELECTED} {n}",
+            callback_data=BatchReviewCb(action="toggle", user_id=user_id, n=n, selected=selected).pack()
+        )
+        for n, user_id, selected in entries
+    ]
+    rows = [toggles[i:i + BATCH_ROW_SIZE] for i in range(0, len(toggles), BATCH_ROW_SIZE)]
+    return InlineKeyboardMarkup(inline_keyboard=rows + list(BATCH_ACTION_ROWS))
+
+
+def get_pairs_page_keyboard(first_id: Optional[int], last_id: Optional[int]) -> InlineKeyboardMarkup:
+    """Prev/next for a page of the pairs listing (None: no page that way), plus export."""
+    nav = []
+    if first_id is not None:
+        nav.append(InlineKeyboardButton(
+            text=BTN_PAIRS_PREV, callback_data=PairsPageCb(action="prev", user_id=first_id).pack()
+        ))
+    if last_id is not None:
+        nav.append(InlineKeyboardButton(
+            text=BTN_PAIRS_NEXT, callback_data=PairsPageCb(action="next", user_id=last_id).pack()
+        ))
+    return InlineKeyboardMarkup(inline_keyboard=[row for row in (nav, [PAIRS_EXPORT_BUTTON]) if row])
 
 
 def get_admin_rejection_keyboard(request_id: int) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[[
-            InlineKeyboardButton(text=BTN_APPROVE, callback_data=f"approve_unpair_{request_id}"),
-            InlineKeyboardButton(text=BTN_REJECT, callback_data=f"deny_unpair_{request_id}")
-        ]]
-    )
+    return ADMIN_REJECTION_TEMPLATE(request_id)
 
 
-def get_admin_bot_control_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="🔄 Restart Bot", callback_data="admin_restart_bot")],
-            [InlineKeyboardButton(text="🛑 Stop Bot", callback_data="admin_stop_bot")],
-            [InlineKeyboardButton(text="« Back", callback_data="admin_back")]
-        ]
-    )
+def get_admin_bot_control_keyboard(profiling: bool = False) -> InlineKeyboardMarkup:
+    return BOT_CONTROL_PROFILING_KEYBOARD if profiling else BOT_CONTROL_KEYBOARD
 
 
 def get_broadcast_confirm_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text="✅ Send", callback_data="broadcast_confirm"),
-                InlineKeyboardButton(text="❌ Cancel", callback_data="broadcast_cancel")
-            ]
-        ]
-    )
+    return BROADCAST_CONFIRM_KEYBOARD
+
+
+def get_broadcast_segment_keyboard() -> InlineKeyboardMarkup:
+    return BROADCAST_SEGMENT_KEYBOARD
+
+
+def get_broadcast_control_keyboard(job_id: int, status: str) -> Optional[InlineKeyboardMarkup]:
+    """Pause/resume/cancel controls for a broadcast job."""
+    template = BROADCAST_CONTROL_TEMPLATES.get(status)
+    return template(job_id) if template else None
 
 
 def get_cancel_keyboard() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup(
-        keyboard=[[KeyboardButton(text=BTN_CANCEL)]],
-        resize_keyboard=True, one_time_keyboard=True
-    )
\ No newline at end of file
+    return CANCEL_KEYBOARD
@@ -0,0 +1,140 @@
+"""
+Event-loop watchdog - detects stalls and attributes them to the blocking code.
+
+A heartbeat task ticks on the loop; a helper thread notices when the ticks stop
+and snapshots the loop thread's stack, so a blocking db call inside a handler
+shows up as "handler -> db function" instead of just "the bot was slow".
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import metrics
+from config import config
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = 0.1  # seconds between heartbeat ticks
+CHECK_INTERVAL = 0.05  # how often the watchdog thread looks at the heartbeat
+STACK_DEPTH = 12  # frames kept for the last stall report
+
+# Modules whose outermost frame names the code that owns the stall
+OWNER_MODULES = ("handlers", "scheduler", "broadcast", "notifier", "server")
+DB_MODULE = "database"
+
+
+@dataclass
+class Stall:
+    """One detected stall."""
+    handler: str
+    db_function: str
+    stack: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+
+def attribute(frame) -> Stall:
+    """Find the owning handler and the db function in a frame's stack."""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()  # outermost first
+    
+    handler = "unknown"
+    db_function = "-"
+    for f in frames:
+        module = f.f_globals.get("__name__", "")
+        if handler == "unknown" and module.split(".")[0] in OWNER_MODULES:
+            handler = f.f_code.co_name
+        if module.split(".")[0] == DB_MODULE:
+            db_function = f.f_code.co_name
+            break
+    
+    stack = [f"{f.f_globals.get('__name__', '?')}.{f.f_code.co_name}:{f.f_lineno}" for f in frames[-STACK_DEPTH:]]
+    return Stall(handler, db_function, stack)
+
+
+class Watchdog:
+    """Heartbeat on the event loop plus a thread that catches it stalling."""
+    
+    def __init__(self, threshold_ms: Optional[int] = None):
+        self.threshold = (threshold_ms if threshold_ms is not None else config.loop_stall_ms) / 1000
+        self.last_stall: Optional[Stall] = None
+        self._last_beat = time.monotonic()
+        self._captured: Optional[Tuple[float, Stall]] = None
+        self._loop_thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self) -> None:
+        """Start both halves; must be called from the event loop thread."""
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        self._task = asyncio.create_task(self._heartbeat())
+    
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+    
+    async def _heartbeat(self) -> None:
+        while True:
+            beat = time.monotonic()
+            self._last_beat = beat
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            lag = max(0.0, time.monotonic() - beat - HEARTBEAT_INTERVAL)
+            metrics.LOOP_LAG.observe(lag)
+            metrics.LOOP_LAG_LAST.set(lag)
+            
+            if lag >= self.threshold:
+                self._record(beat, lag)
+    
+    def _record(self, beat: float, lag: float) -> None:
+        captured = self._captured
+        if captured and captured[0] == beat:
+            stall = captured[1]
+        else:
+            # Stall ended before the thread looked
+            stall = Stall("unknown", "-")
+        stall.seconds = lag
+        self.last_stall = stall
+        
+        metrics.LOOP_STALLS.inc(handler=stall.handler, db_function=stall.db_function)
+        metrics.LOOP_STALL_SECONDS.inc(lag, handler=stall.handler, db_function=stall.db_function)
+        logger.warning(
+            f"Event loop blocked for {lag * 1000:.0f}ms in {stall.handler} -> {stall.db_function}: "
+            f"{' > '.join(stall.stack[-4:])}"
+        )
+    
+    def _watch(self) -> None:
+        while not self._stop.wait(CHECK_INTERVAL):
+            beat = self._last_beat
+            if time.monotonic() - beat - HEARTBEAT_INTERVAL < self.threshold:
+                continue
+            if self._captured and self._captured[0] == beat:
+                continue  # already captured this stall
+            
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                self._captured = (beat, attribute(frame))
+    
+    def top_sites(self, limit: int = 10) -> List[Tuple[str, str, int, float]]:
+        """(handler, db function, stalls, seconds) with the most stalled time first."""
+        seconds = metrics.LOOP_STALL_SECONDS.snapshot()
+        counts = metrics.LOOP_STALLS.snapshot()
+        sites = [(handler, db_function, int(counts.get((handler, db_function), 0)), total)
+                 for (handler, db_function), total in seconds.items()]
+        return sorted(sites, key=lambda site: site[3], reverse=True)[:limit]
+
+
+# Singleton instance
+watchdog = Watchdog()
@@ -2,85 +2,115 @@
 Matching handlers - partner search, pairing, unpair.
 """
 
+from typing import Optional
+
 from aiogram import Router, F, Bot
-from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove, InputMediaPhoto, InputMediaVideo
 from aiogram.fsm.context import FSMContext
 
 import database as db
+import metrics
+from config import config
 from states import RejectionStates
+from notifier import notifier
+from prefetch import prefetcher
+from helpers import escape_markdown, render_card, send_card, NO_PHOTO, PARTNER, PARTNER_CONTACT
+from callbacks import MATCHING_CALLBACKS, LikeCb, SkipCb, ConfirmPairCb, RejectMatchCb, CallbackPrefix
 from keyboards import (
     get_main_menu_keyboard, get_matching_keyboard,
     get_pair_confirmation_keyboard, get_unpair_confirm_keyboard
 )
 from texts import (
-    FINDING_PARTNER, PARTNER_CARD, NO_PARTNERS, NO_MORE_PARTNERS, ALL_SEEN,
+    FINDING_PARTNER, NO_PARTNERS, NO_MORE_PARTNERS, ALL_SEEN,
     MATCH_FOUND, MATCH_VIEW, MATCH_CONFIRMED_WAIT, MATCH_BOTH_CONFIRMED,
     MATCH_REJECTED, MATCH_REJECTED_PARTNER, PARTNER_VIEW,
     UNPAIR_CONFIRM, UNPAIR_REASON, UNPAIR_SUBMITTED, UNPAIR_CANCELLED,
     UNPAIR_STATUS_PENDING, BTN_FIND_PARTNER, BTN_VIEW_MATCH, BTN_MY_PARTNER,
     BTN_REQUEST_UNPAIR, BTN_YES_UNPAIR, BTN_NO_CANCEL, BTN_CHECK_STATUS, BTN_CANCEL_REQUEST,
-    get_gender_emoji, get_gender_text, build_optional_line
+    build_optional_line
 )
 
 matching_router = Router()
+matching_router.callback_query.filter(CallbackPrefix(*MATCHING_CALLBACKS))
 
 
-def escape_markdown(text: str) -> str:
-    """Escape special characters for Markdown."""
-    if not text:
-        return ""
-    special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-    for char in special_chars:
-        text = text.replace(char, f'\\{char}')
-    return text
+# Media a photo/video card can be edited into in place
+SWAPPABLE_MEDIA = {"photo": InputMediaPhoto, "video": InputMediaVideo}
 
 
 async def send_partner_card(bot: Bot, chat_id: int, user: dict, keyboard=None, show_username: bool = False) -> None:
     """Send partner profile card."""
-    # Escape special characters in user data
-    first_name = escape_markdown(user["first_name"])
-    username = escape_markdown(user.get("username", ""))
-    course = escape_markdown(user.get("course", ""))
-    interests = escape_markdown(user.get("interests", ""))
-    about_me = escape_markdown(user.get("about_me", ""))
-    
-    text = PARTNER_CARD.format(
-        first_name=first_name,
-        age=user["age"],
-        gender_emoji=get_gender_emoji(user["gender"]),
-        gender=get_gender_text(user["gender"]),
-        username_line=f"📱 @{username}\n" if show_username and username else "",
-        course_line=f"🎓 {course}\n" if course else "",
-        interests_line=f"💝 {interests}\n" if interests else "",
-        about_line=f"💭 {about_me}" if about_me else ""
-    )
+    text = render_card(user, PARTNER_CONTACT if show_username else PARTNER)
+    await send_card(bot, chat_id, user, text, keyboard, placeholder=NO_PHOTO)
+
+
+async def swap_partner_card(card: Message, user: dict, keyboard) -> bool:
+    """
+    Turn a swiped card into the next partner's card with one edit.
+    False when Telegram can't convert it (text <-> media, video notes).
+    """
+    text = render_card(user, PARTNER)
+    has_media = bool(user.get("media_file_id") and user.get("media_type"))
+    media_class = SWAPPABLE_MEDIA.get(user.get("media_type")) if has_media else None
     
-    if user.get("media_file_id") and user.get("media_type"):
-        if user["media_type"] == "photo":
-            await bot.send_photo(chat_id, user["media_file_id"], caption=text,
-                               parse_mode="Markdown", reply_markup=keyboard)
-        elif user["media_type"] == "video":
-            await bot.send_video(chat_id, user["media_file_id"], caption=text,
-                               parse_mode="Markdown", reply_markup=keyboard)
-        elif user["media_type"] == "video_note":
-            await bot.send_video_note(chat_id, user["media_file_id"])
-            await bot.send_message(chat_id, text, parse_mode="Markdown", reply_markup=keyboard)
-    else:
-        await bot.send_message(chat_id, text + "\n\n📷 [No photo]", parse_mode="Markdown", reply_markup=keyboard)
+    try:
+        if media_class and (card.photo or card.video):
+            await card.edit_media(
+                media_class(media=user["media_file_id"], caption=text, parse_mode="Markdown"),
+                reply_markup=keyboard
+            )
+        elif not has_media and card.text:
+            await card.edit_text(text + NO_PHOTO, parse_mode="Markdown", reply_markup=keyboard)
+        else:
+            return False
+    except TelegramBadRequest:
+        return False
+    return True
+
+
+async def mark_card(card: Message, mark: str) -> None:
+    """Append the user's decision to a card that stays in the chat."""
+    try:
+        if card.caption:
+            await card.edit_caption(card.caption + f"\n\n{mark}", parse_mode="Markdown")
+        else:
+            await card.edit_text(card.text + f"\n\n{mark}", parse_mode="Markdown")
+    except Exception:
+        pass
 
 
-async def show_next_partner(bot: Bot, chat_id: int, user_id: int) -> None:
-    """Show next partner or expand search."""
+async def show_next_partner(bot: Bot, chat_id: int, user_id: int,
+                            card: Optional[Message] = None, mark: str = "") -> None:
+    """Show next partner or expand search. A swiped `card` is reused in place when possible."""
     user = db.get_user(user_id)
     expanded = user["search_expanded"] if user else False
     
-    partners = db.get_potential_partners(user_id, expanded)
-    
-    if partners:
-        partner = dict(partners[0])
+    partner = await prefetcher.take(user_id, expanded)
+    if partner is None:
+        partners = db.get_potential_partners(user_id, expanded)
+        partner = dict(partners[0]) if partners else None
+    
+    if partner:
+        # Look up the one after while this card is on screen
+        prefetcher.start(user_id, partner["user_id"], expanded)
+        keyboard = get_matching_keyboard(partner["user_id"])
+        if card and config.swipe_mode == "edit":
+            if await swap_partner_card(card, partner, keyboard):
+                metrics.SWIPE_CARDS.inc(result="edited")
+                return
+            metrics.SWIPE_CARDS.inc(result="fallback")
+        
+        if card:
+            await mark_card(card, mark)
         await bot.send_message(chat_id, FINDING_PARTNER, parse_mode="Markdown")
-        await send_partner_card(bot, chat_id, partner, get_matching_keyboard(partner["user_id"]))
-    elif not expanded:
+        await send_partner_card(bot, chat_id, partner, keyboard)
+        return
+    
+    if card:
+        await mark_card(card, mark)
+    
+    if not expanded:
         # Expand search
         db.set_search_expanded(user_id, True)
         partners = db.get_potential_partners(user_id, True)
@@ -88,6 +118,7 @@ async def show_next_partner(bot: Bot, chat_id: int, user_id: int) -> None:
         if partners:
             await bot.send_message(chat_id, NO_MORE_PARTNERS, parse_mode="Markdown")
             partner = dict(partners[0])
+            prefetcher.start(user_id, partner["user_id"], True)
             await send_partner_card(bot, chat_id, partner, get_matching_keyboard(partner["user_id"]))
         else:
             await bot.send_message(chat_id, ALL_SEEN, parse_mode="Markdown",
@@ -113,11 +144,11 @@ async def find_partner(message: Message, bot: Bot) -> None:
     await show_next_partner(bot, message.chat.id, message.from_user.id)
 
 
-@matching_router.callback_query(F.data.startswith("like_"))
-async def process_like(callback: CallbackQuery, bot: Bot) -> None:
+@matching_router.callback_query(LikeCb.filter())
+async def process_like(callback: CallbackQuery, callback_data: LikeCb, bot: Bot) -> None:
     await callback.answer()
     
-    target_id = int(callback.data.split("_")[1])
+    target_id = callback_data.user_id
     user_id = callback.from_user.id
     
     success, is_match = db.add_like(user_id, target_id)
@@ -126,15 +157,9 @@ async def process_like(callback: CallbackQuery, bot: Bot) -> None:
         await callback.message.answer("😅 Error, try again!")
         return
     
-    try:
-        if callback.message.caption:
-            await callback.message.edit_caption(callback.message.caption + "\n\n💖 [Liked]", parse_mode="Markdown")
-        else:
-            await callback.message.edit_text(callback.message.text + "\n\n💖 [Liked]", parse_mode="Markdown")
-    except:
-        pass
-    
     if is_match:
+        prefetcher.discard(user_id)
+        await mark_card(callback.message, "💖 [Liked]")
         user = db.get_user(user_id)
         partner = db.get_user(target_id)
         
@@ -148,35 +173,25 @@ async def process_like(callback: CallbackQuery, bot: Bot) -> None:
             reply_markup=get_main_menu_keyboard("pending_pair")
         )
         
-        try:
-            await bot.send_message(
-                target_id,
-                MATCH_FOUND.format(name=user_name),
-                parse_mode="Markdown",
-                reply_markup=get_main_menu_keyboard("pending_pair")
-            )
-        except:
-            pass
+        await notifier.send(
+            bot,
+            target_id,
+            MATCH_FOUND.format(name=user_name),
+            parse_mode="Markdown",
+            reply_markup=get_main_menu_keyboard("pending_pair")
+        )
     else:
-        await show_next_partner(bot, callback.message.chat.id, user_id)
+        await show_next_partner(bot, callback.message.chat.id, user_id, callback.message, "💖 [Liked]")
 
 
-@matching_router.callback_query(F.data.startswith("skip_"))
-async def process_skip(callback: CallbackQuery, bot: Bot) -> None:
+@matching_router.callback_query(SkipCb.filter())
+async def process_skip(callback: CallbackQuery, callback_data: SkipCb, bot: Bot) -> None:
     await callback.answer()
     
-    target_id = int(callback.data.split("_")[1])
+    target_id = callback_data.user_id
     db.add_skip(callback.from_user.id, target_id)
     
-    try:
-        if callback.message.caption:
-            await callback.message.edit_caption(callback.message.caption + "\n\n👋 [Skipped]", parse_mode="Markdown")
-        else:
-            await callback.message.edit_text(callback.message.text + "\n\n👋 [Skipped]", parse_mode="Markdown")
-    except:
-        pass
-    
-    await show_next_partner(bot, callback.message.chat.id, callback.from_user.id)
+    await show_next_partner(bot, callback.message.chat.id, callback.from_user.id, callback.message, "👋 [Skipped]")
 
 
 @matching_router.message(F.text == BTN_VIEW_MATCH)
@@ -198,11 +213,11 @@ async def view_match(message: Message, bot: Bot) -> None:
                           get_pair_confirmation_keyboard(partner["user_id"]), show_username=True)
 
 
-@matching_router.callback_query(F.data.startswith("confirm_pair_"))
-async def confirm_pair(callback: CallbackQuery, bot: Bot) -> None:
+@matching_router.callback_query(ConfirmPairCb.filter())
+async def confirm_pair(callback: CallbackQuery, callback_data: ConfirmPairCb, bot: Bot) -> None:
     await callback.answer()
     
-    partner_id = int(callback.data.split("_")[2])
+    partner_id = callback_data.user_id
     user_id = callback.from_user.id
     
     success, both = db.confirm_pair(user_id)
@@ -235,15 +250,13 @@ async def confirm_pair(callback: CallbackQuery, bot: Bot) -> None:
             reply_markup=get_main_menu_keyboard("have_pair")
         )
         
-        try:
-            await bot.send_message(
-                partner_id,
-                MATCH_BOTH_CONFIRMED.format(name=user_name, username=user_username),
-                parse_mode="Markdown",
-                reply_markup=get_main_menu_keyboard("have_pair")
-            )
-        except:
-            pass
+        await notifier.send(
+            bot,
+            partner_id,
+            MATCH_BOTH_CONFIRMED.format(name=user_name, username=user_username),
+            parse_mode="Markdown",
+            reply_markup=get_main_menu_keyboard("have_pair")
+        )
     else:
         partner = db.get_user(partner_id)
         partner_name = escape_markdown(partner["first_name"])
@@ -254,7 +267,7 @@ async def confirm_pair(callback: CallbackQuery, bot: Bot) -> None:
         )
 
 
-@matching_router.callback_query(F.data.startswith("reject_match_"))
+@matching_router.callback_query(RejectMatchCb.filter())
 async def reject_match(callback: CallbackQuery, bot: Bot) -> None:
     await callback.answer()
     
@@ -276,11 +289,8 @@ async def reject_match(callback: CallbackQuery, bot: Bot) -> None:
                                  reply_markup=get_main_menu_keyboard("active_finding"))
     
     if partner_id:
-        try:
-            await bot.send_message(partner_id, MATCH_REJECTED_PARTNER, parse_mode="Markdown",
-                                 reply_markup=get_main_menu_keyboard("active_finding"))
-        except:
-            pass
+        await notifier.send(bot, partner_id, MATCH_REJECTED_PARTNER, parse_mode="Markdown",
+                            reply_markup=get_main_menu_keyboard("active_finding"))
 
 
 @matching_router.message(F.text == BTN_MY_PARTNER)
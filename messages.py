@@ -329,7 +329,7 @@ You can now search for a new partner! 💃
 ADMIN_PANEL = """
 🎛️ *Admin Control Panel* 🎛️
 
-👥 Users: {total_users} (Banned: {banned})
+👥 Users: {total_users} (Banned: {banned}, Unreachable: {unreachable})
 📋 Pending: {pending_approval}
 ✅ Approved: {approved}
 
@@ -362,6 +362,13 @@ ADMIN_STATS = """
   Pair History: {total_pair_history}
   Total Likes: {total_likes}
   Total Skips: {total_skips}
+
+📭 *Delivery:*
+  Unreachable: {unreachable}
+
+🧠 *Sessions:*
+  In progress: {fsm_sessions} (~{fsm_kb} KB)
+  Evicted idle: {fsm_evicted}
 """
 
 ADMIN_PROFILE_REVIEW = """
@@ -406,16 +413,26 @@ Partner: {partner_name} (@{partner_username})
 ADMIN_BROADCAST_ASK = """
 📢 *Broadcast Message*
 
-Send the message you want to broadcast to all users.
+Send the message you want to broadcast.
 Or tap Cancel to abort.
 """
 
+ADMIN_BROADCAST_AUDIENCE = """
+👥 *Choose Audience*
+
+Pick a segment below, or send a filter like:
+`pairing_status=active_finding gender=female course=Law since=2026-01-01`
+
+Keys: pairing\\_status, approval\\_status, gender, course, since
+"""
+
 ADMIN_BROADCAST_CONFIRM = """
 📢 *Confirm Broadcast*
 
 Your message:
 {message}
 
+👥 Audience: {audience}
 Send to {count} users?
 """
 
@@ -425,6 +442,15 @@ ADMIN_BROADCAST_SENT = """
 Message delivered to {success}/{total} users.
 """
 
+ADMIN_BROADCAST_PROGRESS = """
+📢 *Broadcast #{id}* - {status}
+
+📨 Processed: {processed}/{total}
+✅ Sent: {sent}
+❌ Failed: {failed}
+🚫 Blocked: {blocked}
+"""
+
 ADMIN_DM_ASK = """
 💬 *Direct Message*
 
@@ -441,6 +467,14 @@ ADMIN_DM_SENT = """
 ✅ Message sent to user #{user_id}!
 """
 
+ADMIN_DM_BLOCKED = """
+🚫 User #{user_id} has blocked the bot or deleted their account.
+"""
+
+ADMIN_DM_FAILED = """
+❌ Could not send to user #{user_id}, see the log for details.
+"""
+
 ADMIN_BOT_STOPPING = """
 🛑 *Bot is stopping...*
 
@@ -453,6 +487,17 @@ ADMIN_BOT_RESTARTING = """
 Please wait a moment.
 """
 
+ADMIN_PROFILER_STARTED = """
+🔬 *Profiler running*
+
+Sampling every thread {rate} times/sec. It stops by itself after {max_minutes} min.
+"""
+
+ADMIN_PROFILER_RESULT = """
+🔬 Profile: {samples} samples over {duration:.0f}s
+Collapsed stacks - open with flamegraph.pl or speedscope.
+"""
+
 ADMIN_FROM_ADMIN = """
 📬 *Message from Admin:*
 
@@ -465,6 +510,81 @@ ADMIN_ALL_REVIEWED = """
 Great job! Check back later for new submissions. 💫
 """
 
+ADMIN_QUEUE_CLAIMED = """
+👥 *Remaining profiles are being reviewed by other admins.*
+
+They come back to the queue if left undecided for 15 minutes.
+"""
+
+ADMIN_BATCH_REVIEW = """
+📦 *Batch Review* ({count} of {pending} pending)
+
+{lines}
+
+Tap numbers to select profiles, then approve or reject them together.
+"""
+
+ADMIN_BATCH_LINE = "{n}. {gender_emoji} *{first_name}*, {age}{course}{media} · `{user_id}`{about}"
+
+ADMIN_PAIRS_PAGE = """💕 All Pairs ({total})
+
+{pairs}"""
+
+ADMIN_PAIR_LINE = "💃 {first_name} (@{username})\n🕺 {partner_first_name} (@{partner_username})"
+
+ADMIN_EXPORT_USAGE = "Usage: /export <name> [format]\nNames: {names}\nFormats: {formats} (default csv)"
+
+ADMIN_EXPORT_RESULT = "📦 {name}: {rows} rows ({seconds:.1f}s)"
+
+ADMIN_EXPORT_TOO_BIG = "❌ {name} export is {size:.0f} MB, over the 50 MB upload limit. Run: python export.py {name} --format {fmt}"
+
+ADMIN_PERF = """
+⏱️ *Handler Latency* ({window})
+
+```
+{table}
+```
+p50/p95/p99 in ms, slowest p95 first
+"""
+
+ADMIN_PERF_EMPTY = """
+⏱️ No updates handled ({window}) yet.
+"""
+
+ADMIN_SQLTOP = """
+🗄️ *Top Queries by Total Time*
+
+```
+{table}
+```
+Slow queries (≥{slow_ms}ms) logged: {slow_count}
+Use /sqlplan <#> for the query plan.
+"""
+
+ADMIN_SQLPLAN = """
+🗄️ *Query #{index}*
+
+```
+{template}
+```
+*Plan:*
+```
+{plan}
+```
+"""
+
+ADMIN_LAG = """
+🐢 *Event Loop*
+
+Lag now: {lag_now}ms | p99: {lag_p99}ms
+Stalls ≥{threshold}ms: {stalls} ({stalled:.1f}s total)
+
+```
+{table}
+```
+{last_stall}
+"""
+
 # ==================== DELETE ACCOUNT ====================
 
 DELETE_ACCOUNT_CONFIRM = """
@@ -541,6 +661,10 @@ ERROR_CANT_EDIT = """
 Resolve your current status first! 💫
 """
 
+ERROR_BUTTON_EXPIRED = "⌛ This button has expired. Please use the menu below."
+ERROR_SLOW_DOWN = "🐢 Easy there! Please slow down a little."
+ERROR_BUSY = "😮‍💨 The bot is very busy right now. Please try again in a moment."
+
 # ==================== BUTTONS ====================
 
 BTN_FIND_PARTNER = "💕 Find Partner"
@@ -570,6 +694,7 @@ BTN_NO_CANCEL = "💕 No, cancel"
 
 # Admin buttons
 BTN_ADMIN_PENDING = "📋 Pending Profiles"
+BTN_ADMIN_BATCH = "📦 Batch Review"
 BTN_ADMIN_REJECTIONS = "📨 Unpair Requests"
 BTN_ADMIN_PAIRS = "💕 All Pairs"
 BTN_ADMIN_STATS = "📊 Statistics"
@@ -580,6 +705,21 @@ BTN_ADMIN_BOT_CONTROL = "🎛️ Bot Control"
 BTN_APPROVE = "✅ Approve"
 BTN_REJECT = "❌ Reject"
 BTN_BAN = "🚫 Ban"
+BTN_BATCH_APPROVE_SELECTED = "✅ Approve selected"
+BTN_BATCH_REJECT_SELECTED = "❌ Reject selected"
+BTN_BATCH_APPROVE_ALL = "✅ Approve all shown"
+BTN_PAIRS_PREV = "« Prev"
+BTN_PAIRS_NEXT = "Next »"
+BTN_PAIRS_EXPORT = "📄 Export all"
+
+BTN_SEGMENT_ALL = "👥 Everyone"
+BTN_SEGMENT_SEARCHING = "🔍 Searching"
+BTN_SEGMENT_PAIRED = "💖 Paired"
+BTN_SEGMENT_PENDING = "⏳ Pending approval"
+
+BTN_BROADCAST_PAUSE = "⏸️ Pause"
+BTN_BROADCAST_RESUME = "▶️ Resume"
+BTN_BROADCAST_CANCEL = "⏹️ Cancel"
 
 
 # ==================== HELPER FUNCTIONS ====================
@@ -616,6 +756,17 @@ def format_pairing_status(status: str) -> str:
     return statuses.get(status, status)
 
 
+def format_broadcast_status(status: str) -> str:
+    """Format broadcast job status with emoji."""
+    statuses = {
+        "running": "🚀 Sending",
+        "paused": "⏸️ Paused",
+        "cancelled": "⏹️ Cancelled",
+        "done": "✅ Done"
+    }
+    return statuses.get(status, status)
+
+
 def build_optional_line(label: str, value: str, emoji: str = "") -> str:
     """Build optional profile line."""
     if value:
@@ -0,0 +1,283 @@
+"""
+Runtime metrics - counters and histograms rendered in Prometheus text format.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+# Seconds; covers fast DB lookups up to slow Bot API round trips
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Finer resolution where handlers usually land, for percentile estimates
+HANDLER_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.35, 0.5, 0.75, 1.0, 1.5, 2.5, 5.0, 10.0)
+
+_registry: List["Metric"] = []
+
+
+def quantile(buckets: Sequence[float], counts: Sequence[int], q: float) -> float:
+    """Estimate a quantile from bucket counts, interpolating inside the bucket."""
+    total = sum(counts)
+    if not total:
+        return 0.0
+    
+    rank = q * total
+    cumulative = 0
+    for i, count in enumerate(counts):
+        if cumulative + count >= rank:
+            if i == len(buckets):
+                # +Inf bucket: the best we can say is "above the last bound"
+                return buckets[-1]
+            lower = buckets[i - 1] if i else 0.0
+            return lower + (buckets[i] - lower) * (rank - cumulative) / count
+        cumulative += count
+    return buckets[-1]
+
+
+def _format_labels(labelnames: Sequence[str], values: Tuple) -> str:
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(labelnames, values))
+    return "{" + pairs + "}"
+
+
+class Metric:
+    """Base metric: a named family of values keyed by label values."""
+    
+    kind = "untyped"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Some metrics are updated from worker threads (asyncio.to_thread), e.g. DB_QUERIES
+        self._lock = threading.Lock()
+        _registry.append(self)
+    
+    def _key(self, labels: Dict[str, str]) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+    
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+    
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Monotonically increasing value."""
+    
+    kind = "counter"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+    
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+    
+    def snapshot(self) -> Dict[Tuple, float]:
+        """Values per label key."""
+        with self._lock:
+            return dict(self._values)
+    
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+                for key, value in sorted(self.snapshot().items())]
+
+
+class Gauge(Metric):
+    """Value that can go up and down."""
+    
+    kind = "gauge"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+    
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+    
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+    
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+                for key, value in sorted(self._values.items())]
+
+
+class Histogram(Metric):
+    """Observations counted into fixed buckets, plus sum and count."""
+    
+    kind = "histogram"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # key -> [per-bucket counts..., +Inf count], sum
+        self._counts: Dict[Tuple, List[int]] = {}
+        self._sums: Dict[Tuple, float] = {}
+    
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+    
+    def snapshot(self) -> Dict[Tuple, List[int]]:
+        """Bucket counts per label key since startup."""
+        with self._lock:
+            return {key: list(counts) for key, counts in self._counts.items()}
+    
+    def samples(self) -> List[str]:
+        lines = []
+        names = self.labelnames + ("le",)
+        with self._lock:
+            snapshot = {key: list(counts) for key, counts in self._counts.items()}
+            sums = dict(self._sums)
+        for key, counts in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, key + (bound,))} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {sums[key]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class RollingHistogram:
+    """
+    Fixed-bucket counts kept per time slot, so recent windows can be queried.
+    Not exported to Prometheus (which computes windows itself); used by /perf.
+    """
+    
+    def __init__(self, buckets: Sequence[float], slots: int = 60, slot_seconds: int = 60):
+        self.buckets = tuple(buckets)
+        self.slots = slots
+        self.slot_seconds = slot_seconds
+        # key -> (slot ids, per-slot bucket counts)
+        self._data: Dict[Tuple, Tuple[List[int], List[List[int]]]] = {}
+    
+    def observe(self, value: float, *key) -> None:
+        slot_id = int(time.monotonic() // self.slot_seconds)
+        index = slot_id % self.slots
+        
+        data = self._data.get(key)
+        if data is None:
+            data = self._data[key] = ([-1] * self.slots, [[0] * (len(self.buckets) + 1) for _ in range(self.slots)])
+        slot_ids, slot_counts = data
+        
+        if slot_ids[index] != slot_id:
+            slot_ids[index] = slot_id
+            slot_counts[index] = [0] * (len(self.buckets) + 1)
+        slot_counts[index][bisect_left(self.buckets, value)] += 1
+    
+    def snapshot(self, seconds: int) -> Dict[Tuple, List[int]]:
+        """Bucket counts per key over the last `seconds` (rounded up to whole slots)."""
+        current = int(time.monotonic() // self.slot_seconds)
+        oldest = current - min(self.slots, -(-seconds // self.slot_seconds)) + 1
+        
+        result = {}
+        for key, (slot_ids, slot_counts) in self._data.items():
+            merged = [0] * (len(self.buckets) + 1)
+            for slot_id, counts in zip(slot_ids, slot_counts):
+                if oldest <= slot_id <= current:
+                    merged = [a + b for a, b in zip(merged, counts)]
+            if any(merged):
+                result[key] = merged
+        return result
+
+
+def render() -> str:
+    """All metrics in Prometheus text exposition format."""
+    UPTIME.set(time.monotonic() - _started)
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+# ==================== METRICS ====================
+
+_started = time.monotonic()
+
+UPTIME = Gauge("bot_uptime_seconds", "Seconds since the process started.")
+
+UPDATES = Counter("bot_updates_total", "Telegram updates processed.", ("type",))
+UPDATE_ERRORS = Counter("bot_update_errors_total", "Updates whose handler raised.", ("type",))
+UPDATE_LATENCY = Histogram("bot_update_duration_seconds", "Time spent handling an update.", ("type",))
+HANDLER_LATENCY = Histogram("bot_handler_duration_seconds", "Update handling time by handler.",
+                            ("handler", "type"), buckets=HANDLER_BUCKETS)
+HANDLER_WINDOW = RollingHistogram(HANDLER_BUCKETS)
+GATED_UPDATES = Counter("bot_gated_updates_total", "Updates rejected before routing.", ("reason",))
+DUPLICATE_CALLBACKS = Counter("bot_duplicate_callbacks_total", "Redelivered callback queries dropped.")
+THROTTLED_UPDATES = Counter("bot_throttled_updates_total", "Updates dropped by the per-user rate limit.",
+                            ("action",))
+SHED_UPDATES = Counter("bot_shed_updates_total", "Updates dropped because the handler queue was full.", ("type",))
+IN_FLIGHT = Gauge("bot_updates_in_flight", "Updates currently inside a handler.")
+QUEUE_DEPTH = Gauge("bot_update_queue_depth", "Updates waiting for a free handler slot.")
+
+DB_QUERIES = Histogram("bot_db_query_duration_seconds", "SQLite statement execution time.")
+
+CACHE_REQUESTS = Counter("bot_cache_requests_total", "Cache lookups by result (hit/miss).",
+                         ("cache", "result"))
+
+FSM_SESSIONS = Gauge("bot_fsm_sessions", "Live FSM sessions (non-empty state or data).")
+FSM_BYTES = Gauge("bot_fsm_bytes", "Approximate serialized size of live FSM sessions.")
+FSM_EVICTIONS = Counter("bot_fsm_evictions_total", "FSM sessions evicted after the idle TTL.")
+
+PREFETCHES = Counter("bot_candidate_prefetches_total", "Prefetched next candidates at tap time by result.",
+                     ("result",))
+SWIPE_CARDS = Counter("bot_swipe_cards_total", "Next-candidate cards after a swipe (edited in place or fallback).",
+                      ("result",))
+
+MESSAGES_SENT = Counter("bot_messages_total", "Outbound notifications by delivery status.", ("status",))
+SEND_RATE = Gauge("bot_send_rate", "Current notifier send rate limit (messages/sec).")
+
+LOOP_LAG = Histogram("bot_event_loop_lag_seconds", "Event-loop scheduling delay.",
+                     buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0))
+LOOP_LAG_LAST = Gauge("bot_event_loop_lag_last_seconds", "Most recent event-loop lag sample.")
+LOOP_STALLS = Counter("bot_event_loop_stalls_total", "Event-loop stalls over the threshold by blocking site.",
+                      ("handler", "db_function"))
+LOOP_STALL_SECONDS = Counter("bot_event_loop_stall_seconds_total", "Time the event loop spent stalled by site.",
+                             ("handler", "db_function"))
+
+
+def handler_percentiles(window_seconds: int = 0) -> List[Tuple[str, str, int, float, float, float]]:
+    """
+    (handler, type, count, p50, p95, p99) per handler, slowest p95 first.
+    window_seconds=0 means since startup, otherwise a rolling window (max one hour).
+    """
+    if window_seconds:
+        counts_by_key = HANDLER_WINDOW.snapshot(window_seconds)
+    else:
+        counts_by_key = HANDLER_LATENCY.snapshot()
+    
+    rows = []
+    for (handler, update_type), counts in counts_by_key.items():
+        rows.append((
+            handler,
+            update_type,
+            sum(counts),
+            quantile(HANDLER_BUCKETS, counts, 0.5),
+            quantile(HANDLER_BUCKETS, counts, 0.95),
+            quantile(HANDLER_BUCKETS, counts, 0.99)
+        ))
+    rows.sort(key=lambda row: row[4], reverse=True)
+    return rows
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
@@ -0,0 +1,377 @@
+"""
+Dispatcher middlewares.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.filters import Filter
+from aiogram.types import CallbackQuery, TelegramObject, Update, User
+
+import database as db
+import metrics
+from notifier import notifier
+from callbacks import LikeCb, SkipCb, callback_prefix, pair_partner_id
+from config import config
+from texts import BANNED_MESSAGE, BTN_FIND_PARTNER, ERROR_BUSY, ERROR_SLOW_DOWN
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """
+    Count every update and time its handling (outer middleware on dp.update).
+    The handler name is filled in by HandlerNameMiddleware further down the chain.
+    """
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        update_type = event.event_type
+        # Shared by reference with the inner middlewares' data
+        perf = data["perf"] = {"handler": "unhandled"}
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            metrics.UPDATE_ERRORS.inc(type=update_type)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.UPDATES.inc(type=update_type)
+            metrics.UPDATE_LATENCY.observe(elapsed, type=update_type)
+            metrics.HANDLER_LATENCY.observe(elapsed, handler=perf["handler"], type=update_type)
+            metrics.HANDLER_WINDOW.observe(elapsed, perf["handler"], update_type)
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Record which handler matched (inner middleware on message/callback_query)."""
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        perf = data.get("perf")
+        if perf is not None:
+            perf["handler"] = data["handler"].callback.__name__
+        return await handler(event, data)
+
+
+SEEN_CALLBACKS_LIMIT = 10000
+
+
+class KeyedLocks:
+    """asyncio locks created on demand per key and dropped when nobody holds or waits."""
+    
+    def __init__(self):
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._users: Dict[int, int] = {}
+    
+    @asynccontextmanager
+    async def hold(self, keys: List[int]) -> AsyncIterator[None]:
+        # Always acquire in sorted order so two pair updates can't deadlock
+        keys = sorted(set(keys))
+        for key in keys:
+            self._users[key] = self._users.get(key, 0) + 1
+            if key not in self._locks:
+                self._locks[key] = asyncio.Lock()
+        
+        acquired = []
+        try:
+            for key in keys:
+                await self._locks[key].acquire()
+                acquired.append(key)
+            yield
+        finally:
+            for key in acquired:
+                self._locks[key].release()
+            for key in keys:
+                self._users[key] -= 1
+                if not self._users[key]:
+                    del self._users[key]
+                    del self._locks[key]
+    
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+class UserLockMiddleware(BaseMiddleware):
+    """
+    Run each user's updates one at a time, in arrival order, while different
+    users proceed in parallel. Pair callbacks also hold the partner's lock, so
+    both sides of a match can't race. Redelivered callback queries are dropped.
+    (Outer middleware on dp.update, after the user context is resolved.)
+    """
+    
+    def __init__(self):
+        self.locks = KeyedLocks()
+        self._seen_callbacks: OrderedDict = OrderedDict()
+    
+    def _is_duplicate(self, event: Update) -> bool:
+        callback = event.callback_query
+        if callback is None:
+            return False
+        if callback.id in self._seen_callbacks:
+            return True
+        self._seen_callbacks[callback.id] = None
+        if len(self._seen_callbacks) > SEEN_CALLBACKS_LIMIT:
+            self._seen_callbacks.popitem(last=False)
+        return False
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        user: Optional[User] = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+        
+        if self._is_duplicate(event):
+            metrics.DUPLICATE_CALLBACKS.inc()
+            return None
+        
+        keys = [user.id]
+        partner_id = pair_partner_id(event.callback_query.data) if event.callback_query else None
+        if partner_id:
+            keys.append(partner_id)
+        
+        async with self.locks.hold(keys):
+            return await handler(event, data)
+
+
+class BanGateMiddleware(BaseMiddleware):
+    """
+    Drop updates from banned users before routing (outer middleware on dp.update,
+    registered ahead of aiogram's FSM middleware so no state is loaded for them).
+    Uses the in-memory ban list only; /start still explains the ban.
+    """
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        user: Optional[User] = data.get("event_from_user")
+        if user is None or not db.is_banned(user.id):
+            return await handler(event, data)
+        
+        metrics.GATED_UPDATES.inc(reason="banned")
+        if event.message and event.message.text and event.message.text.startswith("/start"):
+            await event.message.answer(
+                BANNED_MESSAGE.format(reason=db.get_ban_reason(user.id) or "Not specified"),
+                parse_mode="Markdown"
+            )
+        elif event.callback_query:
+            await event.callback_query.answer()
+        return None
+
+
+class ReachableMiddleware(BaseMiddleware):
+    """
+    Any update from a user proves the bot can reach them again (e.g. after
+    unblocking it), so clear their undeliverable mark (outer middleware on dp.update).
+    """
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        user: Optional[User] = data.get("event_from_user")
+        if user is not None:
+            notifier.mark_reachable(user.id)
+        return await handler(event, data)
+
+
+class AdminGateMiddleware(BaseMiddleware):
+    """
+    Let only admins into a router (outer middleware on its message and
+    callback_query observers). Other users' messages fall through to the next
+    router; their taps on this router's buttons are refused.
+    """
+    
+    def __init__(self, callback_filter: Filter):
+        self.callback_filter = callback_filter
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user: Optional[User] = data.get("event_from_user")
+        if user is not None and config.is_admin(user.id):
+            return await handler(event, data)
+        
+        if isinstance(event, CallbackQuery) and await self.callback_filter(event):
+            metrics.GATED_UPDATES.inc(reason="not_admin")
+            await event.answer("Access denied", show_alert=True)
+            return None
+        return UNHANDLED
+
+
+# Per-user token buckets by action class: (burst, refill tokens/sec)
+THROTTLE_RULES: Dict[str, Tuple[float, float]] = {
+    "search": (3, 0.2),  # "Find Partner" runs the full candidate query
+    "swipe": (8, 2.0),  # Like/Skip
+    "callback": (10, 2.0),
+    "message": (10, 2.0),
+    "fsm": (20, 4.0),  # answers to an FSM step: looser, a dropped answer stalls the flow
+}
+SWIPE_PREFIXES = {LikeCb.__prefix__, SkipCb.__prefix__}
+PRUNE_INTERVAL = 60  # seconds between dropping refilled buckets
+
+
+def action_class(event: Update, raw_state: Optional[str] = None) -> Optional[str]:
+    """Throttle class of an update, None if it isn't rate limited."""
+    if event.callback_query:
+        if callback_prefix(event.callback_query.data or "") in SWIPE_PREFIXES:
+            return "swipe"
+        return "callback"
+    if event.message:
+        if raw_state is not None:
+            return "fsm"
+        return "search" if event.message.text == BTN_FIND_PARTNER else "message"
+    return None
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated", "refusals")
+    
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+        self.refusals = 0
+
+
+class RateLimiter:
+    """Token buckets keyed by (user, action class); full buckets are pruned."""
+    
+    def __init__(self, rules: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.rules = rules or THROTTLE_RULES
+        self._buckets: Dict[Tuple[int, str], TokenBucket] = {}
+        self._last_prune = time.monotonic()
+    
+    def consume(self, user_id: int, action: str) -> int:
+        """Take a token; 0 if allowed, otherwise how many refusals in a row."""
+        capacity, rate = self.rules[action]
+        now = time.monotonic()
+        if now - self._last_prune >= PRUNE_INTERVAL:
+            self._prune(now)
+        
+        bucket = self._buckets.get((user_id, action))
+        if bucket is None:
+            bucket = self._buckets[(user_id, action)] = TokenBucket(capacity, now)
+        else:
+            bucket.tokens = min(capacity, bucket.tokens + (now - bucket.updated) * rate)
+            bucket.updated = now
+        
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            bucket.refusals = 0
+            return 0
+        bucket.refusals += 1
+        return bucket.refusals
+    
+    def _prune(self, now: float) -> None:
+        self._last_prune = now
+        for key, bucket in list(self._buckets.items()):
+            capacity, rate = self.rules[key[1]]
+            if bucket.tokens + (now - bucket.updated) * rate >= capacity:
+                del self._buckets[key]
+    
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class ThrottleMiddleware(BaseMiddleware):
+    """
+    Per-user rate limit by action class (outer middleware on dp.update).
+    Excess callbacks only get a toast; excess messages get one notice per
+    burst and are then dropped silently. Admins are not limited. Messages
+    answering an FSM step (registration, edits, broadcasts) get their own,
+    looser bucket, so normal typing is never dropped mid-flow.
+    """
+    
+    def __init__(self, limiter: Optional[RateLimiter] = None):
+        self.limiter = limiter or RateLimiter()
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        user: Optional[User] = data.get("event_from_user")
+        # raw_state is set by the dispatcher's FSM middleware, which runs first
+        action = action_class(event, data.get("raw_state"))
+        if user is None or action is None or config.is_admin(user.id):
+            return await handler(event, data)
+        
+        refusals = self.limiter.consume(user.id, action)
+        if not refusals:
+            return await handler(event, data)
+        
+        metrics.THROTTLED_UPDATES.inc(action=action)
+        if event.callback_query:
+            await event.callback_query.answer(ERROR_SLOW_DOWN)
+        elif refusals == 1:
+            await event.message.answer(ERROR_SLOW_DOWN)
+        return None
+
+
+class LoadShedMiddleware(BaseMiddleware):
+    """
+    Cap concurrent handlers and drop updates once too many are waiting
+    (outer middleware on dp.update, inside UserLockMiddleware: a slot is only
+    taken once the user's lock is held, so one user's backlog waits on their
+    own lock instead of occupying slots everyone else needs).
+    """
+    
+    def __init__(self, max_in_flight: Optional[int] = None, max_queue: Optional[int] = None):
+        self.max_in_flight = max_in_flight or config.max_in_flight
+        self.max_queue = max_queue if max_queue is not None else config.max_queue
+        self.in_flight = 0
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        if self.in_flight >= self.max_in_flight and self.waiting >= self.max_queue:
+            metrics.SHED_UPDATES.inc(type=event.event_type)
+            if event.callback_query:
+                await event.callback_query.answer(ERROR_BUSY)
+            return None
+        
+        self.waiting += 1
+        metrics.QUEUE_DEPTH.set(self.waiting)
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+            metrics.QUEUE_DEPTH.set(self.waiting)
+        
+        self.in_flight += 1
+        metrics.IN_FLIGHT.set(self.in_flight)
+        try:
+            return await handler(event, data)
+        finally:
+            self.in_flight -= 1
+            metrics.IN_FLIGHT.set(self.in_flight)
+            self._slots.release()
@@ -0,0 +1,206 @@
+"""
+Notification fan-out - concurrent sends within Telegram rate limits.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError, TelegramNotFound,
+    TelegramRetryAfter, TelegramServerError
+)
+
+import database as db
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Telegram allows ~30 messages/sec overall and ~1 message/sec per chat
+GLOBAL_RATE = 30
+PER_CHAT_INTERVAL = 1.0
+MAX_CONCURRENCY = 20
+MAX_RETRIES = 3  # for transient errors
+MAX_FLOOD_WAITS = 10  # flood waits are Telegram pacing us, not failures, so they get their own budget
+# Adaptive backoff: halve the rate on flood wait, then creep back up
+MIN_RATE = 1
+RATE_RECOVERY_STEP = 0.5
+
+SENT = "sent"
+FAILED = "failed"
+BLOCKED = "blocked"
+
+# Send failure classes
+FORBIDDEN = "forbidden"
+CHAT_NOT_FOUND = "chat_not_found"
+FLOOD = "flood"
+TRANSIENT = "transient"
+ERROR = "error"
+
+
+def classify_error(error: Exception) -> str:
+    """Classify a send failure."""
+    if isinstance(error, TelegramRetryAfter):
+        return FLOOD
+    if isinstance(error, TelegramForbiddenError):
+        return FORBIDDEN
+    if isinstance(error, (TelegramBadRequest, TelegramNotFound)) and "chat not found" in str(error).lower():
+        return CHAT_NOT_FOUND
+    if isinstance(error, (TelegramNetworkError, TelegramServerError)):
+        return TRANSIENT
+    return ERROR
+
+
+@dataclass
+class Notification:
+    """A single outgoing text message."""
+    chat_id: int
+    text: str
+    kwargs: dict = field(default_factory=dict)
+
+
+@dataclass
+class BatchResult:
+    """Delivery counts for one batch."""
+    sent: int = 0
+    failed: int = 0
+    blocked: int = 0
+    
+    @property
+    def total(self) -> int:
+        return self.sent + self.failed + self.blocked
+    
+    def add(self, status: str) -> None:
+        setattr(self, status, getattr(self, status) + 1)
+
+
+class Notifier:
+    """Rate-limited sender shared by every notification path."""
+    
+    def __init__(self, rate: float = GLOBAL_RATE, per_chat_interval: float = PER_CHAT_INTERVAL,
+                 concurrency: int = MAX_CONCURRENCY):
+        self._max_rate = rate
+        self._rate = rate
+        self._per_chat_interval = per_chat_interval
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        self._chat_next_slot: Dict[int, float] = {}
+        self._unreachable: Optional[Set[int]] = None
+    
+    def is_unreachable(self, chat_id: int) -> bool:
+        """Check the deliverability registry (loaded once, then kept in memory)."""
+        if self._unreachable is None:
+            self._unreachable = db.get_undeliverable_ids()
+        return chat_id in self._unreachable
+    
+    def mark_unreachable(self, chat_id: int, reason: str) -> None:
+        if self._unreachable is not None:
+            self._unreachable.add(chat_id)
+        db.mark_undeliverable(chat_id, reason)
+    
+    def mark_reachable(self, chat_id: int) -> None:
+        """Forget a recorded failure, e.g. when the user talks to the bot again."""
+        if self.is_unreachable(chat_id):
+            self._unreachable.discard(chat_id)
+            db.clear_undeliverable(chat_id)
+    
+    async def _wait_for_slot(self, chat_id: int) -> None:
+        """Reserve the earliest send slot allowed by the global and per-chat limits."""
+        now = time.monotonic()
+        slot = max(now, self._paused_until, self._chat_next_slot.get(chat_id, 0.0), self._next_slot)
+        self._next_slot = slot + 1 / self._rate
+        self._chat_next_slot[chat_id] = slot + self._per_chat_interval
+        
+        if len(self._chat_next_slot) > 10000:
+            self._chat_next_slot = {cid: t for cid, t in self._chat_next_slot.items() if t > now}
+        
+        if slot > now:
+            await asyncio.sleep(slot - now)
+        # A flood wait may have started while we slept; sit it out on the slot we already hold
+        while time.monotonic() < self._paused_until:
+            await asyncio.sleep(self._paused_until - time.monotonic())
+    
+    async def send(self, bot: Bot, chat_id: int, text: str, **kwargs) -> str:
+        """
+        Send one message, retrying on flood wait (up to MAX_FLOOD_WAITS) and on
+        transient errors (up to MAX_RETRIES).
+        Returns sent/failed/blocked; known-unreachable chats are skipped as blocked.
+        """
+        status = await self._send(bot, chat_id, text, **kwargs)
+        metrics.MESSAGES_SENT.inc(status=status)
+        metrics.SEND_RATE.set(self._rate)
+        return status
+    
+    async def _send(self, bot: Bot, chat_id: int, text: str, **kwargs) -> str:
+        if self.is_unreachable(chat_id):
+            return BLOCKED
+        
+        retries = 0
+        flood_waits = 0
+        while True:
+            kind: Optional[str] = None
+            async with self._semaphore:
+                await self._wait_for_slot(chat_id)
+                try:
+                    await bot.send_message(chat_id, text, **kwargs)
+                    self._rate = min(self._max_rate, self._rate + RATE_RECOVERY_STEP / self._rate)
+                    return SENT
+                except Exception as e:
+                    kind = classify_error(e)
+                    
+                    if kind == FLOOD:
+                        # Flood wait applies to the whole bot, so pause every sender
+                        logger.warning(f"Flood wait {e.retry_after}s while sending to {chat_id}")
+                        now = time.monotonic()
+                        # Concurrent senders hit the same flood wait; back off once per event
+                        if now >= self._paused_until:
+                            self._rate = max(MIN_RATE, self._rate / 2)
+                        self._paused_until = max(self._paused_until, now + e.retry_after)
+                    elif kind in (FORBIDDEN, CHAT_NOT_FOUND):
+                        self.mark_unreachable(chat_id, kind)
+                        return BLOCKED
+                    elif kind == TRANSIENT:
+                        logger.warning(f"Transient error sending to {chat_id}: {e}")
+                    else:
+                        logger.warning(f"Send to {chat_id} failed: {e}")
+                        return FAILED
+            
+            if kind == FLOOD:
+                flood_waits += 1
+                if flood_waits > MAX_FLOOD_WAITS:
+                    logger.warning(f"Giving up on {chat_id} after {MAX_FLOOD_WAITS} flood waits")
+                    return FAILED
+                # The next slot waits out the pause
+            elif kind == TRANSIENT and retries < MAX_RETRIES:
+                # Back off without holding a send slot
+                await asyncio.sleep(2 ** retries)
+                retries += 1
+            else:
+                return FAILED
+    
+    @property
+    def rate(self) -> float:
+        """Current global send rate (messages/sec)."""
+        return self._rate
+    
+    async def send_batch(self, bot: Bot, notifications: Iterable[Notification]) -> BatchResult:
+        """Send all notifications concurrently and count the outcomes."""
+        statuses = await asyncio.gather(*(
+            self.send(bot, n.chat_id, n.text, **n.kwargs) for n in notifications if n.chat_id
+        ))
+        result = BatchResult()
+        for status in statuses:
+            result.add(status)
+        return result
+    
+    async def notify(self, bot: Bot, user_ids: List[int], text: str, **kwargs) -> BatchResult:
+        """Send the same message to several users."""
+        return await self.send_batch(bot, [Notification(uid, text, kwargs) for uid in user_ids])
+
+
+# Singleton instance
+notifier = Notifier()
@@ -0,0 +1,94 @@
+"""
+Candidate prefetch - find a searching user's next candidate while they are
+still looking at the current card.
+
+The lookup runs in a worker thread as soon as a card is shown, so a Like or
+Skip no longer waits for the candidate query. At tap time the result is
+re-checked against the same candidate filter as the query and dropped if
+it no longer passes (left active_finding, banned, already liked/skipped...).
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import database as db
+import metrics
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_TTL = 120  # seconds; older lookups are recomputed at tap time
+PREFETCH_LIMIT = 10000  # pending lookups kept (users who never tap again)
+
+
+@dataclass
+class Prefetch:
+    """Next-candidate lookup for the card currently shown to a user."""
+    shown_id: int
+    expanded: bool
+    task: asyncio.Task
+    created: float = field(default_factory=time.monotonic)
+
+
+class CandidatePrefetcher:
+    """Speculative next-candidate lookups, one per searching user."""
+    
+    def __init__(self, ttl: float = PREFETCH_TTL, limit: int = PREFETCH_LIMIT):
+        self.ttl = ttl
+        self.limit = limit
+        self._pending: Dict[int, Prefetch] = {}
+    
+    def start(self, user_id: int, shown_id: int, expanded: bool) -> None:
+        """Start looking up the candidate to show after `shown_id`."""
+        self.discard(user_id)
+        task = asyncio.create_task(asyncio.to_thread(db.get_potential_partners, user_id, expanded, shown_id))
+        # Nobody may ever await it; don't let a failure be reported as unretrieved
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._pending[user_id] = Prefetch(shown_id, expanded, task)
+        
+        while len(self._pending) > self.limit:
+            self.discard(next(iter(self._pending)))
+    
+    def discard(self, user_id: int) -> None:
+        prefetch = self._pending.pop(user_id, None)
+        if prefetch is not None:
+            prefetch.task.cancel()
+    
+    async def take(self, user_id: int, expanded: bool) -> Optional[dict]:
+        """Prefetched next candidate, or None if there is no valid one (query instead)."""
+        prefetch = self._pending.pop(user_id, None)
+        if prefetch is None:
+            return None
+        
+        if prefetch.expanded != expanded or time.monotonic() - prefetch.created > self.ttl:
+            prefetch.task.cancel()
+            metrics.PREFETCHES.inc(result="stale")
+            return None
+        
+        try:
+            partners = await prefetch.task
+        except Exception as e:
+            logger.error(f"Candidate prefetch failed for {user_id}: {e}")
+            metrics.PREFETCHES.inc(result="error")
+            return None
+        
+        if not partners:
+            metrics.PREFETCHES.inc(result="empty")
+            return None
+        
+        candidate = db.get_available_candidate(user_id, partners[0]["user_id"], expanded)
+        if candidate is None:
+            metrics.PREFETCHES.inc(result="invalid")
+            return None
+        
+        metrics.PREFETCHES.inc(result="hit")
+        return dict(candidate)
+    
+    def __len__(self) -> int:
+        return len(self._pending)
+
+
+# Singleton instance
+prefetcher = CandidatePrefetcher()
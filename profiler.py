@@ -0,0 +1,100 @@
+"""
+Sampling profiler - periodic stack snapshots of every thread, for flamegraphs.
+
+Nothing runs until an admin starts it; while running, a helper thread reads
+sys._current_frames() every SAMPLE_INTERVAL and counts identical stacks.
+"""
+
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+SAMPLE_INTERVAL = 0.005  # 200 samples/sec
+MAX_DURATION = 600  # seconds; stops by itself if nobody does
+
+
+class SamplingProfiler:
+    """Thread-based statistical profiler producing collapsed stacks."""
+    
+    def __init__(self, interval: float = SAMPLE_INTERVAL, max_duration: float = MAX_DURATION):
+        self.interval = interval
+        self.max_duration = max_duration
+        self.samples = 0
+        self.started_at = 0.0
+        self.stopped_at = 0.0
+        self._stacks: Counter = Counter()
+        self._labels: Dict[object, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+    
+    @property
+    def duration(self) -> float:
+        end = time.monotonic() if self.running else self.stopped_at
+        return end - self.started_at if self.started_at else 0.0
+    
+    def start(self) -> bool:
+        """Start sampling; False if already running."""
+        if self.running:
+            return False
+        
+        self.samples = 0
+        self._stacks.clear()
+        self.started_at = time.monotonic()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return True
+    
+    def stop(self) -> str:
+        """Stop sampling and return the collapsed stacks."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        return self.collapsed()
+    
+    def collapsed(self) -> str:
+        """Stacks in collapsed format ("root;caller;callee count"), heaviest first."""
+        return "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common()) + "\n"
+    
+    def _label(self, frame) -> str:
+        code = frame.f_code
+        label = self._labels.get(code)
+        if label is None:
+            module = frame.f_globals.get("__name__", "?")
+            label = self._labels[code] = f"{module}.{code.co_name}"
+        return label
+    
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        deadline = self.started_at + self.max_duration
+        
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                stack.reverse()
+                self._stacks[";".join(stack)] += 1
+            
+            self.samples += 1
+            if time.monotonic() >= deadline:
+                break
+        
+        self.stopped_at = time.monotonic()
+
+
+# Singleton instance
+profiler = SamplingProfiler()
@@ -9,6 +9,7 @@ from aiogram import Bot
 import database as db
 from config import config
 from keyboards import get_main_menu_keyboard
+from notifier import notifier, Notification
 from texts import MATCH_EXPIRED, UNPAIR_AUTO_APPROVED
 
 logger = logging.getLogger(__name__)
@@ -16,42 +17,21 @@ logger = logging.getLogger(__name__)
 
 async def check_timeouts(bot: Bot) -> None:
     """Check and handle timeouts."""
+    notifications = db.expire_timeouts(config.pending_timeout, config.rejection_timeout)
+    if notifications:
+        logger.info(f"Expired timeouts, {len(notifications)} notifications queued")
     
-    # Pending pair timeouts
-    timed_out = db.get_timed_out_pending_pairs(config.pending_timeout)
-    for user in timed_out:
-        success, partner_id = db.auto_expire_pending_match(user["user_id"])
-        if success:
-            logger.info(f"Auto-expired match for {user['user_id']}")
-            for uid in [user["user_id"], partner_id]:
-                if uid:
-                    try:
-                        await bot.send_message(
-                            uid,
-                            MATCH_EXPIRED.format(hours=config.pending_timeout),
-                            parse_mode="Markdown",
-                            reply_markup=get_main_menu_keyboard("active_finding")
-                        )
-                    except:
-                        pass
-    
-    # Rejection timeouts
-    timed_out_reqs = db.get_timed_out_rejections(config.rejection_timeout)
-    for req in timed_out_reqs:
-        success, user_id, partner_id = db.auto_approve_rejection(req["id"])
-        if success:
-            logger.info(f"Auto-approved rejection {req['id']}")
-            for uid in [user_id, partner_id]:
-                if uid:
-                    try:
-                        await bot.send_message(
-                            uid,
-                            UNPAIR_AUTO_APPROVED.format(hours=config.rejection_timeout),
-                            parse_mode="Markdown",
-                            reply_markup=get_main_menu_keyboard("active_finding")
-                        )
-                    except:
-                        pass
+    texts = {
+        "match_expired": MATCH_EXPIRED.format(hours=config.pending_timeout),
+        "unpair_auto_approved": UNPAIR_AUTO_APPROVED.format(hours=config.rejection_timeout)
+    }
+    menu = get_main_menu_keyboard("active_finding")
+    result = await notifier.send_batch(bot, [
+        Notification(uid, texts[kind], {"parse_mode": "Markdown", "reply_markup": menu})
+        for uid, kind in notifications
+    ])
+    if result.total:
+        logger.info(f"Timeout notices: {result.sent} sent, {result.failed} failed, {result.blocked} blocked")
 
 
 async def scheduler_loop(bot: Bot, interval_minutes: int = 60) -> None:
@@ -0,0 +1,95 @@
+"""
+HTTP server - webhook ingestion, health and metrics on the bot's event loop.
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, Set
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from config import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LimitedRequestHandler(SimpleRequestHandler):
+    """
+    Webhook handler that answers Telegram immediately and processes updates
+    in background tasks, at most `max_updates` at a time. When the limit is
+    reached the HTTP response is held back, so Telegram slows down instead of
+    us piling up tasks.
+    """
+    
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, max_updates: int, **kwargs: Any) -> None:
+        super().__init__(dispatcher=dispatcher, bot=bot, **kwargs)
+        self._slots = asyncio.Semaphore(max_updates)
+        self._tasks: Set[asyncio.Task] = set()
+    
+    async def handle(self, request: web.Request) -> web.Response:
+        bot = await self.resolve_bot(request)
+        if not self.verify_secret(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), bot):
+            return web.Response(body="Unauthorized", status=401)
+        
+        update: Dict[str, Any] = await request.json(loads=bot.session.json_loads)
+        await self._slots.acquire()
+        task = asyncio.create_task(self._process(bot, update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.json_response({}, dumps=bot.session.json_dumps)
+    
+    async def _process(self, bot: Bot, update: Dict[str, Any]) -> None:
+        try:
+            await self.dispatcher.feed_raw_update(bot, update, **self.data)
+        except Exception:
+            # Nobody awaits this task, so log here rather than as "exception was never retrieved"
+            logger.exception(f"Failed to process update {update.get('update_id')}")
+        finally:
+            self._slots.release()
+
+
+async def health(request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok"})
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+
+def create_app() -> web.Application:
+    """Base application with the health and metrics routes."""
+    app = web.Application()
+    app.router.add_get("/health", health)
+    app.router.add_get("/metrics", metrics_handler)
+    return app
+
+
+def create_webhook_app(dp: Dispatcher, bot: Bot) -> web.Application:
+    """Application that receives Telegram updates as webhooks."""
+    app = create_app()
+    
+    LimitedRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        max_updates=config.webhook_max_updates,
+        secret_token=config.webhook_secret
+    ).register(app, path=config.webhook_path)
+    setup_application(app, dp, bot=bot)
+    
+    return app
+
+
+async def set_webhook(bot: Bot, dp: Dispatcher) -> None:
+    """Point Telegram at our webhook URL."""
+    url = config.webhook_url.rstrip("/") + config.webhook_path
+    await bot.set_webhook(
+        url,
+        secret_token=config.webhook_secret,
+        max_connections=min(config.webhook_max_updates, 100),
+        allowed_updates=dp.resolve_used_update_types(),
+        drop_pending_updates=True
+    )
+    logger.info(f"Webhook set to {url}")
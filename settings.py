@@ -34,10 +34,33 @@ class Config:
             for id in admin_ids_str.split(",") 
             if id.strip().isdigit()
         ]
+        self._admin_id_set = frozenset(self._admin_ids)
         
         self._database_path = os.getenv("DATABASE_PATH", "meet_me.db")
         self._pending_timeout = int(os.getenv("PENDING_PAIR_TIMEOUT", "48"))
         self._rejection_timeout = int(os.getenv("REJECTION_TIMEOUT", "72"))
+        self._slow_query_ms = int(os.getenv("SLOW_QUERY_MS", "50"))
+        self._loop_stall_ms = int(os.getenv("LOOP_STALL_MS", "200"))
+        self._fsm_ttl_hours = int(os.getenv("FSM_TTL_HOURS", "24"))
+        # Swipes: "edit" reuses the card message in place, "send" posts a new card each time
+        self._swipe_mode = os.getenv("SWIPE_MODE", "edit").lower()
+        
+        # Load shedding: handler concurrency cap and how many updates may wait for it
+        self._max_in_flight = int(os.getenv("MAX_IN_FLIGHT", "64"))
+        self._max_queue = int(os.getenv("MAX_QUEUE", "256"))
+        
+        # Update delivery: "polling" (default) or "webhook"
+        self._run_mode = os.getenv("RUN_MODE", "polling").lower()
+        self._port = int(os.getenv("PORT", "5000"))
+        self._webhook_url = os.getenv("WEBHOOK_URL", "")
+        self._webhook_path = os.getenv("WEBHOOK_PATH", "/webhook")
+        self._webhook_secret = os.getenv("WEBHOOK_SECRET", "")
+        self._webhook_max_updates = int(os.getenv("WEBHOOK_MAX_UPDATES", "100"))
+        if self._run_mode == "webhook" and not (self._webhook_url and self._webhook_secret):
+            raise ValueError("WEBHOOK_URL and WEBHOOK_SECRET are required in webhook mode")
+        
+        # Alternative Bot API server (local server or test harness)
+        self._telegram_api_url = os.getenv("TELEGRAM_API_URL", "")
     
     @property
     def bot_token(self) -> str:
@@ -59,9 +82,61 @@ class Config:
     def rejection_timeout(self) -> int:
         return self._rejection_timeout
     
+    @property
+    def slow_query_ms(self) -> int:
+        return self._slow_query_ms
+    
+    @property
+    def loop_stall_ms(self) -> int:
+        return self._loop_stall_ms
+    
+    @property
+    def fsm_ttl_hours(self) -> int:
+        return self._fsm_ttl_hours
+    
+    @property
+    def swipe_mode(self) -> str:
+        return self._swipe_mode
+    
+    @property
+    def max_in_flight(self) -> int:
+        return self._max_in_flight
+    
+    @property
+    def max_queue(self) -> int:
+        return self._max_queue
+    
+    @property
+    def run_mode(self) -> str:
+        return self._run_mode
+    
+    @property
+    def port(self) -> int:
+        return self._port
+    
+    @property
+    def webhook_url(self) -> str:
+        return self._webhook_url
+    
+    @property
+    def webhook_path(self) -> str:
+        return self._webhook_path
+    
+    @property
+    def webhook_secret(self) -> str:
+        return self._webhook_secret
+    
+    @property
+    def webhook_max_updates(self) -> int:
+        return self._webhook_max_updates
+    
+    @property
+    def telegram_api_url(self) -> str:
+        return self._telegram_api_url
+    
     def is_admin(self, user_id: int) -> bool:
         """Check if user is admin."""
-        return user_id in self._admin_ids
+        return user_id in self._admin_id_set
 
 
 # Singleton instance
@@ -0,0 +1,259 @@
+"""
+FSM storage - SQLite-backed, with an in-memory front cache and write-behind.
+
+Reads are served from the cache after the first load. Writes only touch the
+cache and mark the key dirty; a background task flushes dirty keys in one
+transaction every FLUSH_INTERVAL. Rows idle longer than the TTL are purged
+from the table; TrackedStorage evicts live sessions and accounts their size.
+
+State survives restarts, but it is single-process only: the cache is never
+re-validated against the table, so a second bot process sharing the database
+would work from stale state. Run one polling/webhook process per database.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Set
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+import database as db
+import metrics
+from config import config
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 1.0  # seconds between write-behind flushes
+SWEEP_INTERVAL = 300  # seconds between TTL sweeps
+CACHE_IDLE = 600  # seconds before an idle session leaves the cache (it stays in the table)
+
+
+@dataclass
+class Record:
+    """Cached state and data for one storage key."""
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    touched: float = field(default_factory=time.time)
+
+
+class SQLiteStorage(BaseStorage):
+    """aiogram storage persisted in the bot database (one process per database)."""
+    
+    def __init__(self, ttl: Optional[int] = None):
+        self.ttl = ttl if ttl is not None else config.fsm_ttl_hours * 3600
+        self._cache: Dict[str, Record] = {}
+        self._dirty: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._last_sweep = time.time()
+    
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return ":".join(str(part) if part is not None else "" for part in (
+            key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny
+        ))
+    
+    def _load(self, key: str) -> Record:
+        record = self._cache.get(key)
+        metrics.record_cache("fsm", record is not None)
+        if record is None:
+            row = db.get_fsm_record(key)
+            if row and row["updated_at"] >= time.time() - self.ttl:
+                record = Record(row["state"], json.loads(row["data"]), row["updated_at"])
+            else:
+                record = Record()
+            # Misses are cached too; evict() drops them once idle for CACHE_IDLE
+            self._cache[key] = record
+            self._start()
+        record.touched = time.time()
+        return record
+    
+    def _touch(self, key: str, record: Record) -> None:
+        record.touched = time.time()
+        self._dirty.add(key)
+        self._start()
+    
+    def _start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+    
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self._key(key)
+        record = self._load(storage_key)
+        record.state = state.state if isinstance(state, State) else state
+        self._touch(storage_key, record)
+    
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return self._load(self._key(key)).state
+    
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        storage_key = self._key(key)
+        record = self._load(storage_key)
+        record.data = data.copy()
+        self._touch(storage_key, record)
+    
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return self._load(self._key(key)).data.copy()
+    
+    def flush(self) -> None:
+        """Write all dirty sessions in one transaction."""
+        if not self._dirty:
+            return
+        
+        dirty, self._dirty = self._dirty, set()
+        records = []
+        deleted = []
+        for key in dirty:
+            record = self._cache.get(key)
+            if record is None:
+                continue
+            if record.state is None and not record.data:
+                deleted.append(key)
+                continue
+            try:
+                data = json.dumps(record.data)
+            except (TypeError, ValueError) as e:
+                # One bad value must not block every other session's flush
+                logger.error(f"FSM data for {key} is not serializable, not persisted: {e}")
+                continue
+            records.append((key, record.state, data, record.touched))
+        
+        try:
+            db.save_fsm_records(records, deleted)
+        except Exception:
+            # Keep them dirty for the next flush
+            self._dirty |= dirty
+            raise
+    
+    def evict(self) -> None:
+        """Drop idle sessions from the cache and expired ones from the table."""
+        now = time.time()
+        for key, record in list(self._cache.items()):
+            if key not in self._dirty and now - record.touched > CACHE_IDLE:
+                del self._cache[key]
+        
+        removed = db.delete_expired_fsm_records(now - self.ttl)
+        if removed:
+            logger.info(f"Expired {removed} abandoned FSM sessions")
+    
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                self.flush()
+                if time.time() - self._last_sweep >= SWEEP_INTERVAL:
+                    self._last_sweep = time.time()
+                    self.evict()
+            except Exception as e:
+                logger.error(f"FSM storage flush error: {e}")
+    
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.flush()
+
+
+@dataclass
+class Session:
+    """Accounting for one live FSM session."""
+    touched: float
+    state_bytes: int = 0
+    data_bytes: int = 0
+
+
+class TrackedStorage(BaseStorage):
+    """
+    Wrapper that accounts approximate memory per session and evicts sessions
+    left idle longer than the TTL (e.g. registrations abandoned halfway).
+    """
+    
+    def __init__(self, inner: BaseStorage, ttl: Optional[int] = None, sweep_interval: int = SWEEP_INTERVAL):
+        self.inner = inner
+        self.ttl = ttl if ttl is not None else config.fsm_ttl_hours * 3600
+        self.sweep_interval = sweep_interval
+        self.evicted = 0
+        self._sessions: Dict[StorageKey, Session] = {}
+        self._task: Optional[asyncio.Task] = None
+    
+    def _session(self, key: StorageKey) -> Session:
+        session = self._sessions.get(key)
+        if session is None:
+            session = self._sessions[key] = Session(time.time())
+            if self._task is None:
+                self._task = asyncio.create_task(self._sweep_loop())
+        session.touched = time.time()
+        return session
+    
+    def _forget_if_empty(self, key: StorageKey) -> None:
+        session = self._sessions.get(key)
+        if session and not session.state_bytes and not session.data_bytes:
+            del self._sessions[key]
+    
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self.inner.set_state(key, state)
+        value = state.state if isinstance(state, State) else state
+        self._session(key).state_bytes = len(value) if value else 0
+        self._forget_if_empty(key)
+    
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state = await self.inner.get_state(key)
+        if key in self._sessions or state:
+            session = self._session(key)
+            if state and not session.state_bytes:
+                # Restored by the inner storage (e.g. after a restart)
+                session.state_bytes = len(state)
+        return state
+    
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self.inner.set_data(key, data)
+        self._session(key).data_bytes = len(json.dumps(data, default=str)) if data else 0
+        self._forget_if_empty(key)
+    
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        data = await self.inner.get_data(key)
+        if key in self._sessions or data:
+            session = self._session(key)
+            if data and not session.data_bytes:
+                session.data_bytes = len(json.dumps(data, default=str))
+        return data
+    
+    async def sweep(self) -> int:
+        """Clear sessions idle longer than the TTL; returns how many were evicted."""
+        cutoff = time.time() - self.ttl
+        idle = [key for key, session in self._sessions.items() if session.touched < cutoff]
+        for key in idle:
+            await self.inner.set_state(key, None)
+            await self.inner.set_data(key, {})
+            self._sessions.pop(key, None)
+        
+        self.evicted += len(idle)
+        if idle:
+            metrics.FSM_EVICTIONS.inc(len(idle))
+            logger.info(f"Evicted {len(idle)} idle FSM sessions")
+        self.stats()
+        return len(idle)
+    
+    def stats(self) -> Dict[str, int]:
+        """Live session count and approximate payload bytes."""
+        size = sum(session.state_bytes + session.data_bytes for session in self._sessions.values())
+        metrics.FSM_SESSIONS.set(len(self._sessions))
+        metrics.FSM_BYTES.set(size)
+        return {"fsm_sessions": len(self._sessions), "fsm_bytes": size, "fsm_evicted": self.evicted}
+    
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"FSM sweep error: {e}")
+    
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.inner.close()
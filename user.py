@@ -3,47 +3,41 @@ User handlers - registration, profile, filters.
 """
 
 from aiogram import Router, F, Bot
-from aiogram.types import Message, ReplyKeyboardRemove
+from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove
 from aiogram.filters import Command, CommandStart
 from aiogram.fsm.context import FSMContext
 
 import database as db
 from config import COURSES, MIN_AGE, MAX_AGE
 from states import RegistrationStates, DeleteAccountStates
+from notifier import notifier
+from prefetch import prefetcher
+from helpers import format_card, render_card, send_card, PROFILE, PREVIEW
 from keyboards import (
     get_gender_keyboard, get_course_keyboard, get_skip_keyboard,
     get_confirm_keyboard, get_preferred_gender_keyboard, get_main_menu_keyboard,
     get_cancel_keyboard
 )
 from texts import (
-    WELCOME_NEW, WELCOME_BACK, USERNAME_REQUIRED, BANNED_MESSAGE,
+    WELCOME_NEW, WELCOME_BACK, USERNAME_REQUIRED,
     REG_FIRST_NAME, REG_AGE, REG_GENDER, REG_COURSE, REG_INTERESTS,
-    REG_MEDIA, REG_ABOUT, REG_PREF_GENDER, REG_PREF_AGE, REG_PREVIEW,
-    REG_SUCCESS, REG_CANCELLED, PROFILE_VIEW, FILTERS_VIEW, ERROR_CANT_EDIT,
+    REG_MEDIA, REG_ABOUT, REG_PREF_GENDER, REG_PREF_AGE,
+    REG_SUCCESS, REG_CANCELLED, FILTERS_VIEW, ERROR_CANT_EDIT,
     DELETE_ACCOUNT_CONFIRM, DELETE_ACCOUNT_SUCCESS, DELETE_ACCOUNT_CANCELLED,
-    DELETE_ACCOUNT_PARTNER_NOTIF,
+    DELETE_ACCOUNT_PARTNER_NOTIF, ERROR_BUTTON_EXPIRED,
     BTN_SKIP_SIMPLE, BTN_SUBMIT, BTN_CANCEL, BTN_MALE, BTN_FEMALE, BTN_ANY,
     BTN_MY_PROFILE, BTN_EDIT_PROFILE, BTN_MY_FILTERS, BTN_DELETE_ACCOUNT,
-    get_gender_emoji, get_gender_text, format_approval_status,
+    get_gender_emoji, format_approval_status,
     format_pairing_status, build_optional_line
 )
 
 user_router = Router()
 
 
-def escape_markdown(text: str) -> str:
-    """Escape special characters for Markdown."""
-    if not text:
-        return ""
-    special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-    for char in special_chars:
-        text = text.replace(char, f'\\{char}')
-    return text
-
-
 @user_router.message(CommandStart())
 async def cmd_start(message: Message, state: FSMContext) -> None:
     await state.clear()
+    prefetcher.discard(message.from_user.id)
     
     if not message.from_user.username:
         await message.answer(USERNAME_REQUIRED, parse_mode="Markdown")
@@ -52,13 +46,6 @@ async def cmd_start(message: Message, state: FSMContext) -> None:
     user = db.get_user(message.from_user.id)
     
     if user:
-        if user["is_banned"]:
-            await message.answer(
-                BANNED_MESSAGE.format(reason=user["ban_reason"] or "Not specified"),
-                parse_mode="Markdown"
-            )
-            return
-        
         # Allow rejected users to re-register
         if user["approval_status"] == "rejected":
             await message.answer(
@@ -92,43 +79,7 @@ async def cmd_profile(message: Message, bot: Bot) -> None:
         return
     
     u = dict(user)
-    
-    # Escape special characters in user data
-    first_name = escape_markdown(u["first_name"])
-    last_name = escape_markdown(u["last_name"])
-    username = escape_markdown(u["username"])
-    course = escape_markdown(u.get("course", ""))
-    interests = escape_markdown(u.get("interests", ""))
-    about_me = escape_markdown(u.get("about_me", ""))
-    
-    text = PROFILE_VIEW.format(
-        first_name=first_name,
-        last_name=last_name,
-        user_id=u["user_id"],
-        username=username,
-        age=u["age"],
-        gender_emoji=get_gender_emoji(u["gender"]),
-        gender=get_gender_text(u["gender"]),
-        course_line=f"🎓 Course: {course}\n" if course else "",
-        interests_line=f"💝 Interests: {interests}\n" if interests else "",
-        about_line=f"💭 About: {about_me}\n" if about_me else "",
-        approval_status=format_approval_status(u["approval_status"]),
-        pairing_status=format_pairing_status(u["pairing_status"]),
-        pref_gender=u["preferred_gender"].title(),
-        pref_age_min=u["preferred_age_min"],
-        pref_age_max=u["preferred_age_max"]
-    )
-    
-    if u.get("media_file_id") and u.get("media_type"):
-        if u["media_type"] == "photo":
-            await bot.send_photo(message.chat.id, u["media_file_id"], caption=text, parse_mode="Markdown")
-        elif u["media_type"] == "video":
-            await bot.send_video(message.chat.id, u["media_file_id"], caption=text, parse_mode="Markdown")
-        elif u["media_type"] == "video_note":
-            await bot.send_video_note(message.chat.id, u["media_file_id"])
-            await message.answer(text, parse_mode="Markdown")
-    else:
-        await message.answer(text + "\n\n📷 [No media]", parse_mode="Markdown")
+    await send_card(bot, message.chat.id, u, render_card(u, PROFILE))
 
 
 @user_router.message(F.text == BTN_MY_FILTERS)
@@ -333,41 +284,8 @@ async def process_pref_age(message: Message, state: FSMContext, bot: Bot) -> Non
     await state.set_state(RegistrationStates.confirm_profile)
     
     data = await state.get_data()
-    
-    # Escape special characters in user data
-    first_name = escape_markdown(data["first_name"])
-    last_name = escape_markdown(data["last_name"])
-    course = escape_markdown(data.get("course", ""))
-    interests = escape_markdown(data.get("interests", ""))
-    about_me = escape_markdown(data.get("about_me", ""))
-    
-    text = REG_PREVIEW.format(
-        first_name=first_name,
-        last_name=last_name,
-        user_id=message.from_user.id,
-        age=data["age"],
-        gender_emoji=get_gender_emoji(data["gender"]),
-        gender=get_gender_text(data["gender"]),
-        course_line=f"🎓 Course: {course}\n" if course else "",
-        interests_line=f"💝 Interests: {interests}\n" if interests else "",
-        about_line=f"💭 About: {about_me}\n" if about_me else "",
-        pref_gender=data["preferred_gender"].title(),
-        pref_age_min=pmin,
-        pref_age_max=pmax
-    )
-    
-    if data.get("media_file_id") and data.get("media_type"):
-        if data["media_type"] == "photo":
-            await bot.send_photo(message.chat.id, data["media_file_id"], caption=text,
-                               parse_mode="Markdown", reply_markup=get_confirm_keyboard())
-        elif data["media_type"] == "video":
-            await bot.send_video(message.chat.id, data["media_file_id"], caption=text,
-                               parse_mode="Markdown", reply_markup=get_confirm_keyboard())
-        elif data["media_type"] == "video_note":
-            await bot.send_video_note(message.chat.id, data["media_file_id"])
-            await message.answer(text, parse_mode="Markdown", reply_markup=get_confirm_keyboard())
-    else:
-        await message.answer(text, parse_mode="Markdown", reply_markup=get_confirm_keyboard())
+    text = format_card({**data, "user_id": message.from_user.id}, PREVIEW)
+    await send_card(bot, message.chat.id, data, text, get_confirm_keyboard(), placeholder="")
 
 
 @user_router.message(RegistrationStates.confirm_profile)
@@ -419,6 +337,8 @@ async def edit_profile(message: Message, state: FSMContext) -> None:
                            reply_markup=get_main_menu_keyboard(user["pairing_status"]))
         return
     
+    # Leaving the search; the next candidate would be chosen for the old profile
+    prefetcher.discard(message.from_user.id)
     await message.answer(
         "✏️ *Edit Profile*\n\nEnter your *first name*:",
         parse_mode="Markdown",
@@ -474,19 +394,18 @@ async def process_delete_confirmation(message: Message, state: FSMContext, bot:
     # Delete the account
     success, partner_id = db.delete_user_account(message.from_user.id)
     await state.clear()
+    prefetcher.discard(message.from_user.id)
     
     if success:
         # Notify partner if they had one
         if partner_id:
-            try:
-                await bot.send_message(
-                    partner_id,
-                    DELETE_ACCOUNT_PARTNER_NOTIF,
-                    parse_mode="Markdown",
-                    reply_markup=get_main_menu_keyboard("active_finding")
-                )
-            except:
-                pass
+            await notifier.send(
+                bot,
+                partner_id,
+                DELETE_ACCOUNT_PARTNER_NOTIF,
+                parse_mode="Markdown",
+                reply_markup=get_main_menu_keyboard("active_finding")
+            )
         
         await message.answer(
             DELETE_ACCOUNT_SUCCESS,
@@ -498,3 +417,11 @@ async def process_delete_confirmation(message: Message, state: FSMContext, bot:
             "😔 Error deleting account. Please try again or contact admin.",
             reply_markup=ReplyKeyboardRemove()
         )
+
+
+# ==================== FALLBACK ====================
+
+@user_router.callback_query()
+async def expired_button(callback: CallbackQuery) -> None:
+    """Buttons from old messages (before the callback format changed) or unknown data."""
+    await callback.answer(ERROR_BUTTON_EXPIRED, show_alert=True)